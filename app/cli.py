@@ -0,0 +1,230 @@
+"""Management commands.
+
+    python -m app.cli ingest /data/legacy --workers 8 [--tenant finance]
+    python -m app.cli copy-vectors --from chroma --to quantized [--tenant finance]
+
+``ingest`` memasukkan seluruh file di sebuah directory tree lewat pipeline
+yang sama dengan endpoint upload (store content-addressed, deteksi duplikat,
+ingestion queue), tanpa HTTP. Progress dicatat per file di state file,
+sehingga perintah yang terputus bisa dijalankan ulang dan melanjutkan.
+Dengan ``--tenant`` file masuk ke shard tenant tersebut.
+Jalankan saat server API tidak sedang menulis ke vector store yang sama.
+
+``copy-vectors`` menyalin seluruh chunk (vektor, teks, metadata) antar
+backend vector store, misalnya sebelum pindah ke ``VECTOR_BACKEND=quantized``.
+Yang disalin adalah collection aktif shard ``--tenant`` (default tenant kalau
+tidak diisi), jadi jalankan sekali per tenant.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Optional
+
+from app.services.extractor import SUPPORTED_EXTENSIONS
+from app.services.shards import DEFAULT_TENANT, normalize_tenant, shards
+from app.services.vector_store import VECTOR_BACKENDS
+
+logger = logging.getLogger(__name__)
+
+BULK_STATE_PATH = os.getenv(
+    "BULK_STATE_PATH",
+    os.path.join(os.getenv("CHROMA_DIR", "vectorstore"), "bulk_ingest_state.jsonl"),
+)
+FINISHED = {"done", "duplicate", "error"}
+
+
+def iter_files(root: str):
+    """Supported files under ``root``, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if not name.startswith(".") and os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def document_name(root: str, path: str) -> str:
+    """Document name of a file in the tree: its relative path, flattened."""
+    return os.path.relpath(path, root).replace(os.sep, "__")
+
+
+def load_state(path: str) -> dict[str, dict]:
+    state = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                state[entry["path"]] = entry
+    return state
+
+
+class BulkIngest:
+    """Feeds a directory tree into an ingestion queue with bounded in-flight jobs."""
+
+    def __init__(self, queue, state_path: str = BULK_STATE_PATH, max_in_flight: int = 32,
+                 retry_errors: bool = False, tenant: Optional[str] = None):
+        self.queue = queue
+        self.shard = shards.get(tenant)
+        self.state_path = state_path
+        self.max_in_flight = max_in_flight
+        self.retry_errors = retry_errors
+        self.state = load_state(state_path)
+        self.in_flight: dict[str, dict] = {}  # job_id -> state entry
+        self.counts = {"done": 0, "duplicate": 0, "error": 0, "skipped": 0}
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        self._state_file = open(state_path, "a", encoding="utf-8")
+
+    def _record(self, entry: dict):
+        self.state[entry["path"]] = entry
+        self._state_file.write(json.dumps(entry) + "\n")
+        self._state_file.flush()
+
+    def _already_done(self, path: str, st) -> bool:
+        entry = self.state.get(path)
+        if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+            return False
+        if entry.get("tenant", DEFAULT_TENANT) != self.shard.tenant:
+            return False
+        if entry["status"] == "error":
+            return not self.retry_errors
+        # Job yang belum selesai dilanjutkan oleh journal ingestion queue
+        return entry["status"] in FINISHED or entry.get("job_id") in self.in_flight
+
+    def _collect(self):
+        for job_id, entry in list(self.in_flight.items()):
+            job = self.queue.get(job_id)
+            if job is None or job["status"] not in ("done", "error"):
+                continue
+            del self.in_flight[job_id]
+            entry = dict(entry, status=job["status"], errors=job["errors"])
+            self.counts[job["status"]] += 1
+            self._record(entry)
+
+    def _wait_for_slot(self, limit: int):
+        while len(self.in_flight) >= limit:
+            time.sleep(0.2)
+            self._collect()
+
+    def run(self, root: str):
+        from app.utils.file_handler import store_file
+
+        root = os.path.abspath(root)
+        started = time.time()
+        # Job yang masih jalan dari run sebelumnya (di-resume oleh journal)
+        for entry in self.state.values():
+            if entry["status"] not in FINISHED and entry.get("job_id"):
+                if self.queue.get(entry["job_id"]) is not None:
+                    self.in_flight[entry["job_id"]] = entry
+
+        for path in iter_files(root):
+            st = os.stat(path)
+            if self._already_done(path, st):
+                self.counts["skipped"] += 1
+                continue
+            self._wait_for_slot(self.max_in_flight)
+            entry = {"path": path, "size": st.st_size, "mtime": st.st_mtime, "tenant": self.shard.tenant}
+            try:
+                stored = store_file(path, document_name(root, path), upload_dir=self.shard.upload_dir)
+                result = self.queue.submit_stored(stored, tenant=self.shard.tenant)
+            except Exception as e:
+                logger.error(f"Failed to ingest {path}: {e}")
+                self.counts["error"] += 1
+                self._record(dict(entry, status="error", errors=[str(e)]))
+                continue
+            entry.update(name=stored["filename"], job_id=result["job_id"], status=result["status"])
+            if result["status"] == "duplicate":
+                entry["duplicate_of"] = result["duplicate_of"]
+                self.counts["duplicate"] += 1
+                self._record(entry)
+            else:
+                self._record(entry)
+                self.in_flight[result["job_id"]] = entry
+            self._collect()
+
+        self._wait_for_slot(1)
+        self._state_file.close()
+        return dict(self.counts, seconds=round(time.time() - started, 1))
+
+
+def cmd_ingest(args) -> int:
+    from app.services.embedding import close_vectorstore
+    from app.services.ingestion import IngestionQueue
+
+    queue = IngestionQueue(workers=args.workers) if args.workers else IngestionQueue()
+    queue.start()
+    try:
+        bulk = BulkIngest(queue, state_path=args.state, max_in_flight=args.max_in_flight or queue.workers * 4,
+                          retry_errors=args.retry_errors, tenant=args.tenant)
+        summary = bulk.run(args.directory)
+    except KeyboardInterrupt:
+        logger.info("Interrupted; run the same command again to resume")
+        return 130
+    finally:
+        queue.stop()
+        close_vectorstore()
+    print(json.dumps(summary))
+    return 1 if summary["error"] else 0
+
+
+def cmd_copy_vectors(args) -> int:
+    from app.services.embedding import embeddings
+    from app.services.vector_store import copy_vectors, open_vectorstore
+
+    shard = shards.get(args.tenant, create=False)
+    if shard is None:
+        logger.error(f"Unknown tenant: {args.tenant}")
+        return 1
+    collection = shard.collection_name
+    source = open_vectorstore(args.source, collection, embedding_function=embeddings)
+    target = open_vectorstore(args.target, collection, embedding_function=embeddings)
+    started = time.time()
+    try:
+        total = copy_vectors(source, target, batch_size=args.batch_size)
+    finally:
+        target.close()
+        source.close()
+    print(json.dumps({"tenant": shard.tenant, "collection": collection, "copied": total,
+                      "seconds": round(time.time() - started, 1)}))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="DMS AI management commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="bulk-ingest a directory tree")
+    ingest.add_argument("directory")
+    ingest.add_argument("--workers", type=int, default=0, help="extraction processes (default INGEST_WORKERS)")
+    ingest.add_argument("--max-in-flight", type=int, default=0, help="jobs queued at once (default workers x 4)")
+    ingest.add_argument("--state", default=BULK_STATE_PATH, help="progress file used to resume")
+    ingest.add_argument("--retry-errors", action="store_true", help="retry files that failed before")
+    ingest.add_argument("--tenant", default=None, help="tenant/department shard (default DEFAULT_TENANT)")
+
+    copy = sub.add_parser("copy-vectors", help="copy all chunks between vector store backends")
+    copy.add_argument("--from", dest="source", choices=VECTOR_BACKENDS, default="chroma")
+    copy.add_argument("--to", dest="target", choices=VECTOR_BACKENDS, default="quantized")
+    copy.add_argument("--batch-size", type=int, default=500)
+    copy.add_argument("--tenant", default=None, help="tenant/department shard (default DEFAULT_TENANT)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        normalize_tenant(args.tenant)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "copy-vectors":
+        if args.source == args.target:
+            parser.error("--from and --to must differ")
+        return cmd_copy_vectors(args)
+    if not os.path.isdir(args.directory):
+        parser.error(f"not a directory: {args.directory}")
+    return cmd_ingest(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
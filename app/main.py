@@ -1,13 +1,39 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import upload, chat
+from app.routes import upload, chat, metrics, health, tenants
+from app.services.embedding import close_vectorstore
+from app.services.ingestion import ingestion_queue
+from app.services.llm_client import start_http_session, close_http_session
+from app.services.reembed import reembedder
+from app.services.tracing import RequestIdMiddleware
+from app.services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_session()
+    ingestion_queue.start()
+    # Re-embedding yang terputus (crash/restart) dilanjutkan dari checkpoint
+    await asyncio.to_thread(reembedder.resume)
+    # Warm-up di background: request sudah diterima, /health/ready menunggu ini
+    warmup_task = asyncio.create_task(warm_up(ingestion_queue))
+    yield
+    warmup_task.cancel()
+    ingestion_queue.stop()
+    await asyncio.to_thread(reembedder.stop)
+    await asyncio.to_thread(close_vectorstore)
+    await close_http_session()
+
 
 app = FastAPI(
     title="DMS AI",
     description="Document Management System AI (LangChain + Llama3)",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -17,7 +43,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Request id (header X-Request-ID) + durasi request; span tracing aktif dengan DMS_TRACE=1
+app.add_middleware(RequestIdMiddleware)
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "upload")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -30,3 +59,6 @@ async def root():
 
 app.include_router(upload.router, prefix="/upload", tags=["upload"])
 app.include_router(chat.router, prefix="/chat", tags=["chat"])
+app.include_router(tenants.router, prefix="/tenants", tags=["tenants"])
+app.include_router(metrics.router, tags=["metrics"])
+app.include_router(health.router, prefix="/health", tags=["health"])
@@ -1,178 +1,221 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse, FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 import json
 import asyncio
+from contextlib import aclosing
 import aiohttp
 import os
-from datetime import datetime
 import base64
 
-from app.services.embedding import vectorstore
+from app.services.prompt_builder import build_prompt
+from app.services.shards import normalize_tenant, shards
+from app.utils.file_handler import sanitize_filename
 from app.services.llm_client import generate_response
+from app.services.retrieval import resolve_shards, retrieve
+from app.services.answer_cache import answer_cache, result_fingerprint
+from app.services.embedding_cache import get_embedding_cache
+from app.services.generation_scheduler import QueueFull, QueueTimeout, Ticket, generation_scheduler
 
 router = APIRouter()
 
+class EntityFilter(BaseModel):
+    text: str
+    label: Optional[str] = None
+
 class ChatRequest(BaseModel):
     query: str
     context_window: Optional[int] = 5
     temperature: Optional[float] = 0.7
+    # Batasi retrieval ke chunk yang menyebut semua entitas ini
+    entities: Optional[List[EntityFilter]] = None
+    # Default: RETRIEVAL_MODE
+    retrieval_mode: Optional[Literal["vector", "lexical", "hybrid", "auto"]] = None
+    # Tenant/department yang dicari (paralel); default: DEFAULT_TENANT
+    tenants: Optional[List[str]] = None
+
+def entity_filters(request: ChatRequest):
+    return [f.model_dump() for f in request.entities] if request.entities else None
 
-def get_doc_count():
-    # Try to get count from Chroma collection, fallback to upload dir
+def request_tenants(request: ChatRequest) -> Optional[list[str]]:
+    """Tenant keys of the request in canonical form; HTTP 400 for invalid keys."""
+    if not request.tenants:
+        return None
     try:
-        return vectorstore._collection.count()
-    except Exception:
-        upload_dir = "upload"
-        return len([f for f in os.listdir(upload_dir) if not f.startswith('.')])
-
-def get_file_metadata(upload_dir="upload"):
-    files = [f for f in os.listdir(upload_dir) if not f.startswith('.')]
-    total_files_uploaded = len(files)
-    file_list = ", ".join(files)
-    last_upload_date = None
-    if files:
-        last_upload_date = max(
-            [datetime.fromtimestamp(os.path.getmtime(os.path.join(upload_dir, f))) for f in files]
-        ).strftime("%Y-%m-%d %H:%M:%S")
-    else:
-        last_upload_date = "-"
-    return total_files_uploaded, file_list, last_upload_date
-
-def get_document_overview(files, upload_dir="upload"):
-    overview = []
-    for f in files:
-        path = os.path.join(upload_dir, f)
-        size = os.path.getsize(path) // 1024  # KB
-        overview.append(f"{f} ({size}KB)")
-    return " | ".join(overview)
-
-async def generate_rag_response(query: str, context_window: int = 5, temperature: float = 0.7):
-    """Generate RAG response with streaming."""
+        return [normalize_tenant(t) for t in request.tenants]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def get_prompt_metadata(tenants: Optional[list[str]] = None):
+    """Metadata file untuk prompt, dari document catalog tenant (tanpa scan direktori)."""
+    catalogs = [shard.catalog for shard in resolve_shards(tenants)]
+    stats = [catalog.stats() for catalog in catalogs]
+    summaries = [catalog.summary() for catalog in catalogs if catalog.stats()["total_files"]]
+    total_files = sum(s["total_files"] for s in stats)
+    return {
+        "doc_count": total_files,
+        "total_files_uploaded": total_files,
+        "file_list": ", ".join(s["file_list"] for s in summaries),
+        "last_upload_date": max((s["last_upload"] for s in stats), default="-"),
+        "document_overview": " | ".join(s["overview"] for s in summaries),
+    }
+
+def format_sources(results) -> list[dict]:
+    return [
+        {
+            "metadata": {
+                "source": doc.metadata.get("source", ""),
+                "file_type": doc.metadata.get("file_type", "")
+            },
+            "score": float(score)
+        }
+        for doc, score in results
+    ]
+
+def lookup_cached_answer(query_vector, results):
+    """Jawaban dari answer cache untuk hasil retrieval yang sama, atau None."""
+    if answer_cache is None or query_vector is None or not results:
+        return None
+    return answer_cache.lookup(query_vector, result_fingerprint(results))
+
+def store_cached_answer(query_vector, results, answer: str, sources_data: list[dict]):
+    if answer_cache is None or query_vector is None or not results:
+        return
+    if not answer.strip() or answer.startswith("Error: "):
+        return
+    sources = {doc.metadata.get("source", "") for doc, score in results}
+    answer_cache.store(query_vector, result_fingerprint(results), sources, answer, sources_data)
+
+def client_id(http_request: Request) -> str:
+    """Key for fair queueing: header X-Client-ID, else the client address."""
+    return http_request.headers.get("x-client-id") or (http_request.client.host if http_request.client else "-")
+
+
+def queue_full_error(e: QueueFull) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def check_admission(client: str):
+    """Fail fast with 429 when the generation queue would reject ``client``.
+
+    Nothing is reserved here: the slot is taken right before generation,
+    so a request that never gets that far holds nothing.
+    """
+    if generation_scheduler is not None:
+        try:
+            generation_scheduler.check(client)
+        except QueueFull as e:
+            raise queue_full_error(e)
+
+
+def submit_generation(client: str) -> Optional[Ticket]:
+    return generation_scheduler.submit(client) if generation_scheduler is not None else None
+
+
+def release(ticket: Optional[Ticket]):
+    if ticket is not None:
+        generation_scheduler.release(ticket)
+
+
+def replay_answer(answer: str, piece_size: int = 64):
+    """Potong jawaban dari cache jadi beberapa event SSE."""
+    for i in range(0, len(answer), piece_size):
+        yield f"data: {json.dumps({'text': answer[i:i + piece_size]})}\n\n"
+
+async def generate_rag_response(query: str, context_window: int = 5, temperature: float = 0.7,
+                                entities: Optional[list[dict]] = None, retrieval_mode: Optional[str] = None,
+                                tenants: Optional[list[str]] = None, client: str = "-"):
+    """Generate RAG response with streaming.
+
+    A generation slot for ``client`` is taken right before the LLM call;
+    while it waits, ``{"queue_position": n}`` events are sent.
+    """
+    ticket = None
     try:
-        # 1. Search vector DB
-        results = vectorstore.similarity_search_with_score(
-            query,
-            k=context_window
+        # 1. Search vector DB (semua shard tenant, paralel)
+        query_vector, results = await retrieve(
+            query, k=context_window, entities=entities, mode=retrieval_mode, tenants=tenants
         )
+
+        cached = lookup_cached_answer(query_vector, results)
+        if cached is not None:
+            for event in replay_answer(cached["answer"]):
+                yield event
+            yield f"data: {json.dumps({'sources': cached['sources_data'], 'cached': True})}\n\n"
+            return
         
-        # 2. Prepare context
-        context = "\n\n".join([doc.page_content for doc, score in results])
-        doc_count = get_doc_count()
-        
-        # Fetch file metadata and overview
-        files_in_upload = [f for f in os.listdir("upload") if not f.startswith('.')]
-        total_files_uploaded, file_list, last_upload_date = get_file_metadata()
-        document_overview = get_document_overview(files_in_upload)
-
-        # 3. Prepare the new unified prompt
-        prompt = f"""Kamu adalah DMS AI, asisten AI cerdas yang bertugas membantu pengguna terkait dokumen perusahaan.
-Saat ini kamu memiliki akses ke {doc_count} dokumen.
-Berikut adalah metadata file yang tersedia:
-- Total file diupload: {total_files_uploaded}
-- Daftar file: {file_list}
-- Tanggal upload terakhir: {last_upload_date}
-- Ringkasan Dokumen: {document_overview}
-
-Tugasmu adalah:
-1.  PAHAMI DOKUMEN: Pahami isi dokumen, termasuk template dan format yang ada.
-2.  BANTU BUAT DOKUMEN: Bantu pengguna membuat dokumen baru sesuai dengan template dan kebutuhan mereka, menggunakan informasi dari dokumen yang ada jika relevan.
-3.  CARI & AMBIL DATA: Temukan dan sajikan informasi spesifik dari dalam dokumen.
-4.  ANALISIS & LAPORKAN: Baca, pindai, buat ringkasan, atau laporan berdasarkan isi dan metadata dokumen.
-5.  INTERAKSI ALAMI: Berinteraksilah seolah-olah kamu adalah admin dokumen yang kompeten, menggunakan Bahasa Indonesia yang profesional dan jelas.
-6.  JANGAN BERI KOMENTAR: Jangan beri komentar apa-apa, hanya berikan jawaban saja.
-7.  Ketika pembukaan percakapan, kamu harus memperkenalkan diri sebagai DMS AI dengan singkat, asisten AI cerdas yang bertugas membantu pengguna terkait dokumen perusahaan. dan tidak perlu beri data atau informasi perusahaan. atau baca 
-Gunakan RETRIEVED_CHUNKS sebagai dasar faktual utama untuk jawabanmu.
-Jika informasi tidak ada dalam RETRIEVED_CHUNKS, nyatakan bahwa data tidak ditemukan dalam dokumen yang tersedia.
-
-Konteks (RETRIEVED_CHUNKS):
-{context}
-
-Pertanyaan Pengguna (USER_QUERY): {query}
-
-Jawaban (dalam Bahasa Indonesia):
-"""
-        
-        # 4. Generate streaming response
-        async for chunk in generate_response(prompt, temperature=temperature):
-            yield f"data: {json.dumps({'text': chunk})}\n\n"
+        # 2-3. Pack context and build the prompt
+        prompt, prompt_stats = build_prompt(query, results, get_prompt_metadata(tenants))
+
+        # 4. Wait for a generation slot, then generate streaming response
+        ticket = submit_generation(client)
+        if ticket is not None:
+            async for position in generation_scheduler.updates(ticket):
+                yield f"data: {json.dumps({'queue_position': position})}\n\n"
+        # aclosing: kalau client SSE putus, stream ke Ollama langsung ditutup
+        answer_chunks = []
+        async with aclosing(generate_response(prompt, temperature=temperature)) as stream:
+            async for chunk in stream:
+                answer_chunks.append(chunk)
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
         
         # 5. Send source documents as the last message
-        sources_data = [
-            {
-                "metadata": {
-                    "source": doc.metadata.get("source", ""),
-                    "file_type": doc.metadata.get("file_type", "")
-                },
-                "score": float(score)
-            }
-            for doc, score in results
-        ]
-        yield f"data: {json.dumps({'sources': sources_data})}\n\n"
+        sources_data = format_sources(results)
+        store_cached_answer(query_vector, results, "".join(answer_chunks), sources_data)
+        yield f"data: {json.dumps({'sources': sources_data, 'prompt_stats': prompt_stats})}\n\n"
             
+    except asyncio.TimeoutError:
+        yield f"data: {json.dumps({'error': 'Retrieval timed out'})}\n\n"
+    except (QueueFull, QueueTimeout) as e:
+        yield f"data: {json.dumps({'error': str(e), 'retry_after': e.retry_after})}\n\n"
     except Exception as e:
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        # Slot dilepas segera setelah generasi selesai, juga saat client putus
+        release(ticket)
 
 @router.post("/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """Streaming chat endpoint with RAG."""
+    tenants = request_tenants(request)
+    client = client_id(http_request)
+    check_admission(client)
     return StreamingResponse(
         generate_rag_response(
             request.query,
             context_window=request.context_window,
-            temperature=request.temperature
+            temperature=request.temperature,
+            entities=entity_filters(request),
+            retrieval_mode=request.retrieval_mode,
+            tenants=tenants,
+            client=client,
         ),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
     )
 
 @router.post("/")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Non-streaming chat endpoint with RAG."""
+    tenants = request_tenants(request)
+    client = client_id(http_request)
+    check_admission(client)
+    ticket = None
     try:
-        results = vectorstore.similarity_search_with_score(
-            request.query,
-            k=request.context_window
+        query_vector, results = await retrieve(
+            request.query, k=request.context_window, entities=entity_filters(request),
+            mode=request.retrieval_mode, tenants=tenants,
         )
-        context_chunks = [doc.page_content for doc, score in results]
-        context = "\n\n".join(context_chunks)
-        
-        # Fetch file metadata and overview
-        doc_count = get_doc_count()
-        files_in_upload = [f for f in os.listdir("upload") if not f.startswith('.')]
-        total_files_uploaded, file_list, last_upload_date = get_file_metadata()
-        document_overview = get_document_overview(files_in_upload)
-
-        # New unified prompt
-        unified_prompt = f"""Kamu adalah DMS AI, asisten AI cerdas yang bertugas membantu pengguna terkait dokumen perusahaan.
-Saat ini kamu memiliki akses ke {doc_count} dokumen.
-Berikut adalah metadata file yang tersedia:
-- Total file diupload: {total_files_uploaded}
-- Daftar file: {file_list}
-- Tanggal upload terakhir: {last_upload_date}
-- Ringkasan Dokumen: {document_overview}
-
-Tugasmu adalah:
-1.  PAHAMI DOKUMEN: Pahami isi dokumen, termasuk template dan format yang ada.
-2.  BANTU BUAT DOKUMEN: Bantu pengguna membuat dokumen baru sesuai dengan template dan kebutuhan mereka, menggunakan informasi dari dokumen yang ada jika relevan.
-3.  CARI & AMBIL DATA: Temukan dan sajikan informasi spesifik dari dalam dokumen.
-4.  ANALISIS & LAPORKAN: Baca, pindai, buat ringkasan, atau laporan berdasarkan isi dan metadata dokumen.
-5.  INTERAKSI ALAMI: Berinteraksilah seolah-olah kamu adalah admin dokumen yang kompeten, menggunakan Bahasa Indonesia yang profesional dan jelas.
-6.  JANGAN BERI KOMENTAR: Jangan beri komentar apa-apa, hanya berikan jawaban saja.
-7.  Ketika pembukaan percakapan, kamu harus memperkenalkan diri sebagai DMS AI, asisten AI cerdas yang bertugas membantu pengguna terkait dokumen perusahaan. dan gausah beri data atau informasi lainnya.
-
-Gunakan RETRIEVED_CHUNKS sebagai dasar faktual utama untuk jawabanmu.
-Jika informasi tidak ada dalam RETRIEVED_CHUNKS, nyatakan bahwa data tidak ditemukan dalam dokumen yang tersedia.
-
-Konteks (RETRIEVED_CHUNKS):
-{context}
-
-Pertanyaan Pengguna (USER_QUERY): {request.query}
-
-Jawaban (dalam Bahasa Indonesia):
-"""
-        
-     
+
+        cached = lookup_cached_answer(query_vector, results)
+        if cached is not None:
+            return {"response": cached["answer"], "sources": cached["sources_data"], "cached": True}
+
+        unified_prompt, prompt_stats = build_prompt(request.query, results, get_prompt_metadata(tenants))
+
+        ticket = submit_generation(client)
+        if ticket is not None:
+            await generation_scheduler.wait(ticket)
         response_chunks = []
     
         async for chunk_json_str in generate_response(unified_prompt, temperature=request.temperature):
@@ -193,27 +236,49 @@ Jawaban (dalam Bahasa Indonesia):
                 # else, ignore if it's some other data type we don't expect.
         
         response_text = "".join(response_chunks)
+        sources_data = format_sources(results)
+        store_cached_answer(query_vector, results, response_text, sources_data)
         
         return {
             "response": response_text,
-            "sources": [
-                {
-                    "metadata": {
-                        "source": doc.metadata.get("source", ""),
-                        "file_type": doc.metadata.get("file_type", "")
-                    },
-                    "score": float(score)
-                }
-                for doc, score in results
-            ]
+            "sources": sources_data,
+            "prompt_stats": prompt_stats,
         }
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Retrieval timed out")
+    except QueueFull as e:
+        raise queue_full_error(e)
+    except QueueTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        release(ticket)
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit rate answer cache dan embedding cache."""
+    embedding_cache = get_embedding_cache()
+    return {
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+    }
+
+@router.get("/queue")
+async def queue_stats():
+    """Generation slots in use and requests waiting for one."""
+    return generation_scheduler.stats() if generation_scheduler is not None else None
 
 @router.get("/document/{filename}")
-async def get_document(filename: str):
-    """Get document file from upload directory."""
-    file_path = os.path.join("upload", filename)
+async def get_document(filename: str, tenant: Optional[str] = None):
+    """Get document file from the upload directory of a tenant."""
+    try:
+        shard = shards.get(tenant, create=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if shard is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    file_path = os.path.join(shard.upload_dir, sanitize_filename(filename))
     
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.warmup import readiness
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    """Liveness: proses hidup dan event loop merespons."""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 setelah warm-up selesai (store terbuka, model dimuat), 503 sebelumnya."""
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["status"] == "ready" else 503)
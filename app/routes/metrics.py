@@ -0,0 +1,79 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.answer_cache import answer_cache
+from app.services.embedding_cache import get_embedding_cache
+from app.services.generation_scheduler import generation_scheduler
+from app.services.ingestion import ingestion_queue
+from app.services.metrics import registry
+from app.services.reembed import reembedder
+from app.services.shards import shards
+
+router = APIRouter()
+
+
+def collect_cache_stats():
+    # Hit/miss dibaca langsung dari statistik cache, tidak dihitung dua kali
+    hits, misses = [], []
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        stats = embedding_cache.stats()
+        hits += [({"cache": "embedding", "tier": "memory"}, stats["memory_hits"]),
+                 ({"cache": "embedding", "tier": "disk"}, stats["disk_hits"])]
+        misses.append(({"cache": "embedding"}, stats["misses"]))
+    if answer_cache is not None:
+        stats = answer_cache.stats()
+        hits.append(({"cache": "answer", "tier": "memory"}, stats["hits"]))
+        misses.append(({"cache": "answer"}, stats["misses"]))
+    yield "dms_cache_hits_total", "counter", "Cache hits.", hits
+    yield "dms_cache_misses_total", "counter", "Cache misses.", misses
+
+
+def collect_ingestion_jobs():
+    by_status = ingestion_queue.metrics()["jobs_by_status"]
+    yield "dms_ingest_jobs", "gauge", "Ingestion jobs currently tracked, by status.", [
+        ({"status": status}, count) for status, count in sorted(by_status.items())
+    ]
+
+
+def collect_shard_sizes():
+    # Hanya shard yang sudah dibuka; scrape tidak membuka index tenant lain
+    loaded = shards.loaded()
+    yield "dms_shard_documents", "gauge", "Documents in the catalog of each loaded tenant shard.", [
+        ({"tenant": shard.tenant}, shard.catalog.stats()["total_files"]) for shard in loaded
+    ]
+    yield "dms_shard_chunks", "gauge", "Chunks indexed in each loaded tenant shard.", [
+        ({"tenant": shard.tenant}, shard.catalog.stats()["total_chunks"]) for shard in loaded
+    ]
+
+
+def collect_reembed_progress():
+    jobs = [job for job in reembedder.jobs() if job["status"] == "running"]
+    yield "dms_reembed_progress_ratio", "gauge", "Progress of running re-embedding jobs (0-1).", [
+        ({"tenant": job["tenant"], "model": job["model"]}, (job["percent"] or 0) / 100) for job in jobs
+    ]
+    yield "dms_reembed_eta_seconds", "gauge", "Estimated time left of running re-embedding jobs.", [
+        ({"tenant": job["tenant"], "model": job["model"]}, job["eta_seconds"])
+        for job in jobs if job["eta_seconds"] is not None
+    ]
+
+
+def collect_generation_queue():
+    if generation_scheduler is None:
+        return
+    stats = generation_scheduler.stats()
+    yield "dms_generation_inflight", "gauge", "LLM generations holding a scheduler slot.", [({}, stats["inflight"])]
+    yield "dms_generation_queued", "gauge", "Chat requests waiting for a generation slot.", [({}, stats["queued"])]
+
+
+registry.add_collector(collect_cache_stats)
+registry.add_collector(collect_ingestion_jobs)
+registry.add_collector(collect_shard_sizes)
+registry.add_collector(collect_reembed_progress)
+registry.add_collector(collect_generation_queue)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,130 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.services.answer_cache import answer_cache
+from app.services.ingestion import ingestion_queue
+from app.services.llm_client import EMBED_MODEL
+from app.services.reembed import reembedder
+from app.services.shards import DEFAULT_TENANT, Shard, shards
+from app.utils.file_handler import object_path
+
+router = APIRouter()
+
+
+class ReembedRequest(BaseModel):
+    # Default: EMBED_MODEL
+    model: Optional[str] = None
+
+
+def get_shard(tenant: str) -> Shard:
+    try:
+        shard = shards.get(tenant, create=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return shard
+
+
+def ensure_idle(shard: Shard):
+    if ingestion_queue.pending_count(shard.tenant):
+        raise HTTPException(status_code=409, detail=f"Tenant {shard.tenant} still has ingestion jobs running")
+    if reembedder.running(shard.tenant):
+        raise HTTPException(status_code=409, detail=f"Tenant {shard.tenant} is being re-embedded")
+
+
+@router.get("/")
+async def list_tenants():
+    """Size and search latency of every shard."""
+    return {"tenants": await run_in_threadpool(lambda: [shards.get(t).stats() for t in shards.tenants()])}
+
+
+@router.get("/{tenant}")
+async def get_tenant(tenant: str):
+    shard = get_shard(tenant)
+    return await run_in_threadpool(shard.stats)
+
+
+@router.delete("/{tenant}")
+async def drop_tenant(tenant: str):
+    """Delete a tenant: its collection, indexes, catalog and uploads."""
+    shard = get_shard(tenant)
+    if shard.tenant == DEFAULT_TENANT:
+        raise HTTPException(status_code=400, detail="The default tenant cannot be dropped")
+    ensure_idle(shard)
+    sources = list(shard.catalog.entries)
+    await run_in_threadpool(reembedder.discard, shard)
+    await run_in_threadpool(shards.drop, shard.tenant)
+    if answer_cache is not None:
+        for source in sources:
+            answer_cache.invalidate_source(source)
+    return {"tenant": shard.tenant, "status": "dropped", "documents": len(sources)}
+
+
+@router.post("/{tenant}/rebuild")
+async def rebuild_tenant(tenant: str):
+    """Re-index a tenant from its uploaded files; other tenants are not touched.
+
+    The shard's collection and indexes are deleted first, so the tenant
+    answers from an empty index until the queued jobs finish.
+    """
+    shard = get_shard(tenant)
+    ensure_idle(shard)
+    await run_in_threadpool(reembedder.discard, shard)
+    await run_in_threadpool(shard.reset)
+
+    jobs, missing = [], []
+    for entry in list(shard.catalog.entries.values()):
+        path = os.path.join(shard.upload_dir, entry["name"])
+        if not os.path.exists(path) and entry.get("content_hash"):
+            path = object_path(entry["content_hash"], os.path.splitext(entry["name"])[1].lower())
+        if not os.path.exists(path):
+            missing.append(entry["name"])
+            continue
+        if answer_cache is not None:
+            answer_cache.invalidate_source(entry["name"])
+        job = ingestion_queue.submit(path, entry["name"], content_hash=entry.get("content_hash"),
+                                     tenant=shard.tenant)
+        jobs.append({"filename": entry["name"], "job_id": job["id"]})
+    return {"tenant": shard.tenant, "status": "rebuilding", "jobs": jobs, "missing": missing}
+
+
+@router.post("/{tenant}/reembed")
+async def start_reembed(tenant: str, request: ReembedRequest):
+    """Re-embed a tenant into a shadow collection with another model, then swap it in.
+
+    Chat keeps using the current collection until the swap; an interrupted
+    job resumes at startup, a failed one by posting the same model again.
+    """
+    shard = get_shard(tenant)
+    try:
+        progress = await run_in_threadpool(reembedder.start, shard, request.model or EMBED_MODEL)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(status_code=202, content=progress)
+
+
+@router.get("/{tenant}/reembed")
+async def get_reembed(tenant: str):
+    """Progress and ETA of the tenant's latest re-embedding."""
+    shard = get_shard(tenant)
+    progress = reembedder.get(shard.tenant)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No re-embedding for this tenant")
+    return progress
+
+
+@router.delete("/{tenant}/reembed")
+async def cancel_reembed(tenant: str):
+    """Cancel a running re-embedding; its shadow collection is dropped."""
+    shard = get_shard(tenant)
+    if not reembedder.cancel(shard.tenant):
+        raise HTTPException(status_code=404, detail="No running re-embedding for this tenant")
+    return {"tenant": shard.tenant, "status": "cancelling"}
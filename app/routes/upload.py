@@ -1,85 +1,111 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional
 
 from app.utils.file_handler import save_upload_file
-from app.services.extractor import extract_text_and_metadata
-from app.services.preprocessing import preprocess_text
-from app.services.embedding import embed_and_store
+from app.services.ingestion import ingestion_queue
+from app.services.shards import DEFAULT_TENANT, Shard, shards
 
 router = APIRouter()
 
-#soon add streaming response for better user experience di frontend
 
-@router.post("/")
-async def upload_doc(file: UploadFile = File(...)):
-    # 1) Simpan file
+def get_shard(tenant: Optional[str]) -> Shard:
+    """Shard of the upload's tenant (created on first upload); HTTP 400 for invalid keys."""
     try:
-        file_path = save_upload_file(file)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
+        return shards.get(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # 2) Ekstrak teks & metadata
+
+@router.post("/")
+async def upload_doc(file: UploadFile = File(...), tenant: Optional[str] = Form(None)):
+    shard = get_shard(tenant)
+    # 1) Simpan file (streaming per blok + SHA-256), di luar event loop
     try:
-        text, metadata = extract_text_and_metadata(file_path)
-        # Add filename to metadata
-        metadata["filename"] = file.filename
+        stored = await run_in_threadpool(save_upload_file, file, shard.upload_dir)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Extraction error: {e}")
-
-    # 3) Preprocessing + chunking
-    chunks = preprocess_text(text)
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
 
-    # 4) Embedding & simpan ke Vector DB
-    embed_and_store(chunks, metadata)
+    # 2) Ekstraksi, chunking & embedding jalan di background queue,
+    #    kecuali isi file yang sama sudah pernah/sedang diproses di tenant ini
+    result = ingestion_queue.submit_stored(stored, tenant=shard.tenant)
 
     return JSONResponse(
-        status_code=200,
+        status_code=200 if result["status"] == "duplicate" else 202,
         content={
-            "filename": file.filename,
-            "metadata": metadata,
-            "chunks_count": len(chunks),
+            "job_id": result["job_id"],
+            "filename": stored["filename"],
+            "tenant": shard.tenant,
+            "status": result["status"],
+            "duplicate_of": result["duplicate_of"],
+            "content_hash": stored["content_hash"],
         },
     )
 
 
 @router.post("/batch")
-async def upload_multiple_docs(files: List[UploadFile] = File(...)):
+async def upload_multiple_docs(files: List[UploadFile] = File(...), tenant: Optional[str] = Form(None)):
+    shard = get_shard(tenant)
     results = []
-    
+
     for file in files:
         try:
             # 1) Simpan file
-            file_path = save_upload_file(file)
-            
-            # 2) Ekstrak teks & metadata
-            text, metadata = extract_text_and_metadata(file_path)
-            
-            # 3) Preprocessing + chunking
-            chunks = preprocess_text(text)
-            
-            # 4) Embedding & simpan ke Vector DB
-            embed_and_store(chunks, metadata)
-            
+            stored = await run_in_threadpool(save_upload_file, file, shard.upload_dir)
+
+            # 2) Serahkan ke ingestion queue
+            result = ingestion_queue.submit_stored(stored, tenant=shard.tenant)
+
             results.append({
-                "filename": file.filename,
-                "status": "success",
-                "metadata": metadata,
-                "chunks_count": len(chunks),
+                "filename": stored["filename"],
+                "status": result["status"],
+                "job_id": result["job_id"],
+                "duplicate_of": result["duplicate_of"],
             })
-            
+
         except Exception as e:
             results.append({
                 "filename": file.filename,
                 "status": "error",
                 "error": str(e)
             })
-    
+
     return JSONResponse(
-        status_code=200,
+        status_code=202,
         content={
+            "tenant": shard.tenant,
             "total_files": len(files),
             "processed_files": len(results),
             "results": results
         }
     )
+
+
+@router.get("/jobs/metrics")
+async def get_ingestion_metrics():
+    """Throughput metrics of the ingestion queue."""
+    return ingestion_queue.metrics()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status job ingestion: tahap, halaman selesai dan error."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "tenant": job.get("tenant", DEFAULT_TENANT),
+        "status": job["status"],
+        "stage": job["stage"],
+        "pages_done": job["pages_done"],
+        "pages_total": job["pages_total"],
+        "chunks_count": job["chunks_count"],
+        "metadata": job["metadata"],
+        "errors": job["errors"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
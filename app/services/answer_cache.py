@@ -0,0 +1,141 @@
+import os
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def result_fingerprint(results) -> tuple:
+    """Fingerprint of a retrieval result: the sorted ids of the retrieved chunks."""
+    return tuple(sorted(
+        doc.metadata.get("chunk_id") or doc.id or "" for doc, score in results
+    ))
+
+
+class AnswerCache:
+    """Semantic cache of generated answers.
+
+    An answer is reused when a new query retrieves exactly the same chunks
+    (same fingerprint) and its embedding has cosine similarity of at least
+    ``threshold`` with the cached query. Entries expire after ``ttl``
+    seconds, the cache holds at most ``max_entries`` (LRU), and every entry
+    is dropped as soon as one of its source documents is re-ingested.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._by_fingerprint: dict[tuple, set[str]] = {}
+        self._by_source: dict[str, set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _drop(self, entry_id: str):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._by_fingerprint.get(entry["fingerprint"])
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_fingerprint[entry["fingerprint"]]
+        for source in entry["sources"]:
+            ids = self._by_source.get(source)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_source[source]
+
+    def lookup(self, vector: list[float], fingerprint: tuple) -> Optional[dict]:
+        query = _normalize(vector)
+        now = time.time()
+        with self._lock:
+            best, best_score = None, self.threshold
+            for entry_id in list(self._by_fingerprint.get(fingerprint, ())):
+                entry = self._entries[entry_id]
+                if now - entry["created_at"] > self.ttl:
+                    self._drop(entry_id)
+                    continue
+                score = sum(a * b for a, b in zip(query, entry["vector"]))
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best["id"])
+            self.hits += 1
+            return best
+
+    def store(self, vector: list[float], fingerprint: tuple, sources: set[str],
+              answer: str, sources_data: list[dict]):
+        entry = {
+            "id": uuid.uuid4().hex,
+            "vector": _normalize(vector),
+            "fingerprint": fingerprint,
+            "sources": set(sources),
+            "answer": answer,
+            "sources_data": sources_data,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._entries[entry["id"]] = entry
+            self._by_fingerprint.setdefault(fingerprint, set()).add(entry["id"])
+            for source in entry["sources"]:
+                self._by_source.setdefault(source, set()).add(entry["id"])
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_source(self, source: str) -> int:
+        """Drop every cached answer built from ``source``."""
+        with self._lock:
+            ids = list(self._by_source.get(source, ()))
+            for entry_id in ids:
+                self._drop(entry_id)
+            self.invalidations += len(ids)
+        if ids:
+            logger.info(f"Answer cache: invalidated {len(ids)} answers for {source}")
+        return len(ids)
+
+    def clear(self) -> int:
+        """Drop every cached answer, e.g. after the query embedding model changed."""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._by_fingerprint.clear()
+            self._by_source.clear()
+            self.invalidations += count
+        return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
@@ -0,0 +1,156 @@
+"""Extraction artifacts: per-segment text and entities of a file, by content hash.
+
+Re-indexing a file (other chunk size, other embedding model, rebuilt
+vector store) starts from its artifact instead of the original file, so
+OCR and text extraction run once per content. An artifact is a gzip'ed
+JSON-lines file ``{ARTIFACTS_DIR}/{hash[:2]}/{hash}-{extraction key}.jsonl.gz``:
+a header line, then one line per segment with its entities.
+
+The extraction key changes with ``EXTRACTOR_VERSION`` and the settings that
+change extracted text (OCR DPI, scanned-page threshold, image size cap), which makes old
+artifacts unreachable. The NER key is stored in the header; when only NER
+settings changed, the cached text is reused and NER runs again.
+
+Runs in the ingestion worker processes: no heavy imports here.
+"""
+import os
+import json
+import gzip
+import hashlib
+import logging
+import time
+from typing import Iterator, Optional
+
+from app.services import extractor, ner
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "1") == "1"
+ARTIFACTS_DIR = os.getenv(
+    "ARTIFACTS_DIR", os.path.join(os.getenv("UPLOAD_DIR", "upload"), ".artifacts")
+)
+ARTIFACT_FORMAT = 1
+# Kompresi cepat; teks hasil ekstraksi biasanya mengecil 3-5x
+ARTIFACT_COMPRESSLEVEL = int(os.getenv("ARTIFACT_COMPRESSLEVEL", "6"))
+
+
+def _key(settings: dict) -> str:
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def extraction_key() -> str:
+    """Identifies the extractor output: version plus settings that change the text."""
+    return _key({
+        "version": extractor.EXTRACTOR_VERSION,
+        "ocr_dpi": extractor.OCR_DPI,
+        "pdf_min_text_chars": extractor.PDF_MIN_TEXT_CHARS,
+        "ocr_image_max_side": extractor.OCR_IMAGE_MAX_SIDE,
+    })
+
+
+def ner_key() -> str:
+    return _key({"model": ner.SPACY_MODEL, "segment_chars": ner.NER_SEGMENT_CHARS})
+
+
+class Artifact:
+    """A stored artifact; ``segments()`` re-reads it from disk on every call."""
+
+    def __init__(self, path: str, header: dict):
+        self.path = path
+        self.header = header
+
+    @property
+    def has_entities(self) -> bool:
+        return self.header.get("ner") == ner_key()
+
+    def segments(self) -> Iterator[tuple[dict, list]]:
+        """``(segment, entities)`` pairs as ``ner.annotate_segments`` yields them."""
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            next(f)
+            for line in f:
+                record = json.loads(line)
+                yield record["segment"], [tuple(e) for e in record["entities"]]
+
+
+class ArtifactWriter:
+    """Writes an artifact to a temp file; ``commit()`` moves it into place.
+
+    ``complete`` turns false when a segment carries an OCR error: such an
+    artifact should be aborted, so the next run retries the OCR.
+    """
+
+    def __init__(self, path: str, header: dict, compresslevel: int = ARTIFACT_COMPRESSLEVEL):
+        self.path = path
+        self.header = header
+        self.segments = 0
+        self.complete = True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._tmp = f"{path}.{os.getpid()}.tmp"
+        self._file = gzip.open(self._tmp, "wt", encoding="utf-8", compresslevel=compresslevel)
+        self._file.write(json.dumps(header) + "\n")
+
+    def add(self, segment: dict, entities: list):
+        # Waktu OCR bukan bagian dari hasil ekstraksi
+        record = {k: v for k, v in segment.items() if k != "ocr_seconds"}
+        if segment.get("ocr_error"):
+            self.complete = False
+        self._file.write(json.dumps({"segment": record, "entities": entities}, ensure_ascii=False) + "\n")
+        self.segments += 1
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp)
+        except FileNotFoundError:
+            pass
+
+
+class ArtifactStore:
+    """Content-addressed extraction artifacts on disk."""
+
+    def __init__(self, directory: str = ARTIFACTS_DIR):
+        self.directory = directory
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], f"{content_hash}-{extraction_key()}.jsonl.gz")
+
+    def load(self, content_hash: str) -> Optional[Artifact]:
+        """Artifact of this content for the current extraction key, if any.
+
+        The file is read once to check it; a damaged artifact is deleted and
+        reported as missing, so the file is extracted again.
+        """
+        path = self.path(content_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                header = json.loads(next(f))
+                count = sum(1 for _ in f)
+            if header.get("format") != ARTIFACT_FORMAT or not count:
+                raise ValueError("unknown format or no segments")
+        except (OSError, EOFError, StopIteration, ValueError) as e:
+            logger.warning(f"Discarding damaged artifact {path}: {e}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return Artifact(path, header)
+
+    def writer(self, content_hash: str, file_type: str) -> ArtifactWriter:
+        return ArtifactWriter(self.path(content_hash), {
+            "format": ARTIFACT_FORMAT,
+            "content_hash": content_hash,
+            "file_type": file_type,
+            "extraction": extraction_key(),
+            "ner": ner_key(),
+            "created_at": time.time(),
+        })
+
+
+artifact_store = ArtifactStore() if ARTIFACTS_ENABLED else None
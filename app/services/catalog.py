@@ -0,0 +1,184 @@
+import os
+import json
+import logging
+import time
+import threading
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.getenv(
+    "CATALOG_PATH",
+    os.path.join(os.getenv("CHROMA_DIR", "vectorstore"), "catalog.json"),
+)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "upload")
+# Jumlah file maksimal yang disebut satu per satu di prompt chat
+CATALOG_SUMMARY_LIMIT = int(os.getenv("CATALOG_SUMMARY_LIMIT", "20"))
+# Perubahan ditulis ke disk paling sering sekali per interval ini (detik)
+CATALOG_SAVE_INTERVAL = float(os.getenv("CATALOG_SAVE_INTERVAL", "2"))
+
+
+class DocumentCatalog:
+    """In-memory catalog of ingested documents, persisted as JSON.
+
+    Ingestion calls ``upsert`` once per document; chat prompts read the
+    precomputed ``stats`` and bounded ``summary`` instead of scanning the
+    upload directory on every request. Writes are batched: the JSON file is
+    rewritten at most once per ``CATALOG_SAVE_INTERVAL`` seconds, and
+    ``flush`` writes pending changes immediately.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH, upload_dir: str = UPLOAD_DIR):
+        self.path = path
+        self.upload_dir = upload_dir
+        self._lock = threading.Lock()
+        self.entries: dict[str, dict] = {}
+        self._by_hash: dict[str, str] = {}
+        self._stats: Optional[dict] = None
+        self._summary: Optional[dict] = None
+        self._dirty = False
+        self._last_save = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = {e["name"]: e for e in json.load(f)}
+                self._reindex()
+                return
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Error reading document catalog, rebuilding: {str(e)}")
+        self._bootstrap_from_upload_dir()
+
+    def _bootstrap_from_upload_dir(self):
+        """One-off scan for deployments that predate the catalog."""
+        if not os.path.isdir(self.upload_dir):
+            return
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            self.entries[name] = {
+                "name": name,
+                "size": st.st_size,
+                "file_type": os.path.splitext(name)[1].lstrip(".").lower(),
+                "uploaded_at": st.st_mtime,
+                "chunk_count": None,
+                "content_hash": None,
+            }
+        if self.entries:
+            logger.info(f"Document catalog bootstrapped from {self.upload_dir}: {len(self.entries)} files")
+            self._save()
+
+    def _reindex(self):
+        self._by_hash = {e["content_hash"]: e["name"] for e in self.entries.values() if e.get("content_hash")}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self.entries.values()), f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _changed(self):
+        """Mark the catalog dirty and save now or schedule a save (lock held)."""
+        self._stats = self._summary = None
+        self._dirty = True
+        wait = self._last_save + CATALOG_SAVE_INTERVAL - time.monotonic()
+        if wait <= 0:
+            self._save()
+        elif self._timer is None:
+            self._timer = threading.Timer(wait, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._timer = None
+            if self._dirty:
+                self._save()
+
+    def discard(self):
+        """Drop pending writes and the save timer, e.g. before deleting the catalog file."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty = False
+
+    def upsert(self, name: str, size: int, file_type: str, chunk_count: int,
+               content_hash: Optional[str] = None, uploaded_at: Optional[float] = None) -> dict:
+        entry = {
+            "name": name,
+            "size": size,
+            "file_type": file_type,
+            "uploaded_at": uploaded_at or datetime.now().timestamp(),
+            "chunk_count": chunk_count,
+            "content_hash": content_hash,
+        }
+        with self._lock:
+            previous = self.entries.get(name)
+            if previous and self._by_hash.get(previous.get("content_hash")) == name:
+                del self._by_hash[previous["content_hash"]]
+            self.entries[name] = entry
+            if content_hash:
+                self._by_hash[content_hash] = name
+            self._changed()
+        return entry
+
+    def remove(self, name: str):
+        with self._lock:
+            entry = self.entries.pop(name, None)
+            if entry is not None:
+                if self._by_hash.get(entry.get("content_hash")) == name:
+                    del self._by_hash[entry["content_hash"]]
+                self._changed()
+
+    def get(self, name: str) -> Optional[dict]:
+        return self.entries.get(name)
+
+    def find_by_hash(self, content_hash: str) -> Optional[dict]:
+        """Catalog entry of an already ingested file with this content, if any."""
+        name = self._by_hash.get(content_hash)
+        return self.entries.get(name) if name else None
+
+    def stats(self) -> dict:
+        """Aggregates over the catalog, recomputed only after a change."""
+        with self._lock:
+            if self._stats is None:
+                entries = list(self.entries.values())
+                by_type: dict[str, int] = {}
+                for e in entries:
+                    by_type[e["file_type"]] = by_type.get(e["file_type"], 0) + 1
+                last = max((e["uploaded_at"] for e in entries), default=None)
+                self._stats = {
+                    "total_files": len(entries),
+                    "total_size": sum(e["size"] for e in entries),
+                    "total_chunks": sum(e["chunk_count"] or 0 for e in entries),
+                    "by_type": by_type,
+                    "last_upload": datetime.fromtimestamp(last).strftime("%Y-%m-%d %H:%M:%S") if last else "-",
+                }
+            return self._stats
+
+    def summary(self, limit: int = CATALOG_SUMMARY_LIMIT) -> dict:
+        """Bounded file listing for prompts: the ``limit`` most recent files."""
+        with self._lock:
+            if self._summary is None or self._summary["limit"] != limit:
+                recent = sorted(self.entries.values(), key=lambda e: e["uploaded_at"], reverse=True)[:limit]
+                remaining = len(self.entries) - len(recent)
+                suffix = f" (+{remaining} file lainnya)" if remaining > 0 else ""
+                self._summary = {
+                    "limit": limit,
+                    "file_list": ", ".join(e["name"] for e in recent) + suffix,
+                    "overview": " | ".join(f"{e['name']} ({e['size'] // 1024}KB)" for e in recent) + suffix,
+                }
+            return self._summary
+
+
+document_catalog = DocumentCatalog()
@@ -1,10 +1,12 @@
 import os, json
+import hashlib
 import logging
-from langchain_chroma.vectorstores import Chroma
-from langchain.embeddings.base import Embeddings
-from app.services.llm_client import generate_embedding
-import chromadb
-from chromadb.utils import embedding_functions
+from typing import Callable, Iterable, Optional
+from langchain_core.embeddings import Embeddings
+from app.services.llm_client import EMBED_MODEL, generate_embedding
+from app.services.embedding_cache import cached_embedding
+from app.services.metrics import INGEST_CHUNKS, STAGE_SECONDS, StageTimer
+from app.services.shards import DEFAULT_TENANT, Shard, shards
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -14,13 +16,16 @@ CHROMA_DIR = os.getenv("CHROMA_DIR", "vectorstore")
 os.makedirs(CHROMA_DIR, exist_ok=True)
 
 class OllamaEmbeddings(Embeddings):
-    model: str = "llama3"
+    """langchain embeddings from Ollama, through the embedding cache."""
+
+    def __init__(self, model: str = "llama3"):
+        self.model = model
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
         if not texts:
             logger.warning("No texts provided for embedding")
             return []
-        embeddings = generate_embedding(texts, model=self.model)
+        embeddings = cached_embedding(texts, self.model, generate_embedding)
         if not embeddings:
             logger.error("Failed to generate embeddings")
             raise ValueError("Failed to generate embeddings")
@@ -30,67 +35,238 @@ class OllamaEmbeddings(Embeddings):
         if not text:
             logger.warning("Empty text provided for embedding")
             return []
-        embeddings = generate_embedding([text], model=self.model)
-        if not embeddings:
-            logger.error("Failed to generate embedding")
-            raise ValueError("Failed to generate embedding")
-        return embeddings[0]
+        return self.embed_documents([text])[0]
 
-class ChromaOllamaEmbeddingFunction(embedding_functions.EmbeddingFunction, Embeddings):
-    def __init__(self, model: str = "llama3"):
-        self.model = model
+class ChromaOllamaEmbeddingFunction(OllamaEmbeddings):
+    """``OllamaEmbeddings`` that can also be called like a Chroma embedding function."""
 
     def __call__(self, texts: list[str]) -> list[list[float]]:
-        if not texts:
-            logger.warning("No texts provided for embedding")
-            return []
-        embeddings = generate_embedding(texts, model=self.model)
-        if not embeddings:
-            logger.error("Failed to generate embeddings")
-            raise ValueError("Failed to generate embeddings")
-        return embeddings
-    
-    def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return self(texts)
+        return self.embed_documents(texts)
 
-    def embed_query(self, text: str) -> list[float]:
-        return self([text])[0]
-
-embeddings = ChromaOllamaEmbeddingFunction()
-vectorstore = Chroma(
-    collection_name="documents",
-    embedding_function=embeddings,
-    persist_directory=CHROMA_DIR,
-)
-
-def embed_and_store(chunks: list[str], metadata: dict):
-    if not chunks:
-        logger.warning("No chunks provided for embedding")
-        return
-    
-    # Filter out empty chunks
-    chunks = [chunk for chunk in chunks if chunk.strip()]
-    if not chunks:
-        logger.warning("No non-empty chunks to embed")
-        return
-
-    ids = [f"doc_{i}" for i in range(len(chunks))]
-    entities_str = json.dumps([
-        {"text": ent[0], "label": ent[1]} for ent in metadata.get("entities", [])
-    ])
-    metadatas = [
-        {
-            "chunk_index": i,
-            "entities": entities_str,
-            "file_type": metadata.get("file_type", "unknown"),
-            "source": metadata.get("filename", "")
+embeddings = ChromaOllamaEmbeddingFunction(EMBED_MODEL)
+
+def get_vectorstore(tenant: Optional[str] = None):
+    """Vector store of a tenant shard (default tenant when ``None``).
+
+    Stores are opened on first use (or by the startup warm-up);
+    chromadb, langchain_chroma and numpy are only imported then, so
+    importing this module stays cheap.
+    """
+    return shards.get(tenant).store
+
+
+def close_vectorstore():
+    """Flush every open shard (e.g. the HNSW index of the quantized backend) on shutdown."""
+    shards.close()
+
+
+def document_id(source: str, tenant: str = DEFAULT_TENANT) -> str:
+    """Stable id of a document, derived from its tenant and source filename."""
+    key = source if tenant == DEFAULT_TENANT else f"{tenant}/{source}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+def _manifest_path(manifest_dir: str, doc_id: str) -> str:
+    return os.path.join(manifest_dir, f"{doc_id}.json")
+
+
+def load_manifest(manifest_dir: str, doc_id: str) -> dict:
+    """Chunk hashes already stored for a document, as ``{hash: chunk_index}``."""
+    try:
+        with open(_manifest_path(manifest_dir, doc_id), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"doc_id": doc_id, "source": "", "chunks": {}}
+
+
+def save_manifest(manifest_dir: str, manifest: dict):
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = _manifest_path(manifest_dir, manifest["doc_id"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+EMBED_STORE_BATCH = int(os.getenv("EMBED_STORE_BATCH", "64"))
+
+
+def _chunk_record(chunk) -> dict:
+    return {"text": chunk} if isinstance(chunk, str) else chunk
+
+
+def embed_and_store(chunks: Iterable, metadata: dict, progress: Optional[Callable] = None,
+                    shard: Optional[Shard] = None):
+    """Embed and store the chunks of one document incrementally.
+
+    ``chunks`` may be any iterable (e.g. a stream from the chunker) of chunk
+    texts or chunk dicts from ``preprocessing.iter_chunks``; it is consumed
+    in batches of ``EMBED_STORE_BATCH``, so embedding starts before the
+    document is fully extracted. Chunk offsets, pages, section and entities
+    from the dicts are stored as chunk metadata.
+
+    Chunks are mirrored into the BM25 lexical index. The document entity
+    list (``metadata["entities"]``, which may arrive with the end of the
+    stream) and the per-chunk entities go to the entity index; chunk
+    metadata only carries the chunk's own entities.
+
+    Everything is written to ``shard`` (the default tenant when omitted),
+    embedded with the model of its live collection; the collection is not
+    swapped by a re-embedding while the document is written.
+    Chunk ids are ``{doc_id}-{chunk_hash}``, so the same text in the same
+    document always maps to the same id. Chunks already listed in the
+    document manifest are not embedded again (only their metadata is
+    refreshed), and chunks that disappeared from the document are deleted in
+    one bulk call at the end.
+
+    Returns ``{"added": n, "unchanged": n, "deleted": n}``.
+    """
+    shard = shard or shards.get()
+    with shard.swap_lock.shared():
+        return _store_document(chunks, metadata, progress, shard)
+
+
+def _store_document(chunks: Iterable, metadata: dict, progress: Optional[Callable], shard: Shard):
+    source = metadata.get("filename", "")
+    doc_id = document_id(source, shard.tenant)
+    store = shard.store
+    embedder = ChromaOllamaEmbeddingFunction(shard.model)
+    lexical_index, entity_index = shard.lexical, shard.entities
+    manifest = load_manifest(shard.manifest_dir, doc_id)
+    stored = manifest["chunks"]
+    file_type = metadata.get("file_type", "unknown")
+
+    # Chunk identik dalam satu dokumen cukup disimpan sekali
+    current: dict[str, int] = {}
+    chunk_entities: dict[str, list[dict]] = {}
+    added = 0
+    timer = StageTimer("embedding", "store")
+
+    def chunk_metadata(h: str, chunk: dict) -> dict:
+        meta = {
+            "chunk_index": current[h],
+            "chunk_id": f"{doc_id}-{h}",
+            "doc_id": doc_id,
+            "entities": json.dumps([
+                {"text": ent["text"], "label": ent["label"], "count": ent["count"]}
+                for ent in chunk.get("entities", [])
+            ]),
+            "file_type": file_type,
+            "source": source,
         }
-        for i in range(len(chunks))
-    ]
+        for key in ("start", "end", "page_start", "page_end", "section", "row_start", "row_end", "tokens"):
+            if chunk.get(key) is not None:
+                meta[key] = chunk[key]
+        return meta
+
+    def flush(batch: list[tuple[str, dict]]):
+        nonlocal added
+        new = [(h, c) for h, c in batch if h not in stored]
+        existing = [(h, c) for h, c in batch if h in stored]
+        if new:
+            if progress:
+                progress("embedding")
+            texts = [c["text"] for h, c in new]
+            with timer.measure("embedding", chunks=len(new)):
+                vectors = embedder.embed_documents(texts)
+            if progress:
+                progress("storing")
+            with timer.measure("store", chunks=len(new)):
+                store.upsert(
+                    ids=[f"{doc_id}-{h}" for h, c in new],
+                    embeddings=vectors,
+                    documents=texts,
+                    metadatas=[chunk_metadata(h, c) for h, c in new],
+                )
+            added += len(new)
+        with timer.measure("store", chunks=len(batch)):
+            if existing:
+                # Posisi/halaman bisa bergeser walau teks sama; cukup update metadata
+                store.update_metadata(
+                    ids=[f"{doc_id}-{h}" for h, c in existing],
+                    metadatas=[chunk_metadata(h, c) for h, c in existing],
+                )
+            lexical_index.upsert(
+                (f"{doc_id}-{h}", doc_id, c["text"], chunk_metadata(h, c)) for h, c in batch
+            )
 
     try:
-        vectorstore.add_texts(texts=chunks, metadatas=metadatas, ids=ids)
-        logger.info(f"Successfully stored {len(chunks)} chunks in vector store")
+        batch: list[tuple[str, dict]] = []
+        for chunk in chunks:
+            chunk = _chunk_record(chunk)
+            if not chunk["text"].strip():
+                continue
+            h = chunk_hash(chunk["text"])
+            if h in current:
+                continue
+            current[h] = len(current)
+            chunk_entities[f"{doc_id}-{h}"] = chunk.get("entities", [])
+            batch.append((h, chunk))
+            if len(batch) >= EMBED_STORE_BATCH:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        if not current:
+            # Tetap lanjut: chunk versi lama dokumen ini harus dihapus semua
+            logger.warning(f"No non-empty chunks to embed for {source}")
+
+        stale_hashes = [h for h in stored if h not in current]
+        with timer.measure("store", chunks=len(stale_hashes)):
+            if stale_hashes:
+                store.delete(ids=[f"{doc_id}-{h}" for h in stale_hashes])
+                lexical_index.delete(f"{doc_id}-{h}" for h in stale_hashes)
+            entity_index.replace_document(doc_id, source, metadata.get("entities", []), chunk_entities)
     except Exception as e:
         logger.error(f"Error storing chunks in vector store: {str(e)}")
+        # Chunk yang sudah tersimpan tetap dicatat supaya bisa dibersihkan nanti
+        save_manifest(shard.manifest_dir, {"doc_id": doc_id, "source": source, "chunks": {**stored, **current}})
         raise
+
+    save_manifest(shard.manifest_dir, {"doc_id": doc_id, "source": source, "chunks": current})
+    stats = {
+        "added": added,
+        "unchanged": len(current) - added,
+        "deleted": len(stale_hashes),
+    }
+    for stage, seconds in timer.inclusive.items():
+        STAGE_SECONDS.observe(seconds, pipeline="ingest", stage=stage)
+    for result, count in stats.items():
+        INGEST_CHUNKS.inc(count, result=result)
+    logger.info(
+        f"Stored {source}: {stats['added']} new, {stats['unchanged']} unchanged, "
+        f"{stats['deleted']} stale chunks removed"
+    )
+    return stats
+
+
+def sync_lexical_index(shard: Optional[Shard] = None, batch_size: int = 1000) -> int:
+    """Add chunks of the vector store that are missing from the lexical index.
+
+    For shards (default tenant when omitted) created before the lexical
+    index existed. Runs in the startup warm-up while uploads may already be
+    stored, so it compares ids instead of only filling an empty index;
+    returns the number of chunks indexed.
+    """
+    shard = shard or shards.get()
+    lexical_index = shard.lexical
+    store = shard.store
+    if lexical_index.count() >= store.count():
+        return 0
+    missing = sorted(store.ids() - lexical_index.ids())
+    total = 0
+    for start in range(0, len(missing), batch_size):
+        page = store.get_by_ids(missing[start:start + batch_size])
+        lexical_index.upsert(
+            (chunk_id, (meta or {}).get("doc_id", ""), text or "", meta or {})
+            for chunk_id, text, meta in zip(page["ids"], page["documents"], page["metadatas"])
+        )
+        total += len(page["ids"])
+    if total:
+        logger.info(f"Lexical index of {shard.tenant} filled from vector store: {total} chunks")
+    return total
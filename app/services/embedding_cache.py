@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+EMBED_CACHE_PATH = os.getenv(
+    "EMBED_CACHE_PATH",
+    os.path.join(os.getenv("CHROMA_DIR", "vectorstore"), "embedding_cache.sqlite"),
+)
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "5000"))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Content address of an embedding: model + hash of the normalized text."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    """Persistent embedding cache with an in-memory LRU in front of SQLite.
+
+    Vectors are stored as float32 blobs. When the on-disk payload grows past
+    ``max_bytes`` the least recently used rows are evicted down to 90% of it.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_bytes: int = EMBED_CACHE_MAX_BYTES,
+                 memory_items: int = EMBED_CACHE_MEMORY_ITEMS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, vector: list[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+                else:
+                    missing.append(key)
+            for i in range(0, len(missing), 500):
+                part = missing[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+            disk_keys = [key for key in missing if key in found]
+            if disk_keys:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in disk_keys],
+                )
+                self._conn.commit()
+            self.memory_hits += len(keys) - len(missing)
+            self.disk_hits += len(disk_keys)
+            self.misses += len(missing) - len(disk_keys)
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            existing = 0
+            for i in range(0, len(rows), 500):
+                part = [row[0] for row in rows[i:i + 500]]
+                existing += self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._total_bytes += sum(row[2] for row in rows) - existing
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            removed = []
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                removed.append(key)
+                self._total_bytes -= size
+                self._lru.pop(key, None)
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(k,) for k in removed])
+            self.evictions += len(removed)
+        logger.info(f"Embedding cache evicted down to {self._total_bytes} bytes")
+
+    def embed(self, texts: list[str], model: str,
+              embed_fn: Callable[[list[str], str], list[list[float]]]) -> list[list[float]]:
+        """Return embeddings for ``texts``, calling ``embed_fn`` only for cache misses."""
+        keys = [cache_key(model, text) for text in texts]
+        found = self.get_many(keys)
+
+        pending: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        if pending:
+            vectors = embed_fn(list(pending.values()), model)
+            if len(vectors) != len(pending):
+                raise ValueError("Embedding backend returned a different number of vectors")
+            computed = dict(zip(pending.keys(), vectors))
+            self.put_many({k: v for k, v in computed.items() if v})
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_items": len(self._lru),
+                "disk_bytes": self._total_bytes,
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Shared cache instance, or ``None`` when EMBED_CACHE_ENABLED=0."""
+    global _embedding_cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def cached_embedding(texts: list[str], model: str,
+                     embed_fn: Callable[[list[str], str], list[list[float]]]) -> list[list[float]]:
+    cache = get_embedding_cache()
+    if cache is None:
+        return embed_fn(texts, model)
+    return cache.embed(texts, model, embed_fn)
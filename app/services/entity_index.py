@@ -0,0 +1,125 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+ENTITY_INDEX_PATH = os.getenv(
+    "ENTITY_INDEX_PATH",
+    os.path.join(os.getenv("CHROMA_DIR", "vectorstore"), "entity_index.sqlite"),
+)
+
+
+def normalize_entity(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class EntityIndex:
+    """Document entities and an inverted entity -> chunk index in SQLite.
+
+    The full entity list of a document is stored once (``doc_entities``);
+    ``entity_chunks`` maps each normalized entity text and label to the ids
+    of the chunks that mention it, so retrieval can be restricted to those
+    chunks with a cheap ``chunk_id $in`` pre-filter.
+    """
+
+    def __init__(self, path: str = ENTITY_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS doc_entities (
+                doc_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                entities TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entity_chunks (
+                entity TEXT NOT NULL,
+                label TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (entity, label, chunk_id)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_chunks_doc ON entity_chunks(doc_id)")
+        self._conn.commit()
+
+    def replace_document(self, doc_id: str, source: str, entities: list[dict],
+                         chunk_entities: dict[str, list[dict]]):
+        """Replace everything indexed for ``doc_id`` in one transaction.
+
+        ``entities`` is the deduplicated document list (see
+        ``ner.dedupe_entities``); ``chunk_entities`` maps chunk id to the
+        entities inside that chunk.
+        """
+        rows = {}
+        for chunk_id, found in chunk_entities.items():
+            for ent in found:
+                key = (normalize_entity(ent["text"]), ent["label"], chunk_id)
+                rows[key] = rows.get(key, 0) + ent.get("count", 1)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entity_chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO doc_entities (doc_id, source, entities) VALUES (?, ?, ?)",
+                (doc_id, source, json.dumps(entities)),
+            )
+            self._conn.executemany(
+                "INSERT INTO entity_chunks (entity, label, chunk_id, doc_id, count) VALUES (?, ?, ?, ?, ?)",
+                [(entity, label, chunk_id, doc_id, count) for (entity, label, chunk_id), count in rows.items()],
+            )
+
+    def remove_document(self, doc_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entity_chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM doc_entities WHERE doc_id = ?", (doc_id,))
+
+    def document_entities(self, doc_id: str) -> list[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entities FROM doc_entities WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def chunks_for(self, filters: Iterable[dict]) -> set[str]:
+        """Ids of the chunks that mention every entity in ``filters``.
+
+        Each filter is ``{"text": ..., "label": ...}``; ``label`` is optional
+        and matching ignores case and whitespace differences.
+        """
+        result: Optional[set[str]] = None
+        with self._lock:
+            for f in filters:
+                query = "SELECT chunk_id FROM entity_chunks WHERE entity = ?"
+                params = [normalize_entity(f["text"])]
+                if f.get("label"):
+                    query += " AND label = ?"
+                    params.append(f["label"])
+                ids = {row[0] for row in self._conn.execute(query, params)}
+                result = ids if result is None else result & ids
+                if not result:
+                    break
+        return result or set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            docs = self._conn.execute("SELECT COUNT(*) FROM doc_entities").fetchone()[0]
+            postings, entities = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT entity || '|' || label) FROM entity_chunks"
+            ).fetchone()
+        return {"documents": docs, "entities": entities, "postings": postings}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+entity_index = EntityIndex()
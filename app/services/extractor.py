@@ -1,133 +1,487 @@
 import os
 import logging
+import datetime
 import tempfile
+import importlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 
-import pandas as pd
-import pdfplumber
-from docx import Document
-from PIL import Image
-import pytesseract
-from pdf2image import convert_from_path
-import spacy
-from spacy.cli import download as spacy_download
+from app.services.metrics import timed_call
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    spacy_download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".doc", ".xlsx", ".xls", ".png", ".jpg", ".jpeg", ".tiff"}
+# Naikkan setiap kali output iter_segments berubah; artifact ekstraksi lama
+# (app.services.artifacts) tidak dipakai lagi dan file diekstrak ulang
+EXTRACTOR_VERSION = "2"
 
-# Load spaCy model untuk metadata extraction
-nlp = spacy.load("en_core_web_sm")
+# Library ekstraksi diimpor saat file jenis itu pertama kali diproses;
+# preload() memuat semuanya di muka (warm-up worker).
+EXTRACTOR_MODULES = ["pdfplumber", "pdf2image", "pytesseract", "docx", "openpyxl", "PIL.Image"]
 
+# OCR settings
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WINDOW_PAGES = int(os.getenv("OCR_WINDOW_PAGES", "8"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Halaman dengan teks langsung lebih pendek dari ini dianggap hasil scan
+PDF_MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "10"))
+# Gambar tanpa info DPI hanya diperkecil sampai sisi terpanjang ini (px)
+OCR_IMAGE_MAX_SIDE = int(os.getenv("OCR_IMAGE_MAX_SIDE", "4000"))
+# Fax resolusi rendah diperbesar, tapi tidak lebih dari ini
+OCR_IMAGE_MAX_UPSCALE = 2.0
+
+# Tesseract jalan paralel per halaman, jadi batasi OpenMP di tiap proses
+# tesseract supaya tidak over-subscribe core.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def preload():
+    """Import the extraction libraries now instead of on first use."""
+    for name in EXTRACTOR_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Extractor library {name} not available: {e}")
+
+
+def extract_text_from_image(image, dpi: Optional[int] = None) -> Optional[str]:
+    """Extract text from an image using OCR; ``None`` when OCR failed.
+
+    ``dpi`` tells tesseract the resolution of an image that was rescaled.
+    """
+    import pytesseract
 
-def extract_text_from_image(image):
-    """Extract text from an image using OCR."""
     try:
         # Convert image to grayscale for better OCR
         if image.mode != 'L':
             image = image.convert('L')
         # Use pytesseract to extract text
-        text = pytesseract.image_to_string(image, lang='eng')
+        config = f"--dpi {dpi}" if dpi else ""
+        text = pytesseract.image_to_string(image, lang='eng', config=config)
         return text.strip()
     except Exception as e:
         logger.error(f"Error in OCR: {str(e)}")
-        return ""
+        return None
 
 
-def extract_text_and_metadata(file_path: str):
-    ext = os.path.splitext(file_path)[1].lower()
-    text = ""
+def ocr_image_file(path: str) -> Optional[str]:
+    """OCR an image file already on disk (tesseract reads it directly); ``None`` when OCR failed."""
+    import pytesseract
+
+    try:
+        return pytesseract.image_to_string(path, lang='eng').strip()
+    except Exception as e:
+        logger.error(f"Error in OCR: {str(e)}")
+        return None
+
+
+def normalize_image(image, target_dpi: int = OCR_DPI, max_side: int = OCR_IMAGE_MAX_SIDE):
+    """Grayscale copy of ``image`` scaled to ``target_dpi``; returns ``(image, dpi)``.
+
+    The scale comes from the resolution stored in the file; an axis with a
+    lower resolution (fax TIFFs are often 204x98 dpi) is first stretched to
+    match the other, and upscaling beyond that is capped at
+    ``OCR_IMAGE_MAX_UPSCALE``. Images without a resolution are only shrunk
+    to ``max_side``; ``dpi`` is then ``None``.
+    """
+    from PIL import Image
 
+    dpi = image.info.get("dpi")
+    if image.mode != "L":
+        image = image.convert("L")
+    scale_x = scale_y = 1.0
+    if dpi and dpi[0] and dpi[1]:
+        # Samakan dulu resolusi kedua sumbu, lalu skala seragam ke target
+        base = max(float(dpi[0]), float(dpi[1]))
+        factor = min(target_dpi / base, OCR_IMAGE_MAX_UPSCALE)
+        scale_x, scale_y = factor * base / float(dpi[0]), factor * base / float(dpi[1])
+        dpi = round(factor * base)
+    else:
+        dpi = None
+    width, height = image.size
+    longest = max(width * scale_x, height * scale_y)
+    if max_side and longest > max_side:
+        scale_x, scale_y = scale_x * max_side / longest, scale_y * max_side / longest
+        dpi = None if dpi is None else round(dpi * max_side / longest)
+    if abs(scale_x - 1) < 0.05 and abs(scale_y - 1) < 0.05:
+        return image, dpi
+    size = (max(1, round(width * scale_x)), max(1, round(height * scale_y)))
+    # reducing_gap: scan 600 dpi dulu di-reduce (box, kelipatan bulat), baru
+    # LANCZOS untuk sisanya; ~8x lebih cepat dan cukup tajam untuk OCR
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=1.0), dpi
+
+
+def ocr_frame(frame) -> Optional[str]:
+    """Normalize and OCR one decoded image frame; ``None`` when OCR failed."""
+    image, dpi = normalize_image(frame)
     try:
-        if ext == ".pdf":
-            logger.info(f"Processing PDF file: {file_path}")
-            
-            # First try: Extract text directly from PDF
+        return extract_text_from_image(image, dpi=dpi)
+    finally:
+        image.close()
+        frame.close()
+
+
+def iter_image_pages(file_path: str, progress: Optional[Callable] = None):
+    """OCR every frame of an image file in order (multi-page TIFF: one page per frame).
+
+    Frames are decoded one at a time here, then scaled (``normalize_image``)
+    and OCR'd on ``OCR_WORKERS`` threads. At most two windows of
+    ``OCR_WINDOW_PAGES`` frames are decoded at once, so memory does not
+    grow with the number of pages.
+
+    Yields ``{"page": n, "text": str, "method": "ocr", "ocr_seconds": s}``;
+    frames that could not be decoded or OCR'd also get ``"ocr_error": True``.
+    """
+    from PIL import Image
+
+    if progress is None:
+        progress = lambda stage, **info: None
+
+    in_flight = 2 * max(1, OCR_WINDOW_PAGES)
+    pending = deque()
+    pages_done = 0
+
+    def finish(n: int, future) -> dict:
+        nonlocal pages_done
+        text, seconds = future.result()
+        segment = {"page": n, "text": text or "", "method": "ocr", "ocr_seconds": seconds}
+        if text is None:
+            segment["ocr_error"] = True
+        elif not text:
+            logger.warning(f"No text extracted from page {n} using OCR")
+        pages_done += 1
+        progress("ocr", pages_done=pages_done, pages_total=pages_total, ocr_pages=pages_done)
+        return segment
+
+    with Image.open(file_path) as image, ThreadPoolExecutor(max_workers=max(1, OCR_WORKERS)) as executor:
+        pages_total = getattr(image, "n_frames", 1)
+        for n in range(1, pages_total + 1):
             try:
-                with pdfplumber.open(file_path) as pdf:
-                    pages_text = []
-                    for i, page in enumerate(pdf.pages):
-                        try:
-                            page_text = page.extract_text()
-                            if page_text:
-                                pages_text.append(page_text)
-                            else:
-                                logger.warning(f"No text extracted from page {i+1}")
-                        except Exception as e:
-                            logger.error(f"Error extracting text from page {i+1}: {str(e)}")
-                    text = "\n".join(pages_text)
+                image.seek(n - 1)
+                # copy(): frame lepas dari file, bisa diproses di thread lain
+                frame = image.copy()
             except Exception as e:
-                logger.error(f"Error in direct text extraction: {str(e)}")
-                text = ""
+                logger.error(f"Error decoding frame {n} of {file_path}: {str(e)}")
+                while pending:
+                    yield finish(*pending.popleft())
+                yield {"page": n, "text": "", "method": "ocr", "ocr_error": True}
+                return
+            pending.append((n, executor.submit(timed_call, ocr_frame, frame)))
+            if len(pending) >= in_flight:
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+
+
+def _page_runs(page_numbers: list[int]):
+    """Group page numbers into runs of consecutive pages."""
+    run = []
+    for n in page_numbers:
+        if run and n != run[-1] + 1:
+            yield run
+            run = []
+        run.append(n)
+    if run:
+        yield run
+
+
+def _pdf_page_count(file_path: str) -> int:
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(file_path)["Pages"])
+
 
-            # Second try: If no text extracted, try OCR
-            if not text.strip():
-                logger.info("No text extracted directly, trying OCR...")
+def iter_pdf_pages(file_path: str, progress: Optional[Callable] = None):
+    """Extract a PDF page by page, yielding pages in order as they are ready.
+
+    Pages are processed in windows of ``OCR_WINDOW_PAGES``. Within a window
+    the text layer is read first; only pages without usable text are
+    rasterized (``first_page``/``last_page``) and OCR'd on ``OCR_WORKERS``
+    threads. The next window is read and its OCR submitted before the
+    current one is yielded, so OCR stays busy while the caller consumes
+    pages. Rasterized pages live in a temporary directory only until OCR'd;
+    at most two windows exist at a time.
+
+    Yields ``{"page": n, "text": str, "method": "direct" | "ocr"}``; pages
+    that could not be rasterized or OCR'd also get ``"ocr_error": True``.
+    """
+    import pdfplumber
+    from pdf2image import convert_from_path
+
+    if progress is None:
+        progress = lambda stage, **info: None
+
+    try:
+        pdf = pdfplumber.open(file_path)
+        pages_total = len(pdf.pages)
+    except Exception as e:
+        # Text layer tidak terbaca sama sekali: OCR semua halaman
+        logger.error(f"Error in direct text extraction: {str(e)}")
+        pdf = None
+        pages_total = _pdf_page_count(file_path)
+
+    window_size = max(1, OCR_WINDOW_PAGES)
+    pages_done = 0
+    ocr_done = 0
+
+    def read_window(first: int, last: int) -> list[dict]:
+        nonlocal pages_done
+        pages = []
+        for n in range(first, last + 1):
+            page_text = ""
+            if pdf is not None:
+                page = pdf.pages[n - 1]
                 try:
-                    # Convert PDF to images
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        images = convert_from_path(file_path)
-                        pages_text = []
-                        
-                        for i, image in enumerate(images):
-                            try:
-                                # Save image temporarily
-                                temp_image_path = os.path.join(temp_dir, f"page_{i}.png")
-                                image.save(temp_image_path, "PNG")
-                                
-                                # Extract text using OCR
-                                page_text = extract_text_from_image(image)
-                                if page_text:
-                                    pages_text.append(page_text)
-                                else:
-                                    logger.warning(f"No text extracted from page {i+1} using OCR")
-                            except Exception as e:
-                                logger.error(f"Error processing page {i+1} with OCR: {str(e)}")
-                        
-                        text = "\n".join(pages_text)
+                    page_text = page.extract_text() or ""
                 except Exception as e:
-                    logger.error(f"Error in OCR process: {str(e)}")
-                    text = ""
+                    logger.error(f"Error extracting text from page {n}: {str(e)}")
+                finally:
+                    page.close()
+            pages.append({"page": n, "text": page_text, "method": "direct"})
+            pages_done += 1
+            progress("extracting", pages_done=pages_done, pages_total=pages_total)
+        return pages
+
+    def submit_ocr(pages: list[dict], temp_dir: str, executor) -> list:
+        by_number = {p["page"]: p for p in pages}
+        scanned = [p["page"] for p in pages if len(p["text"].strip()) < PDF_MIN_TEXT_CHARS]
+        jobs = []
+        for run in _page_runs(scanned):
+            try:
+                paths = convert_from_path(
+                    file_path,
+                    dpi=OCR_DPI,
+                    first_page=run[0],
+                    last_page=run[-1],
+                    output_folder=temp_dir,
+                    grayscale=True,
+                    paths_only=True,
+                )
+            except Exception as e:
+                logger.error(f"Error rasterizing pages {run[0]}-{run[-1]}: {str(e)}")
+                for n in run:
+                    by_number[n]["ocr_error"] = True
+                continue
+            for n, path in zip(run, sorted(paths)):
+                jobs.append((n, path, executor.submit(timed_call, ocr_image_file, path)))
+        return jobs
+
+    def finish_window(pages: list[dict], jobs: list) -> list[dict]:
+        nonlocal ocr_done
+        by_number = {p["page"]: p for p in pages}
+        for n, path, future in jobs:
+            text, seconds = future.result()
+            by_number[n]["ocr_seconds"] = seconds
+            if text:
+                by_number[n].update(text=text, method="ocr")
+            elif text is None:
+                by_number[n]["ocr_error"] = True
+            else:
+                logger.warning(f"No text extracted from page {n} using OCR")
+            os.remove(path)
+            ocr_done += 1
+            progress("ocr", pages_done=pages_done, pages_total=pages_total, ocr_pages=ocr_done)
+        return pages
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                ThreadPoolExecutor(max_workers=max(1, OCR_WORKERS)) as executor:
+            pending = None
+            for first in range(1, pages_total + 1, window_size):
+                pages = read_window(first, min(first + window_size - 1, pages_total))
+                jobs = submit_ocr(pages, temp_dir, executor)
+                if pending is not None:
+                    yield from finish_window(*pending)
+                pending = (pages, jobs)
+            if pending is not None:
+                yield from finish_window(*pending)
+    finally:
+        if pdf is not None:
+            pdf.close()
+
+
+def cell_text(value) -> str:
+    """Text of a spreadsheet cell value; empty for blank cells."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat() if value.time() == datetime.time() else value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def _iter_xlsx_rows(file_path: str):
+    import openpyxl
+
+    # read_only: sheet di-stream dari XML, tidak dimuat utuh ke memori
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            if not hasattr(sheet, "iter_rows"):
+                continue  # chartsheet
+            # Dimensi sheet dari file bisa salah/berlebihan; jangan pad ke sana
+            sheet.reset_dimensions()
+            for row_number, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+                yield sheet.title, row_number, values
+    finally:
+        workbook.close()
+
+
+def _iter_xls_rows(file_path: str):
+    import xlrd  # hanya untuk format .xls lama
+
+    book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        for name in book.sheet_names():
+            sheet = book.sheet_by_name(name)
+            for n in range(sheet.nrows):
+                values = [
+                    xlrd.xldate_as_datetime(cell.value, book.datemode) if cell.ctype == xlrd.XL_CELL_DATE
+                    else cell.value
+                    for cell in sheet.row(n)
+                ]
+                yield name, n + 1, values
+            book.unload_sheet(name)
+    finally:
+        book.release_resources()
+
+
+def iter_sheet_rows(file_path: str):
+    """Stream the non-empty rows of every sheet of a workbook.
+
+    Yields ``(sheet name, row number, [cell texts])`` with blank cells left
+    out; memory use does not grow with the size of the workbook.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    rows = _iter_xls_rows(file_path) if ext == ".xls" else _iter_xlsx_rows(file_path)
+    for sheet, row_number, values in rows:
+        cells = [text for text in map(cell_text, values) if text]
+        if cells:
+            yield sheet, row_number, cells
 
-            if not text.strip():
-                raise ValueError("No text could be extracted from the PDF using either direct extraction or OCR")
 
-        elif ext in [".docx", ".doc"]:
-            doc = Document(file_path)
-            text = "\n".join(p.text for p in doc.paragraphs)
+def _docx_table_rows(table, doc, section: str):
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph
 
-        elif ext in [".xlsx", ".xls"]:
-            df = pd.read_excel(file_path, header=None)
-            # Gabungkan setiap baris jadi satu paragraf
-            text = "\n".join(df.astype(str).agg(" ".join, axis=1).tolist())
+    for row_number, tr in enumerate(table.iterchildren(qn("w:tr")), start=1):
+        cells = []
+        for tc in tr.iterchildren(qn("w:tc")):
+            merge = tc.find(f"{qn('w:tcPr')}/{qn('w:vMerge')}")
+            if merge is not None and merge.get(qn("w:val")) != "restart":
+                continue  # lanjutan sel yang di-merge vertikal; teksnya di baris pertama
+            text = " ".join(Paragraph(p, doc).text.strip() for p in tc.iter(qn("w:p")))
+            if text.strip():
+                cells.append(" ".join(text.split()))
+        if cells:
+            yield {"text": " | ".join(cells), "section": section, "row": row_number, "method": "direct"}
 
-        elif ext in [".png", ".jpg", ".jpeg", ".tiff"]:
-            image = Image.open(file_path)
-            text = extract_text_from_image(image)
 
-        else:
-            raise ValueError(f"Unsupported file type: {ext}")
+def iter_docx_blocks(file_path: str):
+    """Walk the body of a .docx in document order, tables included.
 
-        if not text.strip():
-            raise ValueError(f"No text could be extracted from the file: {file_path}")
+    Yields one segment per paragraph, and per non-empty table row
+    ``{"text": "cell | cell", "section": "Table n", "row": r}`` so the
+    chunker keeps tables apart from the running text. Content controls are
+    walked into; nested tables are flattened into their cell.
+    """
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph
 
-        # Ekstrak entitas dasar sebagai metadata
-        doc = nlp(text)
-        entities = [(ent.text, ent.label_) for ent in doc.ents]
+    doc = Document(file_path)
+    tables = 0
+
+    def blocks(parent):
+        nonlocal tables
+        for child in parent.iterchildren():
+            if child.tag == qn("w:p"):
+                yield {"text": Paragraph(child, doc).text, "method": "direct"}
+            elif child.tag == qn("w:tbl"):
+                tables += 1
+                yield from _docx_table_rows(child, doc, f"Table {tables}")
+            elif child.tag == qn("w:sdt"):
+                content = child.find(qn("w:sdtContent"))
+                if content is not None:
+                    yield from blocks(content)
+
+    yield from blocks(doc.element.body)
+
+
+def iter_segments(file_path: str, progress: Optional[Callable] = None):
+    """Stream the text of a file as segments, without NER.
+
+    A segment is a dict with ``text`` plus location fields (``page`` for
+    PDFs and image frames, ``section``/``row`` for spreadsheet and DOCX
+    table rows) and the
+    ``method`` used (``direct`` or ``ocr``). Joining segment texts with
+    ``"\n"`` gives the full document text.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == ".pdf":
+        logger.info(f"Processing PDF file: {file_path}")
+        yield from iter_pdf_pages(file_path, progress=progress)
+
+    elif ext in [".docx", ".doc"]:
+        yield from iter_docx_blocks(file_path)
+
+    elif ext in [".xlsx", ".xls"]:
+        # Satu segmen per baris; chunker mengelompokkan baris per sheet
+        for sheet, row_number, cells in iter_sheet_rows(file_path):
+            yield {"text": " ".join(cells), "section": sheet, "row": row_number, "method": "direct"}
+
+    elif ext in [".png", ".jpg", ".jpeg", ".tiff"]:
+        yield from iter_image_pages(file_path, progress=progress)
+
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+
+class SegmentStats:
+    """Collects document metadata while segments stream past."""
+
+    def __init__(self):
+        self.methods = set()
+        self.pages = 0
+        self.ocr_pages = 0
+        # Halaman yang dikirim ke OCR (berhasil atau tidak) dan total waktunya
+        self.ocr_attempts = 0
+        self.ocr_seconds = 0.0
+        self.sheets = set()
+        self.rows = 0
+        self.has_text = False
+
+    def add(self, segment: dict):
+        if "page" in segment:
+            self.pages += 1
+            if segment.get("method") == "ocr":
+                self.ocr_pages += 1
+        if "row" in segment:
+            self.sheets.add(segment["section"])
+            self.rows += 1
+        if "ocr_seconds" in segment:
+            self.ocr_attempts += 1
+            self.ocr_seconds += segment["ocr_seconds"]
+        if segment["text"].strip():
+            self.has_text = True
+            self.methods.add(segment.get("method", "direct"))
+
+    def metadata(self, ext: str) -> dict:
+        methods = set(self.methods)
         metadata = {
-            "entities": entities, 
             "file_type": ext[1:],  # Remove the dot from extension
-            "extraction_method": "ocr" if ext == ".pdf" and "pdf2image" in str(text) else "direct"
+            "extraction_method": "mixed" if len(methods) > 1 else (methods.pop() if methods else "direct"),
         }
-
-        logger.info(f"Successfully extracted text and metadata from {file_path}")
-        return text, metadata
-
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {str(e)}")
-        raise
+        if ext in (".pdf", ".png", ".jpg", ".jpeg", ".tiff"):
+            metadata.update(page_count=self.pages, ocr_pages=self.ocr_pages)
+        elif ext in (".xlsx", ".xls"):
+            metadata.update(sheet_count=len(self.sheets), row_count=self.rows)
+        elif ext in (".docx", ".doc") and self.sheets:
+            metadata.update(table_count=len(self.sheets), table_rows=self.rows)
+        return metadata
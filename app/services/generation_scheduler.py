@@ -0,0 +1,191 @@
+"""Admission control and fair scheduling for LLM generation.
+
+Ollama keeps its best total throughput up to a few parallel generations;
+past that every stream slows down. At most ``GENERATION_MAX_INFLIGHT``
+generations run at once, the rest wait in a bounded queue. The queue is
+per client and served round-robin, so one client sending a burst does not
+push everyone else back. When the queue is full a request is rejected
+right away with an estimated ``Retry-After`` instead of waiting.
+
+Runs on the event loop only; no locking.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional
+
+from app.services.metrics import GENERATION_QUEUE_SECONDS, GENERATION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Generasi paralel ke Ollama; 0 = tanpa batas (scheduler nonaktif)
+GENERATION_MAX_INFLIGHT = int(os.getenv("GENERATION_MAX_INFLIGHT", "4"))
+GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "32"))
+# Request antri per client; 0 = hanya dibatasi GENERATION_QUEUE_SIZE
+GENERATION_QUEUE_PER_CLIENT = int(os.getenv("GENERATION_QUEUE_PER_CLIENT", "4"))
+GENERATION_QUEUE_TIMEOUT = float(os.getenv("GENERATION_QUEUE_TIMEOUT", "120"))
+# Estimasi durasi satu generasi untuk Retry-After, sebelum ada yang selesai
+GENERATION_DEFAULT_SECONDS = float(os.getenv("GENERATION_DEFAULT_SECONDS", "10"))
+
+
+class QueueFull(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueTimeout(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A request's place in the scheduler: queued, then granted, then released."""
+
+    def __init__(self, client: str):
+        self.client = client
+        self.queued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.granted = False
+        self.released = False
+        self.changed = asyncio.Event()
+
+
+class GenerationScheduler:
+    def __init__(self, max_inflight: int = GENERATION_MAX_INFLIGHT, queue_size: int = GENERATION_QUEUE_SIZE,
+                 per_client: int = GENERATION_QUEUE_PER_CLIENT):
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.per_client = per_client
+        self.inflight = 0
+        self.queued = 0
+        # Urutan round-robin: client di depan dilayani dulu, lalu pindah ke belakang
+        self._queues: OrderedDict[str, deque[Ticket]] = OrderedDict()
+        self._generation_seconds: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely get a slot."""
+        seconds = self._generation_seconds or GENERATION_DEFAULT_SECONDS
+        return max(1, math.ceil((self.queued + 1) / self.max_inflight * seconds))
+
+    def check(self, client: str):
+        """Raise ``QueueFull`` when ``client`` would be rejected now; takes nothing."""
+        if self.inflight < self.max_inflight and not self.queued:
+            return
+        if self.queued >= self.queue_size:
+            GENERATION_REJECTED.inc(reason="queue_full")
+            raise QueueFull("Generation queue is full", self.retry_after())
+        queue = self._queues.get(client)
+        if self.per_client and queue is not None and len(queue) >= self.per_client:
+            GENERATION_REJECTED.inc(reason="client_limit")
+            raise QueueFull(f"Too many queued requests for client {client}", self.retry_after())
+
+    def submit(self, client: str) -> Ticket:
+        """Take a slot or a place in the queue; raises ``QueueFull`` when neither is free."""
+        self.check(client)
+        ticket = Ticket(client)
+        if self.inflight < self.max_inflight and not self.queued:
+            self._grant(ticket)
+            return ticket
+        self._queues.setdefault(client, deque()).append(ticket)
+        self.queued += 1
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in the round-robin order; 0 once granted."""
+        if ticket.granted or ticket.released:
+            return 0
+        clients = list(self._queues)
+        index = self._queues[ticket.client].index(ticket)
+        mine = clients.index(ticket.client)
+        ahead = sum(
+            min(len(self._queues[client]), index + 1 if i < mine else index)
+            for i, client in enumerate(clients) if client != ticket.client
+        )
+        return ahead + index + 1
+
+    async def updates(self, ticket: Ticket, timeout: float = GENERATION_QUEUE_TIMEOUT) -> AsyncIterator[int]:
+        """Yield the ticket's queue position whenever it changes, until it is granted.
+
+        Raises ``QueueTimeout`` (and gives up the place) after ``timeout`` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        last = None
+        while not ticket.granted:
+            position = self.position(ticket)
+            if position != last:
+                last = position
+                yield position
+            ticket.changed.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.release(ticket)
+                GENERATION_REJECTED.inc(reason="timeout")
+                raise QueueTimeout("Timed out waiting for a generation slot", self.retry_after())
+            try:
+                await asyncio.wait_for(ticket.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait(self, ticket: Ticket, timeout: float = GENERATION_QUEUE_TIMEOUT):
+        async for _ in self.updates(ticket, timeout):
+            pass
+
+    def release(self, ticket: Ticket):
+        """Give up a queued place or a running slot; safe to call more than once."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self.inflight -= 1
+            seconds = time.monotonic() - ticket.granted_at
+            # Rata-rata bergerak durasi generasi, untuk Retry-After
+            self._generation_seconds = (
+                seconds if self._generation_seconds is None else 0.8 * self._generation_seconds + 0.2 * seconds
+            )
+        else:
+            queue = self._queues[ticket.client]
+            queue.remove(ticket)
+            self.queued -= 1
+            if not queue:
+                del self._queues[ticket.client]
+        self._dispatch()
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        ticket.granted_at = time.monotonic()
+        self.inflight += 1
+        GENERATION_QUEUE_SECONDS.observe(ticket.granted_at - ticket.queued_at)
+        ticket.changed.set()
+
+    def _dispatch(self):
+        while self.inflight < self.max_inflight and self.queued:
+            client, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self._grant(ticket)
+        # Posisi antrian yang tersisa berubah
+        for queue in self._queues.values():
+            for ticket in queue:
+                ticket.changed.set()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "clients_waiting": len(self._queues),
+            "avg_generation_seconds": round(self._generation_seconds, 3) if self._generation_seconds else None,
+        }
+
+
+generation_scheduler = GenerationScheduler() if GENERATION_MAX_INFLIGHT > 0 else None
@@ -0,0 +1,537 @@
+import os
+import json
+import time
+import queue
+import uuid
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from itertools import takewhile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from app.services import pipeline
+from app.services.embedding import embed_and_store
+from app.services.answer_cache import answer_cache
+from app.services.metrics import (
+    INGEST_ARTIFACTS, INGEST_DOCUMENTS, INGEST_PAGES, OCR_FALLBACKS, observe_ingest_stages,
+)
+from app.services.shards import DEFAULT_TENANT, shards
+from app.services.tracing import request_context, span
+from app.utils.file_handler import link_upload
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+INGEST_JOURNAL_PATH = os.getenv(
+    "INGEST_JOURNAL_PATH",
+    os.path.join(os.getenv("CHROMA_DIR", "vectorstore"), "ingest_journal.jsonl"),
+)
+INGEST_JOURNAL_KEEP = int(os.getenv("INGEST_JOURNAL_KEEP", "1000"))
+# Batch chunk per job yang boleh menunggu embedding sebelum drain event ikut menunggu
+INGEST_STREAM_BATCHES = int(os.getenv("INGEST_STREAM_BATCHES", "8"))
+# Event worker yang belum dibaca proses utama; worker menunggu kalau penuh
+INGEST_EVENT_QUEUE_SIZE = int(os.getenv("INGEST_EVENT_QUEUE_SIZE", "64"))
+
+STAGES = ["queued", "extracting", "ocr", "ner", "chunking", "embedding", "storing", "done", "error"]
+FINISHED = {"done", "error"}
+
+
+class _StreamAborted(Exception):
+    """The chunk stream of a job ended without ``chunks_end``."""
+
+
+class _ChunkStream:
+    """Chunk batches of one job, from the event drain to its store task.
+
+    A waiting ``put`` blocks while ``limit`` items are unread; ``ended`` is
+    set once the last item (end of chunks or abort) is in.
+    """
+
+    def __init__(self, limit: int = INGEST_STREAM_BATCHES):
+        self.limit = limit
+        self.ended = False
+        self._closed = False
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item: tuple, wait: bool = True):
+        with self._cond:
+            while wait and self.limit > 0 and len(self._items) >= self.limit and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return
+            self._items.append(item)
+            self.ended = item[0] != "chunks"
+            self._cond.notify_all()
+
+    def abort(self):
+        """Replace whatever is unread with an abort, without waiting."""
+        with self._cond:
+            self._items.clear()
+            self._items.append(("abort", None))
+            self.ended = True
+            self._cond.notify_all()
+
+    def get(self) -> tuple:
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """The store task is gone; later items are dropped."""
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+
+class IngestionQueue:
+    """Background ingestion queue.
+
+    CPU-bound stages (extraction, OCR, NER, chunking) run in a process pool
+    and stream chunk batches back over the event queue; embedding and the
+    vector store write consume that stream on a single thread in this
+    process, so Chroma is only ever written from one place and embedding
+    overlaps with extraction of the same file. Both the event queue and the
+    per-job chunk streams are bounded, so workers wait when embedding falls
+    behind instead of piling chunks up in memory. Every job state
+    change is appended to a JSON-lines journal, and unfinished jobs are
+    resubmitted when the queue starts again.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, journal_path: str = INGEST_JOURNAL_PATH):
+        self.workers = max(1, workers)
+        self.journal_path = journal_path
+        self.jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        # Cek duplikat + submit harus atomik, supaya upload kembar tidak sama-sama masuk
+        self._submit_lock = threading.Lock()
+        self._journal = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._store_executor: Optional[ThreadPoolExecutor] = None
+        self._events = None
+        self._stopping_event = None
+        self._streams: dict[str, _ChunkStream] = {}
+        self._finished: deque = deque()  # id job selesai, urut waktu selesai
+        self._journal_lines = 0
+        self._event_thread: Optional[threading.Thread] = None
+        self._warmup: list = []
+        self._started_at = None
+        self._stopping = False
+        self._stats = {
+            "jobs_submitted": 0,
+            "jobs_done": 0,
+            "jobs_failed": 0,
+            "pages": 0,
+            "chunks": 0,
+            "busy_seconds": 0.0,
+        }
+
+    # lifecycle
+
+    def start(self):
+        if self._pool is not None:
+            return
+        self._stopping = False
+        ctx = multiprocessing.get_context("spawn")
+        self._events = ctx.Queue(maxsize=INGEST_EVENT_QUEUE_SIZE)
+        self._stopping_event = ctx.Event()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=ctx,
+            initializer=pipeline.init_worker,
+            initargs=(self._events, self._stopping_event),
+        )
+        self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-store")
+        self._event_thread = threading.Thread(target=self._drain_events, name="ingest-events", daemon=True)
+        self._event_thread.start()
+        self._started_at = time.time()
+        # Worker di-spawn saat ada task; satu task status per worker membuat
+        # semua worker start (dan warm-up) sekarang, bukan di job pertama
+        self._warmup = [self._pool.submit(pipeline.worker_status) for _ in range(self.workers)]
+
+        pending = self._replay_journal()
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        for job in pending:
+            logger.info(f"Resuming ingestion job {job['id']} ({job['filename']})")
+            self._dispatch(job)
+        logger.info(f"Ingestion queue started with {self.workers} workers")
+
+    def stop(self):
+        if self._pool is None:
+            return
+        # Job yang belum selesai tetap tercatat queued/running di journal
+        # dan akan dilanjutkan saat start berikutnya.
+        self._stopping = True
+        self._stopping_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for stream in self._streams.values():
+                stream.abort()
+        self._store_executor.shutdown(wait=True)
+        try:
+            self._events.put(None, timeout=5)
+        except queue.Full:
+            logger.warning("Ingestion event drain did not stop")
+        self._event_thread.join(timeout=5)
+        with self._lock:
+            self._journal.close()
+            self._journal = None
+        shards.flush()
+        self._pool = None
+        logger.info("Ingestion queue stopped")
+
+    # journal
+
+    def _replay_journal(self) -> list[dict]:
+        """Load job snapshots, compact the journal and return unfinished jobs."""
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    job = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.jobs[job["id"]] = job
+
+        finished = [j for j in self.jobs.values() if j["status"] in FINISHED]
+        finished.sort(key=lambda j: j.get("finished_at") or 0)
+        self._finished.extend(j["id"] for j in finished)
+        self._prune_finished()
+        self._rewrite_journal()
+
+        pending = [j for j in self.jobs.values() if j["status"] not in FINISHED]
+        for job in pending:
+            job.update(status="queued", stage="queued", pages_done=0)
+        return sorted(pending, key=lambda j: j["created_at"])
+
+    def _rewrite_journal(self):
+        """Replace the journal with one snapshot per known job."""
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for job in self.jobs.values():
+                f.write(json.dumps(job) + "\n")
+        os.replace(tmp_path, self.journal_path)
+        self._journal_lines = len(self.jobs)
+
+    def _prune_finished(self):
+        """Forget all but the last INGEST_JOURNAL_KEEP finished jobs (lock held)."""
+        while len(self._finished) > INGEST_JOURNAL_KEEP:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def _write_journal(self, job: dict):
+        # Dipanggil dengan self._lock dipegang
+        if self._journal is None:
+            return
+        self._journal.write(json.dumps(job) + "\n")
+        self._journal.flush()
+        self._journal_lines += 1
+        # Bulk ingestion menulis jutaan baris; compact selagi jalan
+        if self._journal_lines > max(10000, 4 * len(self.jobs)):
+            self._journal.close()
+            self._rewrite_journal()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _update(self, job_id: str, journal: bool = True, **fields) -> Optional[dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            if journal:
+                self._write_journal(job)
+            return job
+
+    # submission
+
+    def submit(self, file_path: str, filename: str, content_hash: Optional[str] = None,
+               tenant: str = DEFAULT_TENANT) -> dict:
+        if self._pool is None:
+            raise RuntimeError("Ingestion queue is not running")
+        job = {
+            "id": uuid.uuid4().hex,
+            "tenant": tenant,
+            "filename": filename,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "status": "queued",
+            "stage": "queued",
+            "pages_done": 0,
+            "pages_total": None,
+            "chunks_count": None,
+            "metadata": None,
+            "errors": [],
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._lock:
+            self.jobs[job["id"]] = job
+            self._write_journal(job)
+            self._stats["jobs_submitted"] += 1
+        self._dispatch(job)
+        return dict(job)
+
+    def submit_stored(self, stored: dict, tenant: str = DEFAULT_TENANT) -> dict:
+        """Submit a file from the upload store unless its content is already known.
+
+        ``stored`` is the result of ``file_handler.store_stream``/``store_file``.
+        Content that is already in the tenant's catalog or in an unfinished
+        job of the tenant is reported as a duplicate without any extraction
+        work and its name is not linked into the upload directory. Returns
+        ``{"status", "job_id", "duplicate_of"}``.
+        """
+        content_hash = stored["content_hash"]
+        catalog = shards.get(tenant).catalog
+        with self._submit_lock:
+            # Job aktif dicek dulu: job yang selesai sudah tercatat di catalog sebelum statusnya done
+            active = self.find_active(content_hash, tenant)
+            if active is not None:
+                return {"status": "duplicate", "job_id": active["id"], "duplicate_of": active["filename"]}
+            existing = catalog.find_by_hash(content_hash)
+            if existing is not None:
+                return {"status": "duplicate", "job_id": None, "duplicate_of": existing["name"]}
+            link_upload(stored)
+            job = self.submit(stored["path"], stored["filename"], content_hash=content_hash, tenant=tenant)
+        return {"status": job["status"], "job_id": job["id"], "duplicate_of": None}
+
+    def _dispatch(self, job: dict):
+        future = self._pool.submit(
+            pipeline.extract_and_chunk, job["id"], job["file_path"], job.get("content_hash")
+        )
+        future.add_done_callback(lambda f, job_id=job["id"]: self._on_extracted(job_id, f))
+
+    def _on_extracted(self, job_id: str, future):
+        # Sukses ditandai event chunks_end; di sini cukup tangani kegagalan
+        if future.cancelled() or self._stopping:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            self._fail(job_id, f"Extraction error: {e}")
+            with self._lock:
+                stream = self._streams.pop(job_id, None)
+            if stream is not None:
+                stream.abort()
+
+    def _stream(self, job_id: str) -> Optional[_ChunkStream]:
+        """Chunk stream of a running job; the first call starts its store task."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in FINISHED or self._stopping:
+                return None
+            stream = self._streams.get(job_id)
+            if stream is None:
+                stream = self._streams[job_id] = _ChunkStream()
+                self._store_executor.submit(self._store, job_id, stream)
+            return stream
+
+    def _deliver(self, stream: _ChunkStream, item: tuple):
+        """Put an item on a job's stream, waiting while the stream is full.
+
+        Waiting stops the event drain and, once the event queue is full, the
+        workers. Store tasks run one at a time in the order their streams
+        were opened, so this only waits when every stream ahead already has
+        its last item; otherwise the running store task may still need an
+        event behind this one and the item goes over the limit.
+        """
+        with self._lock:
+            ahead = list(takewhile(lambda other: other is not stream, self._streams.values()))
+        stream.put(item, wait=all(other.ended for other in ahead))
+
+    @staticmethod
+    def _iter_stream(stream: _ChunkStream, metadata: dict):
+        while True:
+            kind, payload = stream.get()
+            if kind == "chunks":
+                yield from payload
+            elif kind == "end":
+                metadata.update(payload)
+                return
+            else:
+                raise _StreamAborted()
+
+    def _store(self, job_id: str, stream: _ChunkStream):
+        job = self.jobs[job_id]
+        # Job dari journal lama belum punya tenant
+        shard = shards.get(job.get("tenant"))
+        metadata = {
+            "filename": job["filename"],
+            "file_type": os.path.splitext(job["filename"])[1][1:].lower() or "unknown",
+        }
+        try:
+            self._update(job_id, status="running", stage="embedding")
+            # Request id span ingestion = job id
+            with request_context(job_id), span("ingest.store_document", filename=job["filename"],
+                                                tenant=shard.tenant):
+                index_stats = embed_and_store(
+                    self._iter_stream(stream, metadata), metadata,
+                    progress=lambda stage, **info: self._update(job_id, stage=stage),
+                    shard=shard,
+                )
+        except _StreamAborted:
+            # Ekstraksi gagal (sudah dicatat) atau queue dihentikan
+            return
+        except Exception as e:
+            self._fail(job_id, f"Embedding error: {e}")
+            return
+        finally:
+            stream.close()
+            with self._lock:
+                self._streams.pop(job_id, None)
+
+        observe_ingest_stages(metadata.pop("timings", {}), request_id=job_id)
+        artifact = metadata.pop("artifact", "miss")
+        INGEST_ARTIFACTS.inc(result=artifact)
+        if artifact == "miss":
+            ocr_pages = metadata.get("ocr_pages", 0)
+            INGEST_PAGES.inc(metadata.get("page_count", 0) - ocr_pages, method="direct")
+            INGEST_PAGES.inc(ocr_pages, method="ocr")
+        else:
+            # Halaman dibaca dari artifact, tidak diekstrak/OCR ulang
+            INGEST_PAGES.inc(metadata.get("page_count", 0), method="artifact")
+        OCR_FALLBACKS.inc(metadata.get("ocr_attempts", 0))
+        INGEST_DOCUMENTS.inc(status="done")
+
+        chunks_count = index_stats["added"] + index_stats["unchanged"]
+        shard.catalog.upsert(
+            name=job["filename"],
+            size=metadata.get("size", 0),
+            file_type=metadata.get("file_type", "unknown"),
+            chunk_count=chunks_count,
+            content_hash=metadata.get("content_hash"),
+        )
+        if answer_cache is not None:
+            answer_cache.invalidate_source(job["filename"])
+
+        finished_at = time.time()
+        summary = {
+            "file_type": metadata.get("file_type"),
+            "extraction_method": metadata.get("extraction_method"),
+            "artifact": artifact,
+            "entities_count": len(metadata.get("entities", [])),
+            "entity_mentions": sum(e["count"] for e in metadata.get("entities", [])),
+            **index_stats,
+        }
+        job = self._update(
+            job_id, status="done", stage="done", chunks_count=chunks_count,
+            metadata=summary, finished_at=finished_at,
+        )
+        with self._lock:
+            self._finished.append(job_id)
+            self._prune_finished()
+            self._stats["jobs_done"] += 1
+            self._stats["chunks"] += chunks_count
+            self._stats["pages"] += job.get("pages_total") or 0
+            self._stats["busy_seconds"] += finished_at - (job["started_at"] or job["created_at"])
+        logger.info(f"Ingestion job {job_id} done: {chunks_count} chunks")
+
+    def _fail(self, job_id: str, error: str):
+        logger.error(f"Ingestion job {job_id} failed: {error}")
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["errors"].append(error)
+            job.update(status="error", stage="error", finished_at=time.time())
+            self._write_journal(job)
+            self._stats["jobs_failed"] += 1
+            INGEST_DOCUMENTS.inc(status="error")
+            self._finished.append(job_id)
+            self._prune_finished()
+
+    # progress events from worker processes
+
+    def _drain_events(self):
+        while True:
+            try:
+                event = self._events.get()
+            except (EOFError, OSError):
+                break
+            if event is None:
+                break
+            job_id, stage, info = event
+            if stage in ("chunks", "chunks_end"):
+                stream = self._stream(job_id)
+                if stream is not None:
+                    if stage == "chunks":
+                        self._deliver(stream, ("chunks", info["chunks"]))
+                    else:
+                        self._deliver(stream, ("end", info["metadata"]))
+                continue
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                continue
+            fields = {"status": "running"}
+            # Selama embedding berjalan, tahap job tetap embedding/storing;
+            # progress halaman dari worker tetap dicatat
+            if job["stage"] not in ("embedding", "storing"):
+                fields["stage"] = stage
+            if job["started_at"] is None:
+                fields["started_at"] = time.time()
+            if "pages_done" in info:
+                fields["pages_done"] = info["pages_done"]
+            if info.get("pages_total") is not None:
+                fields["pages_total"] = info["pages_total"]
+            # Progress per halaman tidak perlu masuk journal, cukup pergantian tahap
+            self._update(job_id, journal=fields.get("stage", job["stage"]) != job["stage"], **fields)
+
+    # status
+
+    def wait_until_warm(self, timeout: Optional[float] = None) -> list[dict]:
+        """Block until every worker process has started and warmed up."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return [
+            future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            for future in self._warmup
+        ]
+
+    def find_active(self, content_hash: str, tenant: str = DEFAULT_TENANT) -> Optional[dict]:
+        """Unfinished job of the tenant for a file with this content, if any."""
+        with self._lock:
+            for job in self.jobs.values():
+                if (job["status"] not in FINISHED and job.get("content_hash") == content_hash
+                        and job.get("tenant", DEFAULT_TENANT) == tenant):
+                    return dict(job)
+        return None
+
+    def pending_count(self, tenant: Optional[str] = None) -> int:
+        """Unfinished jobs, of one tenant when given."""
+        with self._lock:
+            return sum(
+                1 for job in self.jobs.values()
+                if job["status"] not in FINISHED and (tenant is None or job.get("tenant", DEFAULT_TENANT) == tenant)
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            by_status: dict[str, int] = {}
+            for job in self.jobs.values():
+                by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+        uptime = time.time() - self._started_at if self._started_at else 0.0
+        stats["busy_seconds"] = round(stats["busy_seconds"], 3)
+        stats.update(
+            workers=self.workers,
+            jobs_by_status=by_status,
+            uptime_seconds=round(uptime, 3),
+            jobs_per_minute=round(stats["jobs_done"] / uptime * 60, 3) if uptime else 0.0,
+            pages_per_second=round(stats["pages"] / uptime, 3) if uptime else 0.0,
+            chunks_per_second=round(stats["chunks"] / uptime, 3) if uptime else 0.0,
+        )
+        return stats
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH",
+    os.path.join(os.getenv("CHROMA_DIR", "vectorstore"), "lexical_index.sqlite"),
+)
+# Term query maksimal yang dipakai di satu query FTS
+LEXICAL_MAX_TERMS = int(os.getenv("LEXICAL_MAX_TERMS", "32"))
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def query_terms(query: str) -> list[str]:
+    terms = []
+    for term in _TERM_RE.findall(query.lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:LEXICAL_MAX_TERMS]
+
+
+def query_identifiers(query: str) -> list[str]:
+    """Identifier-like tokens of a query, e.g. ``INV-2023-0042`` or ``12345``.
+
+    Any whitespace-separated token containing a digit counts (contract and
+    invoice numbers, dates, amounts).
+    """
+    tokens = (t.strip(".,;:!?()[]{}\"'").lower() for t in query.split())
+    return [t for t in tokens if any(c.isdigit() for c in t)]
+
+
+def contains_identifiers(text: str, identifiers: list[str]) -> bool:
+    """True if every identifier occurs in ``text`` as a whole token."""
+    lowered = text.lower()
+    return all(re.search(rf"(?<!\w){re.escape(i)}(?!\w)", lowered) for i in identifiers)
+
+
+class LexicalIndex:
+    """BM25 index over chunk texts using SQLite FTS5.
+
+    Chunk rows live in a plain table keyed by chunk id; an external-content
+    FTS5 table indexes their text and is kept in sync by triggers; rows
+    follow Chroma through ``embed_and_store``. ``search`` returns
+    ``(chunk_id, text, metadata, score)``, higher score meaning a better
+    match.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                doc_id TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                text, content = 'chunks', content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE OF text ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            """
+        )
+        self._conn.commit()
+
+    def upsert(self, rows: Iterable[tuple[str, str, str, dict]]):
+        """Insert or replace ``(chunk_id, doc_id, text, metadata)`` rows."""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO chunks (chunk_id, doc_id, metadata, text) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (chunk_id) DO UPDATE SET
+                       doc_id = excluded.doc_id, metadata = excluded.metadata, text = excluded.text""",
+                [(chunk_id, doc_id, json.dumps(metadata), text) for chunk_id, doc_id, text, metadata in rows],
+            )
+
+    def delete(self, chunk_ids: Iterable[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def ids(self) -> set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT chunk_id FROM chunks")}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def search(self, query: str, k: int = 5, chunk_ids: Optional[set[str]] = None) -> list[tuple]:
+        """BM25 top ``k`` chunks matching any term of ``query``.
+
+        Identifier-like tokens are also matched as a phrase, so an exact
+        ``INV-2023-0042`` ranks above chunks sharing only one of its parts.
+        """
+        terms = query_terms(query)
+        if not terms or (chunk_ids is not None and not chunk_ids):
+            return []
+        clauses = [f'"{t}"' for t in terms]
+        clauses += [f'"{" ".join(query_terms(i))}"' for i in query_identifiers(query) if len(query_terms(i)) > 1]
+        sql = (
+            "SELECT c.chunk_id, c.text, c.metadata, bm25(chunks_fts) AS rank "
+            "FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        )
+        params: list = [" OR ".join(clauses)]
+        if chunk_ids is not None:
+            sql += f" AND c.chunk_id IN ({','.join('?' * len(chunk_ids))})"
+            params.extend(chunk_ids)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(chunk_id, text, json.loads(metadata), -rank) for chunk_id, text, metadata, rank in rows]
+
+
+lexical_index = LexicalIndex()
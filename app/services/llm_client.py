@@ -1,47 +1,313 @@
 import os
 import json
+import time
+import logging
+import threading
 import requests
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import AsyncGenerator, Dict, Any
 import aiohttp
+from requests.adapters import HTTPAdapter
+
+from app.services.metrics import (
+    EMBED_REQUEST_SECONDS, EMBED_TEXTS, LLM_GENERATIONS, LLM_TOKENS, LLM_TOKENS_PER_SECOND, LLM_TTFT_SECONDS,
+    STAGE_SECONDS,
+)
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "https://ai.ptedm.com")
 
+# Embedding engine settings
+# "/api/embeddings" = satu teks per request (vektor kompatibel dengan store lama),
+# "/api/embed" = batch endpoint Ollama (vektor ter-normalisasi, butuh re-index).
+EMBED_ENDPOINT = os.getenv("OLLAMA_EMBED_ENDPOINT", "/api/embeddings")
+# Model embedding untuk collection baru dan target default re-embedding;
+# collection yang sudah ada memakai model yang tercatat di shard-nya
+EMBED_MODEL = os.getenv("EMBED_MODEL", "llama3")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", "0.5"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "120"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Shared aiohttp client settings (generate + query embedding)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_CONNECTIONS_PER_HOST = int(os.getenv("LLM_MAX_CONNECTIONS_PER_HOST", "32"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+
+GENERATE_TIMEOUT = aiohttp.ClientTimeout(
+    total=None, sock_connect=LLM_CONNECT_TIMEOUT, sock_read=LLM_READ_TIMEOUT
+)
+
+try:
+    # orjson jauh lebih cepat untuk parsing NDJSON per token
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+def _record_generation(outcome: str, started: float, first_token_at, tokens: int, final: dict):
+    """TTFT, tokens/sec and token count of one generate call."""
+    LLM_GENERATIONS.inc(outcome=outcome)
+    STAGE_SECONDS.observe(time.perf_counter() - started, pipeline="chat", stage="generate")
+    if first_token_at is None:
+        return
+    # Ollama melaporkan eval_count/eval_duration (ns) di pesan terakhir
+    if final.get("eval_count") and final.get("eval_duration"):
+        tokens = final["eval_count"]
+        rate = tokens / (final["eval_duration"] / 1e9)
+    else:
+        elapsed = time.perf_counter() - first_token_at
+        rate = (tokens - 1) / elapsed if tokens > 1 and elapsed > 0 else None
+    LLM_TOKENS.inc(tokens)
+    if rate is not None:
+        LLM_TOKENS_PER_SECOND.observe(rate)
+
 
 async def generate_response(prompt: str, model: str = "llama3", temperature: float = 0.7):
     url = f"{OLLAMA_URL}/api/generate"
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
+    response = None
+    started = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    final: dict = {}
+    outcome = "error"
+    with span("chat.generate", model=model) as record:
+        try:
+            response = await get_http_session().post(
                 url,
                 json={
                     "model": model,
                     "prompt": prompt,
                     "stream": True,
                     "temperature": temperature
-                }
-            ) as response:
-                response.raise_for_status()
-                async for line in response.content:
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            if "text" in data:
-                                yield data["text"]
-                            if "response" in data:
-                                yield data["response"]
-                        except json.JSONDecodeError:
-                            continue
-    except Exception as e:
-        yield f"Error: {str(e)}"
+                },
+                timeout=GENERATE_TIMEOUT,
+            )
+            response.raise_for_status()
+            async for line in response.content:
+                if line:
+                    try:
+                        data = _json_loads(line)
+                        text = data.get("text") or data.get("response")
+                        if text:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                LLM_TTFT_SECONDS.observe(first_token_at - started)
+                            tokens += 1
+                        if data.get("done"):
+                            final = data
+                        if "text" in data:
+                            yield data["text"]
+                        if "response" in data:
+                            yield data["response"]
+                    except ValueError:
+                        continue
+            outcome = "completed"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            # Client SSE terputus: tutup koneksi ke Ollama supaya generasi di
+            # model server ikut berhenti, bukan dibaca sampai habis.
+            if response is not None:
+                response.close()
+            raise
+        except Exception as e:
+            yield f"Error: {str(e)}"
+        finally:
+            if response is not None:
+                response.release()
+            _record_generation(outcome, started, first_token_at, tokens, final)
+            if record is not None:
+                record["attrs"].update(outcome=outcome, tokens=tokens)
+                if first_token_at is not None:
+                    record["attrs"]["ttft_ms"] = round((first_token_at - started) * 1000, 3)
+
+
+class EmbeddingClient:
+    """Batched, concurrent client for the Ollama embedding API.
+
+    Keeps one keep-alive connection pool for all requests, splits the input
+    into batches of ``batch_size`` texts, embeds up to ``concurrency`` batches
+    at once and retries transient failures with exponential backoff.
+    Output order always matches input order.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        endpoint: str = EMBED_ENDPOINT,
+        batch_size: int = EMBED_BATCH_SIZE,
+        concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        backoff: float = EMBED_RETRY_BACKOFF,
+        timeout: float = EMBED_TIMEOUT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.endpoint = endpoint
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="embed"
+        )
+
+    def _post(self, path: str, payload: dict) -> dict:
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self.session.post(url, json=payload, timeout=self.timeout)
+                if resp.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    logger.warning(f"Embedding request returned {resp.status_code}, retrying ({attempt + 1}/{self.max_retries})")
+                else:
+                    resp.raise_for_status()
+                    return resp.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Embedding request failed: {str(e)}, retrying ({attempt + 1}/{self.max_retries})")
+            time.sleep(self.backoff * (2 ** attempt))
+        raise RuntimeError("Embedding request retries exhausted")
+
+    def _embed_batch(self, texts: list[str], model: str) -> list[list[float]]:
+        EMBED_TEXTS.inc(len(texts), client="sync")
+        with EMBED_REQUEST_SECONDS.time(client="sync"), span("embedding.batch", texts=len(texts)):
+            return self._request_batch(texts, model)
+
+    def _request_batch(self, texts: list[str], model: str) -> list[list[float]]:
+        if self.endpoint == "/api/embed":
+            data = self._post(self.endpoint, {"model": model, "input": texts})
+            return data.get("embeddings", [])
+        return [
+            self._post(self.endpoint, {"model": model, "prompt": text}).get("embedding", [])
+            for text in texts
+        ]
+
+    def embed(self, texts: list[str], model: str = "llama3") -> list[list[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0], model)
+        results = self._executor.map(lambda batch: self._embed_batch(batch, model), batches)
+        return [embedding for batch in results for embedding in batch]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_embedding_client = None
+_embedding_client_lock = threading.Lock()
+
+
+def get_embedding_client() -> EmbeddingClient:
+    global _embedding_client
+    if _embedding_client is None:
+        with _embedding_client_lock:
+            if _embedding_client is None:
+                _embedding_client = EmbeddingClient()
+    return _embedding_client
 
 
 def generate_embedding(texts: list[str], model: str = "llama3"):
-    url = f"{OLLAMA_URL}/api/embeddings"
-    embeddings = []
-    for text in texts:
-        resp = requests.post(url, json={"model": model, "prompt": text})
+    return get_embedding_client().embed(texts, model=model)
+
+
+_http_session: aiohttp.ClientSession = None
+
+
+def _create_http_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=LLM_MAX_CONNECTIONS,
+        limit_per_host=LLM_MAX_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=LLM_CONNECT_TIMEOUT, sock_read=LLM_READ_TIMEOUT),
+    )
+
+
+async def start_http_session():
+    """Create the shared client; called from the FastAPI lifespan."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_http_session()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session for Ollama (generation and query embeddings).
+
+    Normally created at startup; created lazily here for scripts and
+    benchmarks that use the client without the app lifespan.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_http_session()
+    return _http_session
+
+
+async def generate_embedding_async(texts: list[str], model: str = "llama3"):
+    """Async counterpart of generate_embedding for use on the event loop."""
+    session = get_http_session()
+    url = f"{OLLAMA_URL}{EMBED_ENDPOINT}"
+    timeout = aiohttp.ClientTimeout(total=EMBED_TIMEOUT)
+
+    async def post(payload: dict) -> dict:
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                async with session.post(url, json=payload, timeout=timeout) as resp:
+                    if resp.status in RETRY_STATUS_CODES and attempt < EMBED_MAX_RETRIES:
+                        logger.warning(f"Embedding request returned {resp.status}, retrying ({attempt + 1}/{EMBED_MAX_RETRIES})")
+                    else:
+                        resp.raise_for_status()
+                        return await resp.json()
+            except aiohttp.ClientConnectionError as e:
+                if attempt >= EMBED_MAX_RETRIES:
+                    raise
+                logger.warning(f"Embedding request failed: {str(e)}, retrying ({attempt + 1}/{EMBED_MAX_RETRIES})")
+            await asyncio.sleep(EMBED_RETRY_BACKOFF * (2 ** attempt))
+        raise RuntimeError("Embedding request retries exhausted")
+
+    EMBED_TEXTS.inc(len(texts), client="async")
+    with EMBED_REQUEST_SECONDS.time(client="async"), span("embedding.batch", texts=len(texts)):
+        if EMBED_ENDPOINT == "/api/embed":
+            data = await post({"model": model, "input": texts})
+            return data.get("embeddings", [])
+        results = await asyncio.gather(*(post({"model": model, "prompt": text}) for text in texts))
+        return [data.get("embedding", []) for data in results]
+
+
+async def preload_models(model: str = "llama3", embed_model: str = "llama3"):
+    """Ask Ollama to load the generate and embedding models into memory.
+
+    A generate request without a prompt only loads the model; the first
+    real request then does not pay the model load time.
+    """
+    session = get_http_session()
+    async with session.post(
+        f"{OLLAMA_URL}/api/generate", json={"model": model, "stream": False}, timeout=GENERATE_TIMEOUT
+    ) as resp:
         resp.raise_for_status()
-        data = resp.json()
-        embeddings.append(data.get("embedding", []))
-    return embeddings
+    await generate_embedding_async(["warm-up"], model=embed_model)
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
@@ -0,0 +1,302 @@
+"""Metrics Prometheus tanpa dependency tambahan.
+
+Counter dan histogram disimpan di memori proses API dan dirender dalam
+text exposition format oleh ``GET /metrics``. Tahap yang berjalan di worker
+process ingestion (ekstraksi, OCR, NER, chunking) diukur di worker dan
+dikirim bersama metadata dokumen, lalu dicatat di sini oleh proses utama.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+from app.services.tracing import record_span, span
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 35.0, 50.0, 75.0, 100.0, 150.0, 250.0, 500.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> dict:
+        """``{"count", "sum"}`` of one label set (zeros when never observed)."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return {"count": state["count"], "sum": state["sum"]} if state else {"count": 0, "sum": 0.0}
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state["counts"]))) for key, state in self._values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {state['count']}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+
+class Registry:
+    """Metrics plus collectors that read live values (cache stats, queue size) at scrape time."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], Iterable[tuple]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        """``collector()`` yields ``(name, kind, help, [(labels dict, value)])``."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "dms_stage_duration_seconds",
+    "Duration of a pipeline stage (ingest: per document; chat: per request).",
+    ["pipeline", "stage"],
+))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "dms_http_request_duration_seconds",
+    "HTTP request duration until the response body is sent.",
+    ["method", "route", "status"],
+))
+EMBED_REQUEST_SECONDS = registry.register(Histogram(
+    "dms_embedding_request_duration_seconds",
+    "Duration of one embedding batch sent to Ollama, including retries.",
+    ["client"],
+))
+EMBED_TEXTS = registry.register(Counter(
+    "dms_embedding_texts_total",
+    "Texts sent to the Ollama embedding API.",
+    ["client"],
+))
+LLM_TTFT_SECONDS = registry.register(Histogram(
+    "dms_llm_time_to_first_token_seconds",
+    "Time from sending a generate request to the first token.",
+))
+LLM_TOKENS_PER_SECOND = registry.register(Histogram(
+    "dms_llm_tokens_per_second",
+    "Generation speed after the first token.",
+    buckets=RATE_BUCKETS,
+))
+LLM_TOKENS = registry.register(Counter(
+    "dms_llm_generated_tokens_total",
+    "Tokens generated by the LLM.",
+))
+LLM_GENERATIONS = registry.register(Counter(
+    "dms_llm_generations_total",
+    "Generate requests by outcome.",
+    ["outcome"],
+))
+GENERATION_QUEUE_SECONDS = registry.register(Histogram(
+    "dms_generation_queue_wait_seconds",
+    "Time a chat request waited for a generation slot.",
+))
+GENERATION_REJECTED = registry.register(Counter(
+    "dms_generation_rejected_total",
+    "Chat requests turned away by the generation scheduler, by reason (queue_full, client_limit, timeout).",
+    ["reason"],
+))
+INGEST_DOCUMENTS = registry.register(Counter(
+    "dms_ingest_documents_total",
+    "Ingestion jobs finished, by status.",
+    ["status"],
+))
+INGEST_PAGES = registry.register(Counter(
+    "dms_ingest_pages_total",
+    "Pages ingested, by extraction method.",
+    ["method"],
+))
+OCR_FALLBACKS = registry.register(Counter(
+    "dms_ocr_fallback_pages_total",
+    "Pages without a usable text layer that were sent to OCR.",
+))
+INGEST_ARTIFACTS = registry.register(Counter(
+    "dms_ingest_artifacts_total",
+    "Extraction artifact lookups, by result (hit, extraction = NER re-run, miss).",
+    ["result"],
+))
+SHARD_SEARCH_SECONDS = registry.register(Histogram(
+    "dms_shard_search_duration_seconds",
+    "Search duration in one tenant shard, by index (vector or lexical).",
+    ["tenant", "index"],
+))
+INGEST_CHUNKS = registry.register(Counter(
+    "dms_ingest_chunks_total",
+    "Chunks processed by embed_and_store, by result.",
+    ["result"],
+))
+
+
+@contextmanager
+def stage(pipeline: str, name: str, **attrs):
+    """Time a stage into ``dms_stage_duration_seconds`` and trace it as a span."""
+    start = time.perf_counter()
+    with span(f"{pipeline}.{name}", **attrs) as record:
+        try:
+            yield record
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, pipeline=pipeline, stage=name)
+
+
+class StageTimer:
+    """Time nested generator stages of a streaming pipeline.
+
+    ``stages`` are listed innermost first. ``wrap(name, iterable)`` measures
+    the time spent inside each ``next()`` of that stage, which includes the
+    stages it pulls from; ``exclusive()`` subtracts the inner stage so each
+    stage only gets its own time.
+    """
+
+    def __init__(self, *stages: str, pipeline: str = "ingest"):
+        self.stages = stages
+        self.pipeline = pipeline
+        self.inclusive = {name: 0.0 for name in stages}
+
+    def wrap(self, name: str, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.inclusive[name] += time.perf_counter() - start
+            yield item
+
+    @contextmanager
+    def measure(self, name: str, **attrs):
+        """Add the time of a block to stage ``name`` (and trace it as a span)."""
+        start = time.perf_counter()
+        with span(f"{self.pipeline}.{name}", **attrs) as record:
+            try:
+                yield record
+            finally:
+                self.inclusive[name] += time.perf_counter() - start
+
+    def exclusive(self) -> dict[str, float]:
+        result, inner = {}, 0.0
+        for name in self.stages:
+            result[name] = round(max(0.0, self.inclusive[name] - inner), 6)
+            inner = self.inclusive[name]
+        return result
+
+
+def timed_call(func: Callable, *args, **kwargs) -> tuple:
+    """``(func(*args, **kwargs), seconds)``."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def observe_ingest_stages(timings: dict, request_id: Optional[str] = None):
+    """Record stage timings measured in a worker process."""
+    for name, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, pipeline="ingest", stage=name)
+        record_span(f"ingest.{name}", seconds, request_id=request_id)
@@ -0,0 +1,125 @@
+import os
+import re
+import logging
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+# Panjang maksimal teks per doc spaCy (jauh di bawah nlp.max_length)
+NER_SEGMENT_CHARS = int(os.getenv("NER_SEGMENT_CHARS", "20000"))
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "64"))
+# Default 1: ingestion sudah paralel per file di process pool
+NER_PROCESSES = int(os.getenv("NER_PROCESSES", "1"))
+
+# Batas potong, dari yang paling disukai
+_SPLIT_RES = [re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+")]
+
+_nlp = None
+
+
+def _load_nlp():
+    # spaCy berat diimpor; baru dimuat saat NER pertama kali dipakai (atau warm-up)
+    import spacy
+    from spacy.cli import download as spacy_download
+
+    try:
+        nlp = spacy.load(SPACY_MODEL)
+    except OSError:
+        spacy_download(SPACY_MODEL)
+        nlp = spacy.load(SPACY_MODEL)
+
+    # Hanya NER (dan tok2vec yang didengarkan NER, kalau ada) yang dipakai
+    keep = {"ner"}
+    if "tok2vec" in nlp.pipe_names:
+        listeners = getattr(nlp.get_pipe("tok2vec"), "listening_components", [])
+        if "ner" in listeners:
+            keep.add("tok2vec")
+    for name in nlp.pipe_names:
+        if name not in keep:
+            nlp.disable_pipe(name)
+    logger.info(f"Loaded spaCy model {SPACY_MODEL} with pipes: {nlp.pipe_names}")
+    return nlp
+
+
+def nlp_loaded() -> bool:
+    return _nlp is not None
+
+
+def get_nlp():
+    """spaCy pipeline with only the NER component enabled, loaded once per process."""
+    global _nlp
+    if _nlp is None:
+        _nlp = _load_nlp()
+    return _nlp
+
+
+def split_text(text: str, max_chars: int = NER_SEGMENT_CHARS) -> Iterator[tuple[int, str]]:
+    """Split ``text`` into ``(offset, piece)`` pieces of at most ``max_chars``.
+
+    Pieces end at a paragraph, line, sentence or word boundary when there is
+    one in the window, so entities are rarely cut in half.
+    """
+    start = 0
+    while len(text) - start > max_chars:
+        window = text[start:start + max_chars]
+        cut = max_chars
+        for pattern in _SPLIT_RES:
+            ends = [m.end() for m in pattern.finditer(window) if m.end() < max_chars]
+            if ends and ends[-1] > max_chars // 2:
+                cut = ends[-1]
+                break
+        yield start, text[start:start + cut]
+        start += cut
+    yield start, text[start:]
+
+
+def annotate_segments(segments: Iterable[dict], batch_size: int = NER_BATCH_SIZE,
+                      n_process: int = NER_PROCESSES) -> Iterator[tuple[dict, list]]:
+    """Run NER over a stream of segments (see ``extractor.iter_segments``).
+
+    Yields ``(segment, entities)`` in input order, where ``entities`` is a
+    list of ``(text, label, start_char)`` relative to the segment text.
+    Long segments are split with ``split_text`` and all pieces go through a
+    single ``nlp.pipe`` call, so batching and ``n_process`` apply across
+    segment boundaries.
+    """
+    def pieces():
+        for segment in segments:
+            parts = list(split_text(segment["text"]))
+            for i, (offset, part) in enumerate(parts):
+                yield part, (segment if i == len(parts) - 1 else None, offset)
+
+    found = []
+    for doc, (segment, offset) in get_nlp().pipe(
+        pieces(), as_tuples=True, batch_size=batch_size, n_process=n_process
+    ):
+        found.extend((ent.text, ent.label_, offset + ent.start_char) for ent in doc.ents)
+        if segment is not None:
+            yield segment, found
+            found = []
+
+
+def extract_entities(text: str, batch_size: int = NER_BATCH_SIZE,
+                     n_process: int = NER_PROCESSES) -> list[tuple[str, str, int]]:
+    """Entities ``(text, label, start_char)`` of a text of any length."""
+    return next(annotate_segments([{"text": text}], batch_size=batch_size, n_process=n_process))[1]
+
+
+def dedupe_entities(entities: Iterable[tuple[str, str, int]],
+                    limit: Optional[int] = None) -> list[dict]:
+    """Group entity mentions by ``(text, label)``.
+
+    Returns ``{"text", "label", "count", "offsets"}`` dicts, most frequent
+    first (ties in order of first mention). ``limit`` caps the number of
+    offsets kept per entity; ``count`` is always the full count.
+    """
+    grouped: dict[tuple[str, str], dict] = {}
+    for text, label, start in entities:
+        entry = grouped.get((text, label))
+        if entry is None:
+            entry = grouped[(text, label)] = {"text": text, "label": label, "count": 0, "offsets": []}
+        entry["count"] += 1
+        if limit is None or len(entry["offsets"]) < limit:
+            entry["offsets"].append(start)
+    return sorted(grouped.values(), key=lambda e: -e["count"])
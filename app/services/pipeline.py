@@ -0,0 +1,191 @@
+"""Tahap ingestion yang CPU-bound (ekstraksi, OCR, NER, chunking).
+
+Modul ini dijalankan di worker process milik ingestion queue, jadi sengaja
+tidak mengimpor vector store; penyimpanan dilakukan di proses utama.
+Chunk dikirim ke proses utama per batch lewat queue event begitu siap,
+sehingga embedding bisa mulai sebelum ekstraksi selesai. Hasil ekstraksi
+dan NER disimpan sebagai artifact (``app.services.artifacts``), jadi
+re-index file yang sama mulai dari chunking.
+"""
+import os
+import queue
+import logging
+from collections import deque
+from itertools import takewhile
+from typing import Optional
+
+from app.services import extractor, ner
+from app.services.artifacts import artifact_store
+from app.services.extractor import SegmentStats, iter_segments
+from app.services.metrics import StageTimer
+from app.services.ner import annotate_segments, dedupe_entities
+from app.services.preprocessing import iter_chunks
+from app.utils.file_handler import file_sha256
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BATCH_SIZE = int(os.getenv("INGEST_CHUNK_BATCH", "64"))
+# Muat model NER dan library ekstraksi saat worker start, bukan di job pertama
+INGEST_WARMUP = os.getenv("INGEST_WARMUP", "1") != "0"
+# Offset per entitas yang disimpan di metadata dokumen
+ENTITY_OFFSETS_LIMIT = int(os.getenv("ENTITY_OFFSETS_LIMIT", "20"))
+
+_events = None
+_stopping = None
+
+
+class IngestionStopped(Exception):
+    """The main process stopped the ingestion queue while this job was running."""
+
+
+def init_worker(events, stopping=None):
+    """Initializer worker process: simpan queue event progress, lalu warm-up."""
+    global _events, _stopping
+    _events = events
+    _stopping = stopping
+    if INGEST_WARMUP:
+        warm_up()
+
+
+def warm_up():
+    """Preload the extraction libraries and the NER model in this process."""
+    extractor.preload()
+    try:
+        ner.get_nlp()
+    except Exception as e:
+        # Worker tetap jalan; model dicoba lagi saat NER pertama
+        logger.error(f"NER model warm-up failed: {e}")
+
+
+def worker_status() -> dict:
+    """Runs in a worker; tells the main process the worker is up (and warm)."""
+    return {"pid": os.getpid(), "nlp_loaded": ner.nlp_loaded()}
+
+
+def report(job_id: str, stage: str, **info):
+    """Send an event to the main process; waits while its event queue is full."""
+    if _events is None:
+        return
+    while True:
+        try:
+            _events.put((job_id, stage, info), timeout=1)
+            return
+        except queue.Full:
+            # Tidak ada yang membaca lagi; job dilanjutkan dari journal saat start berikutnya
+            if _stopping is not None and _stopping.is_set():
+                raise IngestionStopped()
+
+
+def process_document(file_path: str, progress=None, content_hash: Optional[str] = None):
+    """Extract, NER and chunk one file as a stream.
+
+    Returns ``(chunks, finish)``: ``chunks`` is a generator of chunk dicts,
+    each with the entities found inside its span; ``finish()`` returns the
+    document metadata once the generator is exhausted, including the
+    seconds spent per stage under ``timings``.
+
+    Segments and entities come from the extraction artifact of the content
+    when there is one (``artifact`` in the metadata: ``hit``, or
+    ``extraction`` when only NER had to run again); otherwise the file is
+    extracted and a new artifact is written once it is complete.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    content_hash = content_hash or file_sha256(file_path)
+    artifact = artifact_store.load(content_hash) if artifact_store is not None else None
+    reuse = "miss" if artifact is None else ("hit" if artifact.has_entities else "extraction")
+    stats = SegmentStats()
+    timer = StageTimer("extract", "ner", "chunking")
+    entities: list[tuple[str, str, int]] = []  # (text, label, doc offset)
+    pending: deque = deque()  # entitas yang mungkin masih masuk chunk berikutnya
+
+    def extracted():
+        """``(segment, entities)`` pairs: from the artifact, or extracted and written to a new one."""
+        if reuse == "hit":
+            yield from timer.wrap("ner", timer.wrap("extract", artifact.segments()))
+            return
+        if reuse == "extraction":
+            segments = (segment for segment, _ in artifact.segments())
+        else:
+            segments = iter_segments(file_path, progress=progress)
+        writer = artifact_store.writer(content_hash, ext[1:]) if artifact_store is not None else None
+        committed = False
+        try:
+            for segment, found in timer.wrap("ner", annotate_segments(timer.wrap("extract", segments))):
+                if writer is not None:
+                    writer.add(segment, found)
+                yield segment, found
+            if writer is not None and writer.complete and stats.has_text:
+                writer.commit()
+                committed = True
+        finally:
+            if writer is not None and not committed:
+                writer.abort()
+
+    def annotated_segments():
+        offset = 0
+        for segment, found in extracted():
+            stats.add(segment)
+            for ent_text, label, start in found:
+                mention = (ent_text, label, offset + start)
+                entities.append(mention)
+                pending.append(mention)
+            offset += len(segment["text"]) + 1
+            yield segment
+
+    def chunks():
+        for chunk in timer.wrap("chunking", iter_chunks(annotated_segments())):
+            # Chunk urut berdasarkan offset, jadi entitas sebelum chunk ini bisa dibuang
+            while pending and pending[0][2] < chunk["start"]:
+                pending.popleft()
+            chunk["entities"] = dedupe_entities(
+                takewhile(lambda mention: mention[2] < chunk["end"], pending)
+            )
+            yield chunk
+
+    def finish() -> dict:
+        if not stats.has_text:
+            raise ValueError(f"No text could be extracted from the file: {file_path}")
+        timings = timer.exclusive()
+        if stats.ocr_attempts:
+            # OCR jalan paralel di thread; ini total waktu OCR per halaman
+            timings["ocr"] = round(stats.ocr_seconds, 6)
+        return {
+            "entities": dedupe_entities(entities, limit=ENTITY_OFFSETS_LIMIT),
+            **stats.metadata(ext),
+            "size": os.path.getsize(file_path),
+            "content_hash": content_hash,
+            "artifact": reuse,
+            "ocr_attempts": stats.ocr_attempts,
+            "timings": timings,
+        }
+
+    return chunks(), finish
+
+
+def extract_and_chunk(job_id: str, file_path: str, content_hash: Optional[str] = None):
+    """Worker entry point: stream chunk batches of one file to the main process.
+
+    Sends ``chunks`` events with batches of chunk dicts and a final
+    ``chunks_end`` event with the document metadata. Returns the chunk count.
+    """
+    report(job_id, "extracting")
+    chunks, finish = process_document(
+        file_path, progress=lambda stage, **info: report(job_id, stage, **info),
+        content_hash=content_hash,
+    )
+    batch = []
+    count = 0
+    try:
+        for chunk in chunks:
+            batch.append(chunk)
+            count += 1
+            if len(batch) >= CHUNK_BATCH_SIZE:
+                report(job_id, "chunks", chunks=batch)
+                batch = []
+    finally:
+        # Artifact yang belum lengkap dibuang sekarang, bukan saat generator di-GC
+        chunks.close()
+    if batch:
+        report(job_id, "chunks", chunks=batch)
+    report(job_id, "chunks_end", metadata=finish())
+    return count
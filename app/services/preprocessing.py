@@ -1,14 +1,143 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import os
+import re
+import math
+import logging
+from collections import deque
+from typing import Iterable, Iterator
 
+logger = logging.getLogger(__name__)
 
-def preprocess_text(text: str):
-    # 1) Bersihkan whitespace 
-    cleaned = " ".join(text.split())
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "250"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+# Path ke tokenizer.json model (HuggingFace format). Kalau tidak diisi,
+# jumlah token diperkirakan dari panjang kata.
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "")
 
-    # 2) Split menjadi chunk
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-    )
-    chunks = splitter.split_text(cleaned)
-    return chunks
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+# Batas unit: akhir kalimat atau pergantian baris
+_BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_PIECE_RE = re.compile(r"\S+\s*")
+
+
+def _load_tokenizer():
+    if not CHUNK_TOKENIZER:
+        return None
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_file(CHUNK_TOKENIZER)
+    except Exception as e:
+        logger.error(f"Error loading tokenizer {CHUNK_TOKENIZER}, falling back to estimate: {str(e)}")
+        return None
+
+
+_tokenizer = _load_tokenizer()
+
+
+def count_tokens(text: str) -> int:
+    """Number of model tokens in ``text``.
+
+    Exact when CHUNK_TOKENIZER points to the model's tokenizer.json,
+    otherwise a BPE-like estimate (about one token per 4 characters of each
+    word, one per punctuation mark).
+    """
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    return sum(math.ceil(len(w) / 4) for w in _WORD_RE.findall(text))
+
+
+def _units(text: str, offset: int, max_tokens: int):
+    """Split segment text into sentence/line units ``(start, end, text, tokens)``.
+
+    Units keep their trailing whitespace, so concatenating them gives back
+    the segment text. Units above ``max_tokens`` are split on whitespace.
+    """
+    start = 0
+    bounds = [m.end() for m in _BOUNDARY_RE.finditer(text)]
+    if not bounds or bounds[-1] != len(text):
+        bounds.append(len(text))
+    for end in bounds:
+        if end <= start:
+            continue
+        unit = text[start:end]
+        tokens = count_tokens(unit)
+        if tokens <= max_tokens:
+            yield offset + start, offset + end, unit, tokens
+        else:
+            piece_start, piece_tokens = start, 0
+            for m in _PIECE_RE.finditer(unit):
+                t = count_tokens(m.group())
+                if piece_tokens and piece_tokens + t > max_tokens:
+                    piece_end = start + m.start()
+                    yield offset + piece_start, offset + piece_end, text[piece_start:piece_end], piece_tokens
+                    piece_start, piece_tokens = piece_end, 0
+                piece_tokens += t
+            if piece_start < end:
+                yield offset + piece_start, offset + end, text[piece_start:end], piece_tokens
+        start = end
+
+
+def _chunk(window: deque) -> dict:
+    text = "".join(u[2] for u in window).strip()
+    first, last = window[0][4], window[-1][4]
+    chunk = {
+        "text": text,
+        "start": window[0][0],
+        "end": window[-1][1],
+        "tokens": sum(u[3] for u in window),
+    }
+    if "page" in first:
+        chunk["page_start"] = first["page"]
+        chunk["page_end"] = last["page"]
+    if "section" in first:
+        chunk["section"] = first["section"]
+    if "row" in first:
+        chunk["row_start"] = first["row"]
+        chunk["row_end"] = last["row"]
+    return chunk
+
+
+def _emit(window: deque):
+    chunk = _chunk(window)
+    if chunk["text"]:
+        yield chunk
+
+
+def iter_chunks(segments: Iterable[dict], chunk_tokens: int = CHUNK_SIZE_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[dict]:
+    """Chunk a stream of segments (see ``extractor.iter_segments``) lazily.
+
+    Chunks are at most ``chunk_tokens`` tokens (unless a single word is
+    longer) and consecutive chunks share up to ``overlap_tokens`` tokens of
+    whole units. Each chunk carries ``start``/``end`` character offsets in
+    the document text (segments joined with ``"\\n"``), its token count, and
+    ``page_start``/``page_end``, ``section`` and ``row_start``/``row_end``
+    when the segments have them. A change of ``section`` always starts a new chunk.
+
+    Only the current window of units is held in memory, so chunks are
+    yielded while the segments are still being produced.
+    """
+    window: deque = deque()
+    window_tokens = 0
+    offset = 0
+    section = None
+
+    for segment in segments:
+        text = segment["text"]
+        if segment.get("section") != section and window:
+            yield from _emit(window)
+            window.clear()
+            window_tokens = 0
+        section = segment.get("section")
+
+        # Separator antar segmen ikut ke unit terakhir segmen
+        for start, end, unit, tokens in _units(text + "\n", offset, chunk_tokens):
+            if window and window_tokens + tokens > chunk_tokens:
+                yield from _emit(window)
+                while window and (window_tokens > overlap_tokens or window_tokens + tokens > chunk_tokens):
+                    window_tokens -= window.popleft()[3]
+            window.append((start, end, unit, tokens, segment))
+            window_tokens += tokens
+        offset += len(text) + 1
+
+    if window:
+        yield from _emit(window)
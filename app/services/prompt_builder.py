@@ -0,0 +1,227 @@
+import os
+import re
+import logging
+from typing import Optional
+
+from app.services.metrics import stage
+from app.services.preprocessing import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Budget token untuk bagian RETRIEVED_CHUNKS
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "2000"))
+# Blok yang shingle-nya sebagian besar (fraksi ini) sudah ada di blok lain dianggap duplikat
+PROMPT_NEAR_DUP_THRESHOLD = float(os.getenv("PROMPT_NEAR_DUP_THRESHOLD", "0.85"))
+# Blok terakhir hanya dipotong kalau sisa budget minimal segini
+PROMPT_MIN_TRUNCATED_TOKENS = int(os.getenv("PROMPT_MIN_TRUNCATED_TOKENS", "50"))
+
+# Bagian statis prompt. Jangan sisipkan nilai dinamis di sini: prefix yang
+# identik byte-per-byte di setiap request bisa dipakai ulang oleh prompt/KV
+# cache di model server.
+SYSTEM_PREAMBLE = """Kamu adalah DMS AI, asisten AI cerdas yang bertugas membantu pengguna terkait dokumen perusahaan.
+
+Tugasmu adalah:
+1.  PAHAMI DOKUMEN: Pahami isi dokumen, termasuk template dan format yang ada.
+2.  BANTU BUAT DOKUMEN: Bantu pengguna membuat dokumen baru sesuai dengan template dan kebutuhan mereka, menggunakan informasi dari dokumen yang ada jika relevan.
+3.  CARI & AMBIL DATA: Temukan dan sajikan informasi spesifik dari dalam dokumen.
+4.  ANALISIS & LAPORKAN: Baca, pindai, buat ringkasan, atau laporan berdasarkan isi dan metadata dokumen.
+5.  INTERAKSI ALAMI: Berinteraksilah seolah-olah kamu adalah admin dokumen yang kompeten, menggunakan Bahasa Indonesia yang profesional dan jelas.
+6.  JANGAN BERI KOMENTAR: Jangan beri komentar apa-apa, hanya berikan jawaban saja.
+7.  Ketika pembukaan percakapan, kamu harus memperkenalkan diri sebagai DMS AI dengan singkat, asisten AI cerdas yang bertugas membantu pengguna terkait dokumen perusahaan, dan tidak perlu memberi data atau informasi perusahaan.
+
+Gunakan RETRIEVED_CHUNKS sebagai dasar faktual utama untuk jawabanmu.
+Jika informasi tidak ada dalam RETRIEVED_CHUNKS, nyatakan bahwa data tidak ditemukan dalam dokumen yang tersedia.
+"""
+
+REQUEST_TEMPLATE = """
+Saat ini kamu memiliki akses ke {doc_count} dokumen.
+Berikut adalah metadata file yang tersedia:
+- Total file diupload: {total_files_uploaded}
+- Daftar file: {file_list}
+- Tanggal upload terakhir: {last_upload_date}
+- Ringkasan Dokumen: {document_overview}
+
+Konteks (RETRIEVED_CHUNKS):
+{context}
+
+Pertanyaan Pengguna (USER_QUERY): {query}
+
+Jawaban (dalam Bahasa Indonesia):
+"""
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _join_overlapping(a: str, b: str, overlap_chars: int, slack: int = 64) -> str:
+    """Concatenate two chunks of one document, dropping the text they share.
+
+    ``overlap_chars`` comes from the chunk offsets; the shared text is at
+    most that long (chunk texts are stripped), so only lengths just below
+    it are checked.
+    """
+    longest = min(overlap_chars, len(a), len(b))
+    for length in range(longest, max(0, longest - slack), -1):
+        if a.endswith(b[:length]):
+            return a + b[length:]
+    return f"{a}\n{b}"
+
+
+def _location(meta: dict) -> dict:
+    return {key: meta.get(key) for key in ("page_start", "page_end", "section", "row_start", "row_end")}
+
+
+def merge_chunks(results) -> list[dict]:
+    """Merge overlapping or adjacent chunks of the same document into blocks.
+
+    ``results`` is a ranked ``[(Document, score)]`` list. Chunks with
+    ``start``/``end`` offsets (see ``preprocessing.iter_chunks``) that touch
+    or overlap (within the same ``section``, e.g. spreadsheet sheet) are
+    joined into one block; blocks keep the rank of their best chunk. Chunks
+    are grouped by ``doc_id`` (tenant-qualified), since two tenants may hold
+    files with the same name; ``source`` is only for display. Returns
+    ``{"source", "text", "rank", "chunks", "page_start", "page_end",
+    "section", "row_start", "row_end"}`` dicts in rank order.
+    """
+    by_doc: dict[str, list] = {}
+    for rank, (doc, _) in enumerate(results):
+        key = doc.metadata.get("doc_id") or doc.metadata.get("source", "")
+        by_doc.setdefault(key, []).append((rank, doc))
+
+    blocks = []
+    for items in by_doc.values():
+        source = items[0][1].metadata.get("source", "")
+        positioned = sorted(
+            (item for item in items if item[1].metadata.get("start") is not None),
+            key=lambda item: item[1].metadata["start"],
+        )
+        current = None
+        for rank, doc in positioned:
+            meta = doc.metadata
+            if (current is not None and meta["start"] <= current["end"] + 1
+                    and meta.get("section") == current["section"]):
+                if meta["end"] > current["end"]:
+                    current["text"] = _join_overlapping(
+                        current["text"], doc.page_content, current["end"] - meta["start"]
+                    )
+                current["end"] = max(current["end"], meta["end"])
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+                current["page_end"] = meta.get("page_end", current["page_end"])
+                current["row_end"] = meta.get("row_end", current["row_end"])
+                continue
+            current = {
+                "source": source, "text": doc.page_content, "rank": rank, "chunks": 1,
+                "end": meta["end"], **_location(meta),
+            }
+            blocks.append(current)
+        for rank, doc in items:
+            if doc.metadata.get("start") is None:
+                blocks.append({
+                    "source": source, "text": doc.page_content, "rank": rank, "chunks": 1,
+                    **_location(doc.metadata),
+                })
+    blocks.sort(key=lambda b: b["rank"])
+    for block in blocks:
+        block.pop("end", None)
+    return blocks
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    words = text.split(" ")
+    lo, hi = 0, len(words)
+    # Cari jumlah kata terbanyak yang masih muat
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def _block_header(index: int, block: dict) -> str:
+    header = f"[{index}] {block['source']}"
+    if block.get("page_start"):
+        pages = block["page_start"]
+        if block.get("page_end") and block["page_end"] != pages:
+            pages = f"{pages}-{block['page_end']}"
+        header += f" (hal. {pages})"
+    elif block.get("row_start"):
+        rows = block["row_start"]
+        if block.get("row_end") and block["row_end"] != rows:
+            rows = f"{rows}-{block['row_end']}"
+        header += f" ({block['section']}, baris {rows})" if block.get("section") else f" (baris {rows})"
+    return header
+
+
+def pack_context(results, max_tokens: int = PROMPT_CONTEXT_TOKENS,
+                 near_dup_threshold: float = PROMPT_NEAR_DUP_THRESHOLD) -> tuple[str, dict]:
+    """Build the RETRIEVED_CHUNKS text within ``max_tokens``.
+
+    Merges overlapping chunks, drops blocks whose word 3-grams are mostly
+    contained in a block already packed, and stops (or truncates the last
+    block) at the token budget. Returns the context and
+    stats comparing it with the naive join of all chunk texts.
+    """
+    raw_tokens = count_tokens("\n\n".join(doc.page_content for doc, _ in results))
+    blocks = merge_chunks(results)
+
+    parts, kept_shingles = [], []
+    used_tokens = 0
+    dropped_duplicates = dropped_budget = 0
+    for block in blocks:
+        shingles = _shingles(block["text"])
+        if any(len(shingles & other) / len(shingles) >= near_dup_threshold for other in kept_shingles):
+            dropped_duplicates += block["chunks"]
+            continue
+        part = f"{_block_header(len(parts) + 1, block)}\n{block['text']}"
+        tokens = count_tokens(part)
+        remaining = max_tokens - used_tokens
+        if tokens > remaining:
+            if remaining < PROMPT_MIN_TRUNCATED_TOKENS:
+                dropped_budget += block["chunks"]
+                continue
+            part = _truncate(part, remaining)
+            tokens = count_tokens(part)
+        parts.append(part)
+        kept_shingles.append(shingles)
+        used_tokens += tokens
+
+    context = "\n\n".join(parts)
+    context_tokens = count_tokens(context)
+    stats = {
+        "chunks": len(results),
+        "blocks": len(parts),
+        "merged": sum(b["chunks"] - 1 for b in blocks),
+        "dropped_duplicates": dropped_duplicates,
+        "dropped_budget": dropped_budget,
+        "raw_context_tokens": raw_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": raw_tokens - context_tokens,
+    }
+    return context, stats
+
+
+def build_prompt(query: str, results, meta: dict,
+                 max_context_tokens: Optional[int] = None) -> tuple[str, dict]:
+    """Full RAG prompt: static ``SYSTEM_PREAMBLE`` followed by the request part.
+
+    ``meta`` is the prompt metadata from the document catalog. Returns the
+    prompt and packing stats (see ``pack_context``), which are also logged.
+    """
+    with stage("chat", "prompt", chunks=len(results)):
+        context, stats = pack_context(results, max_tokens=max_context_tokens or PROMPT_CONTEXT_TOKENS)
+        prompt = SYSTEM_PREAMBLE + REQUEST_TEMPLATE.format(context=context, query=query, **meta)
+        stats["prompt_tokens"] = count_tokens(prompt)
+    logger.info(
+        f"Prompt packed: {stats['chunks']} chunks -> {stats['blocks']} blocks, "
+        f"{stats['context_tokens']} context tokens, {stats['tokens_saved']} saved"
+    )
+    return prompt, stats
@@ -0,0 +1,329 @@
+"""Online re-embedding of a shard into a shadow collection.
+
+A job pages through the live collection of a shard, re-embeds the chunk
+texts with the new model in batches (throttled to ``REEMBED_MAX_RATE``
+chunks per second, so chat keeps its share of Ollama) and upserts them into
+``{base collection}_{generation}``. Progress is checkpointed in
+``reembed.json`` in the shard directory after every page; a job stopped by
+a crash or shutdown continues from there on the next start.
+
+Chunks that ingestion writes or deletes meanwhile are caught up by
+comparing the ids of both collections. The last catch-up runs while writes
+to the shard wait (``Shard.swap_lock``) and also copies metadata that
+changed on chunks that kept their id (a re-ingested document whose chunk
+moved), then the shadow collection becomes the live one, the answer cache
+is cleared and the old collection dropped.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Optional
+
+from app.services.answer_cache import answer_cache
+from app.services.embedding import ChromaOllamaEmbeddingFunction
+from app.services.shards import Shard, shard_path, shards
+
+logger = logging.getLogger(__name__)
+
+REEMBED_PAGE_SIZE = int(os.getenv("REEMBED_PAGE_SIZE", "500"))
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "64"))
+# Chunk per detik; 0 = tanpa throttle
+REEMBED_MAX_RATE = float(os.getenv("REEMBED_MAX_RATE", "20"))
+# Jeda sebelum collection lama di-drop, supaya query yang sedang jalan selesai
+REEMBED_DROP_GRACE = float(os.getenv("REEMBED_DROP_GRACE", "5"))
+# Putaran catch-up sebelum swap; sisa selisih dikejar saat write ditahan
+REEMBED_CATCH_UP_ROUNDS = int(os.getenv("REEMBED_CATCH_UP_ROUNDS", "3"))
+
+STATE_FILE = "reembed.json"
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _state_path(tenant: str) -> str:
+    return os.path.join(shard_path(tenant), STATE_FILE)
+
+
+def load_state(tenant: str) -> Optional[dict]:
+    try:
+        with open(_state_path(tenant), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class ReembedJob:
+    """Re-embeds one shard; ``state`` is what ``reembed.json`` holds.
+
+    ``status`` is ``running``, ``done``, ``error`` or ``cancelled``; a
+    running job is in ``phase`` ``copying``, ``catching_up`` or ``swapping``.
+    """
+
+    def __init__(self, shard: Shard, state: dict):
+        self.shard = shard
+        self.state = state
+        self._stop = threading.Event()
+        self._cancel = False
+        self._thread: Optional[threading.Thread] = None
+        self._run_started = time.monotonic()
+        self._run_done = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"reembed-{self.shard.tenant}", daemon=True)
+        self._thread.start()
+
+    def stop(self, cancel: bool = False):
+        """Stop after the current batch; ``cancel`` also drops the shadow collection."""
+        self._cancel = cancel
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def progress(self) -> dict:
+        state = dict(self.state)
+        total, done = state.get("total") or 0, state.get("done") or 0
+        elapsed = time.monotonic() - self._run_started
+        rate = self._run_done / elapsed if elapsed > 0 and self._run_done else None
+        state["percent"] = round(min(done, total) / total * 100, 1) if total else None
+        state["rate"] = round(rate, 2) if rate else None
+        state["eta_seconds"] = (
+            round(max(total - done, 0) / rate) if rate and state["status"] == "running" else None
+        )
+        return state
+
+    def _save(self, **fields):
+        self.state.update(fields, updated_at=time.time())
+        path = _state_path(self.shard.tenant)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, path)
+
+    def _throttle(self):
+        if REEMBED_MAX_RATE > 0:
+            ahead = self._run_done / REEMBED_MAX_RATE - (time.monotonic() - self._run_started)
+            if ahead > 0:
+                self._stop.wait(ahead)
+
+    def _embed_into(self, target, embedder, page: dict, throttle: bool = True):
+        for start in range(0, len(page["ids"]), REEMBED_BATCH_SIZE):
+            if self._stop.is_set():
+                raise _Stopped()
+            end = start + REEMBED_BATCH_SIZE
+            texts = page["documents"][start:end]
+            target.upsert(page["ids"][start:end], embedder.embed_documents(texts), texts,
+                          page["metadatas"][start:end])
+            self._run_done += len(texts)
+            if throttle:
+                self._throttle()
+
+    def _catch_up(self, source, target, embedder, throttle: bool = True) -> int:
+        """Copy chunks missing from ``target`` and delete those gone from ``source``."""
+        live, shadow = source.ids(), target.ids()
+        self._save(total=len(live))
+        extra = list(shadow - live)
+        if extra:
+            target.delete(extra)
+        missing = sorted(live - shadow)
+        for start in range(0, len(missing), REEMBED_PAGE_SIZE):
+            page = source.get_by_ids(missing[start:start + REEMBED_PAGE_SIZE])
+            self._embed_into(target, embedder, page, throttle=throttle)
+            self._save(done=min(self.state["done"] + len(page["ids"]), self.state["total"]))
+        return len(missing) + len(extra)
+
+    @staticmethod
+    def _sync_metadata(source, target) -> int:
+        """Copy metadata that differs between ``source`` and ``target``; both hold the same ids."""
+        updated = 0
+        offset = 0
+        while True:
+            page = source.get(limit=REEMBED_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                return updated
+            offset += len(page["ids"])
+            shadow = target.get_by_ids(page["ids"])
+            current = dict(zip(shadow["ids"], shadow["metadatas"]))
+            changed = [(chunk_id, meta) for chunk_id, meta in zip(page["ids"], page["metadatas"])
+                       if current.get(chunk_id) != meta]
+            if changed:
+                target.update_metadata([chunk_id for chunk_id, _ in changed], [meta for _, meta in changed])
+                updated += len(changed)
+
+    def _run(self):
+        from app.services.vector_store import open_vectorstore
+
+        shard, state = self.shard, self.state
+        target = None
+        try:
+            if shard.collection_name == state["target"]:
+                # Swap sudah terjadi sebelum crash; tinggal drop collection lama
+                open_vectorstore(collection_name=state["source"]).drop()
+                self._save(status="done", phase=None, finished_at=time.time())
+                return
+            source = shard.store
+            target = open_vectorstore(collection_name=state["target"])
+            embedder = ChromaOllamaEmbeddingFunction(state["model"])
+
+            if state["phase"] == "copying":
+                offset = state["offset"]
+                while True:
+                    if self._stop.is_set():
+                        raise _Stopped()
+                    page = source.get(limit=REEMBED_PAGE_SIZE, offset=offset)
+                    if not page["ids"]:
+                        break
+                    self._embed_into(target, embedder, page)
+                    offset += len(page["ids"])
+                    self._save(offset=offset, done=offset)
+                self._save(phase="catching_up")
+
+            for _ in range(REEMBED_CATCH_UP_ROUNDS):
+                if self._catch_up(source, target, embedder) <= REEMBED_PAGE_SIZE:
+                    break
+            self._save(phase="swapping")
+            with shard.swap_lock.exclusive():
+                self._catch_up(source, target, embedder, throttle=False)
+                updated = self._sync_metadata(source, target)
+                if updated:
+                    logger.info(f"Copied changed metadata of {updated} chunks into {state['target']}")
+                previous = shard.swap(state["target"], state["model"], target, state["generation"])
+            target = None
+            if answer_cache is not None:
+                # Vektor query lama tidak sebanding dengan model baru
+                answer_cache.clear()
+            self._save(status="done", phase=None, done=shard.store.count(), finished_at=time.time())
+            logger.info(f"Re-embedding of {shard.tenant} into {state['target']} done")
+            self._stop.wait(REEMBED_DROP_GRACE)
+            previous.drop()
+        except _Stopped:
+            if self._cancel:
+                if target is not None:
+                    target.drop()
+                    target = None
+                self._save(status="cancelled", phase=None, finished_at=time.time())
+                logger.info(f"Re-embedding of {shard.tenant} cancelled")
+            else:
+                logger.info(f"Re-embedding of {shard.tenant} paused at {state.get('offset')}; resumes on restart")
+        except Exception as e:
+            logger.error(f"Re-embedding of {shard.tenant} failed: {e}")
+            self._save(status="error", error=str(e))
+        finally:
+            if target is not None:
+                target.close()
+
+
+class Reembedder:
+    """Re-embedding jobs by tenant, at most one per shard."""
+
+    def __init__(self):
+        self._jobs: dict[str, ReembedJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, shard: Shard, model: str) -> dict:
+        """Start (or resume a failed) re-embedding of ``shard`` into ``model``.
+
+        Raises ``RuntimeError`` when one is already running and
+        ``ValueError`` when the shard already uses ``model``.
+        """
+        with self._lock:
+            job = self._jobs.get(shard.tenant)
+            if job is not None and job.alive():
+                raise RuntimeError(f"Re-embedding of {shard.tenant} is already running")
+            if model == shard.model:
+                raise ValueError(f"Tenant {shard.tenant} already uses {model}")
+            state = load_state(shard.tenant)
+            if not (state and state["status"] == "error" and state["model"] == model
+                    and state["source"] == shard.collection_name):
+                self._drop_shadow(state, shard)
+                generation = shard.generation + 1
+                state = {
+                    "tenant": shard.tenant,
+                    "model": model,
+                    "source_model": shard.model,
+                    "source": shard.collection_name,
+                    "target": f"{shard.base_collection}_{generation}",
+                    "generation": generation,
+                    "phase": "copying",
+                    "offset": 0,
+                    "done": 0,
+                    "total": shard.store.count(),
+                    "started_at": time.time(),
+                    "finished_at": None,
+                }
+            state.update(status="running", error=None)
+            job = self._jobs[shard.tenant] = ReembedJob(shard, state)
+            job._save()
+            job.start()
+            return job.progress()
+
+    @staticmethod
+    def _drop_shadow(state: Optional[dict], shard: Shard):
+        # Shadow collection dari job lama yang tidak selesai
+        if state and state["status"] != "done" and state["target"] != shard.collection_name:
+            from app.services.vector_store import open_vectorstore
+
+            open_vectorstore(collection_name=state["target"]).drop()
+
+    def get(self, tenant: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(tenant)
+        if job is not None:
+            return job.progress()
+        return load_state(tenant)
+
+    def running(self, tenant: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(tenant)
+        return job is not None and job.alive()
+
+    def cancel(self, tenant: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(tenant)
+        if job is None or not job.alive():
+            return False
+        job.stop(cancel=True)
+        return True
+
+    def discard(self, shard: Shard):
+        """Forget the re-embedding of a shard that is reset or dropped (not while running)."""
+        with self._lock:
+            self._jobs.pop(shard.tenant, None)
+            state = load_state(shard.tenant)
+            self._drop_shadow(state, shard)
+            if state is not None:
+                os.remove(_state_path(shard.tenant))
+
+    def resume(self):
+        """Restart the jobs that were running when the process stopped."""
+        for tenant in shards.tenants():
+            state = load_state(tenant)
+            if state and state["status"] == "running":
+                logger.info(f"Resuming re-embedding of {tenant} ({state['phase']}, offset {state['offset']})")
+                with self._lock:
+                    job = self._jobs[tenant] = ReembedJob(shards.get(tenant), state)
+                job.start()
+
+    def jobs(self) -> list[dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.progress() for job in jobs]
+
+    def stop(self, timeout: float = 10):
+        """Pause running jobs (they resume on the next start)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.stop()
+        for job in jobs:
+            job.join(timeout)
+
+
+reembedder = Reembedder()
@@ -0,0 +1,229 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from app.services.embedding import embeddings
+from app.services.embedding_cache import cache_key, get_embedding_cache
+from app.services.lexical_index import contains_identifiers, query_identifiers
+from app.services.llm_client import generate_embedding_async
+from app.services.metrics import stage
+from app.services.shards import Shard, shards
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+EMBED_QUERY_TIMEOUT = float(os.getenv("EMBED_QUERY_TIMEOUT", "15"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "10"))
+# vector | lexical | hybrid | auto (hybrid, tanpa embedding kalau BM25 sudah yakin)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid", "auto")
+# Kandidat per retriever sebelum fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Query vector store (dan lookup cache SQLite) jalan di executor terbatas ini,
+# bukan di thread event loop.
+_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+async def embed_query(query: str, model: Optional[str] = None) -> list[float]:
+    """Embed a query without blocking the event loop, via the embedding cache."""
+    model = model or embeddings.model
+    cache = get_embedding_cache()
+    key = cache_key(model, query)
+    with stage("chat", "embed_query") as record:
+        if cache is not None:
+            found = await run_blocking(cache.get_many, [key])
+            if key in found:
+                if record is not None:
+                    record["attrs"]["cached"] = True
+                return found[key]
+
+        vectors = await generate_embedding_async([query], model=model)
+        if not vectors or not vectors[0]:
+            raise ValueError("Failed to generate embedding")
+        if cache is not None:
+            await run_blocking(cache.put_many, {key: vectors[0]})
+        return vectors[0]
+
+
+def resolve_shards(tenants: Optional[list[str]] = None) -> list[Shard]:
+    """Existing shards of ``tenants`` (default tenant when empty); unknown tenants are skipped."""
+    found = []
+    for tenant in tenants or [None]:
+        shard = shards.get(tenant, create=False)
+        if shard is not None and shard not in found:
+            found.append(shard)
+    return found
+
+
+def merge_top_k(result_lists: list[list], k: int) -> list:
+    """Merge ``(Document, score)`` lists of several shards by rank.
+
+    Scores of different shards are not comparable (Chroma returns distances,
+    the quantized store cosine, BM25 depends on each shard's corpus), so
+    several lists are merged with ``rrf_fuse``.
+    """
+    if len(result_lists) == 1:
+        return result_lists[0][:k]
+    return rrf_fuse(result_lists, k=k)
+
+
+def _shard_filter(chunk_ids: Optional[dict[str, set[str]]], shard: Shard) -> Optional[set[str]]:
+    return None if chunk_ids is None else chunk_ids.get(shard.tenant, set())
+
+
+def _query_vectorstore(shard: Shard, vectors: dict[str, list[float]], k: int, chunk_ids: Optional[set[str]]):
+    if chunk_ids is not None and not chunk_ids:
+        return []
+    vector = vectors.get(shard.model)
+    if vector is None:
+        # Collection di-swap ke model lain setelah query di-embed
+        logger.warning(f"Shard {shard.tenant} switched to {shard.model}; skipping its vector search")
+        return []
+    # shard.store bisa membuka store (blocking) kalau warm-up belum selesai
+    return shard.search_vector(vector, k, chunk_ids)
+
+
+def _query_lexical(shard: Shard, query: str, k: int, chunk_ids: Optional[set[str]]):
+    if chunk_ids is not None and not chunk_ids:
+        return []
+    return [
+        (Document(page_content=text, metadata=metadata, id=chunk_id), score)
+        for chunk_id, text, metadata, score in shard.search_lexical(query, k, chunk_ids)
+    ]
+
+
+async def search_by_vector(vectors: dict[str, list[float]], k: int = 5, timeout: float = RETRIEVAL_TIMEOUT,
+                           chunk_ids: Optional[dict[str, set[str]]] = None,
+                           targets: Optional[list[Shard]] = None):
+    """Vector search over ``targets`` in parallel, merged to the top ``k``.
+
+    ``vectors`` maps embedding model -> query vector; each shard is searched
+    with the vector of its collection's model. ``chunk_ids`` (tenant -> ids)
+    restricts each shard to those chunks.
+    """
+    targets = resolve_shards() if targets is None else targets
+    with stage("chat", "vector_search", k=k, shards=len(targets)):
+        results = await asyncio.wait_for(
+            asyncio.gather(*(
+                run_blocking(_query_vectorstore, shard, vectors, k, _shard_filter(chunk_ids, shard))
+                for shard in targets
+            )),
+            timeout=timeout,
+        )
+    return merge_top_k(results, k)
+
+
+async def lexical_search(query: str, k: int = 5, chunk_ids: Optional[dict[str, set[str]]] = None,
+                         targets: Optional[list[Shard]] = None):
+    """BM25 search in the same ``(Document, score)`` shape as the vector search."""
+    targets = resolve_shards() if targets is None else targets
+    with stage("chat", "lexical_search", k=k, shards=len(targets)):
+        results = await asyncio.gather(*(
+            run_blocking(_query_lexical, shard, query, k, _shard_filter(chunk_ids, shard)) for shard in targets
+        ))
+    return merge_top_k(results, k)
+
+
+def _result_id(doc) -> str:
+    return doc.metadata.get("chunk_id") or doc.id or doc.page_content
+
+
+def rrf_fuse(result_lists: list[list], k: int = 5, rrf_k: int = RRF_K) -> list:
+    """Reciprocal rank fusion: each list adds ``1 / (rrf_k + rank)`` per chunk."""
+    scores: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            key = _result_id(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(docs[key], scores[key]) for key in ranked]
+
+
+async def retrieve(query: str, k: int = 5, embed_timeout: float = EMBED_QUERY_TIMEOUT,
+                   search_timeout: float = RETRIEVAL_TIMEOUT, entities: Optional[list[dict]] = None,
+                   mode: Optional[str] = None, tenants: Optional[list[str]] = None):
+    """Retrieve chunks for a query; returns ``(query_vector, results)``.
+
+    ``mode`` is one of ``RETRIEVAL_MODES`` (default ``RETRIEVAL_MODE``):
+    ``vector`` and ``lexical`` use one index, ``hybrid`` merges both with
+    reciprocal rank fusion, and ``auto`` is hybrid except that a query
+    whose identifiers (``INV-2023-0042``) all occur in BM25 hits is answered
+    from those hits without embedding the query; ``query_vector`` is then
+    ``None``. Otherwise it is the query embedded with the model of the
+    first shard.
+
+    ``entities`` (``[{"text": ..., "label": ...}]``) restricts the search to
+    chunks mentioning all of them, looked up in the entity index.
+
+    ``tenants`` selects the shards to search (default tenant when empty);
+    each shard is queried in parallel and the hits are merged by rank
+    before fusion. Tenants without a shard contribute nothing.
+
+    Raises ``asyncio.TimeoutError`` when the embedding or the vector store query
+    takes longer than its timeout.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    targets = resolve_shards(tenants)
+    if not targets:
+        return None, []
+    chunk_ids = None
+    if entities:
+        with stage("chat", "entity_filter", entities=len(entities)):
+            found = await asyncio.gather(*(run_blocking(shard.entities.chunks_for, entities) for shard in targets))
+        chunk_ids = {shard.tenant: ids for shard, ids in zip(targets, found)}
+
+    if mode == "lexical":
+        return None, await lexical_search(query, k=k, chunk_ids=chunk_ids, targets=targets)
+
+    async def vector_search():
+        # Shard bisa memakai model embedding berbeda (mis. saat migrasi); embed sekali per model
+        models = await run_blocking(lambda: [shard.model for shard in targets])
+        unique = list(dict.fromkeys(models))
+        found = await asyncio.wait_for(
+            asyncio.gather(*(embed_query(query, model) for model in unique)), timeout=embed_timeout
+        )
+        vectors = dict(zip(unique, found))
+        n = k if mode == "vector" else max(k, HYBRID_CANDIDATES)
+        results = await search_by_vector(vectors, k=n, timeout=search_timeout, chunk_ids=chunk_ids,
+                                         targets=targets)
+        return vectors[models[0]], results
+
+    if mode == "vector":
+        return await vector_search()
+
+    candidates = max(k, HYBRID_CANDIDATES)
+    if mode == "auto":
+        lexical = await lexical_search(query, k=candidates, chunk_ids=chunk_ids, targets=targets)
+        identifiers = query_identifiers(query)
+        exact = [hit for hit in lexical if identifiers and contains_identifiers(hit[0].page_content, identifiers)]
+        if exact:
+            return None, exact[:k]
+        vector, semantic = await vector_search()
+    else:
+        (vector, semantic), lexical = await asyncio.gather(
+            vector_search(), lexical_search(query, k=candidates, chunk_ids=chunk_ids, targets=targets)
+        )
+    return vector, rrf_fuse([semantic, lexical], k=k)
+
+
+async def similarity_search(query: str, k: int = 5, embed_timeout: float = EMBED_QUERY_TIMEOUT,
+                            search_timeout: float = RETRIEVAL_TIMEOUT, tenants: Optional[list[str]] = None):
+    """Async equivalent of ``vectorstore.similarity_search_with_score``."""
+    _, results = await retrieve(query, k, embed_timeout, search_timeout, tenants=tenants)
+    return results
@@ -0,0 +1,323 @@
+"""Tenant shards: vector collection, lexical/entity index and catalog per tenant.
+
+Tenant ``DEFAULT_TENANT`` keeps the original layout (collection
+``documents``, index files directly in ``CHROMA_DIR``, uploads in
+``UPLOAD_DIR``). Every other tenant (department) gets collection
+``documents__{tenant}``, its own files under ``CHROMA_DIR/tenants/{tenant}``
+and uploads under ``UPLOAD_DIR/{tenant}``. A shard is created by its first
+upload, so one tenant can be rebuilt or dropped without touching the
+index of another.
+
+``collection.json`` in the shard directory records the live collection and
+the embedding model its vectors come from; re-embedding
+(``app.services.reembed``) builds ``{collection}_{generation}`` next to it
+and swaps it in with ``Shard.swap``.
+"""
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from app.services.catalog import DocumentCatalog, document_catalog
+from app.services.entity_index import ENTITY_INDEX_PATH, EntityIndex, entity_index
+from app.services.lexical_index import LEXICAL_INDEX_PATH, LexicalIndex, lexical_index
+from app.services.llm_client import EMBED_MODEL
+from app.services.metrics import SHARD_SEARCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CHROMA_DIR = os.getenv("CHROMA_DIR", "vectorstore")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "upload")
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+TENANTS_DIR = os.path.join(CHROMA_DIR, "tenants")
+# Model collection yang dibuat sebelum collection.json ada (dulu hard-coded)
+LEGACY_EMBED_MODEL = "llama3"
+
+# Nama collection Chroma maksimal 63 karakter ("documents__" + tenant)
+_TENANT_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,47}$")
+
+
+def normalize_tenant(tenant: Optional[str]) -> str:
+    """Tenant key in canonical form; ``None``/empty is ``DEFAULT_TENANT``.
+
+    Raises ``ValueError`` for keys that cannot be used as a directory and
+    collection name.
+    """
+    if not tenant:
+        return DEFAULT_TENANT
+    key = tenant.strip().lower()
+    if not _TENANT_RE.match(key):
+        raise ValueError(f"Invalid tenant {tenant!r}: use 1-48 characters a-z, 0-9, '_' or '-'")
+    return key
+
+
+def shard_path(tenant: str) -> str:
+    """Directory of a tenant's index files (``CHROMA_DIR`` for the default tenant)."""
+    return CHROMA_DIR if tenant == DEFAULT_TENANT else os.path.join(TENANTS_DIR, tenant)
+
+
+class SwapLock:
+    """Shared by writers to a shard's collection, exclusive for swapping it."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._writers = 0
+        self._swapping = False
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._swapping)
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._swapping)
+            self._swapping = True
+            self._cond.wait_for(lambda: self._writers == 0)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._swapping = False
+                self._cond.notify_all()
+
+
+def _remove_sqlite(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+class Shard:
+    """Everything indexed for one tenant; stores are opened on first use."""
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.is_default = tenant == DEFAULT_TENANT
+        if self.is_default:
+            self.base_collection = "documents"
+            self.path = shard_path(tenant)
+            self.upload_dir = UPLOAD_DIR
+            self.lexical_path = LEXICAL_INDEX_PATH
+            self.entity_path = ENTITY_INDEX_PATH
+        else:
+            self.base_collection = f"documents__{tenant}"
+            self.path = shard_path(tenant)
+            self.upload_dir = os.path.join(UPLOAD_DIR, tenant)
+            self.lexical_path = os.path.join(self.path, "lexical_index.sqlite")
+            self.entity_path = os.path.join(self.path, "entity_index.sqlite")
+        self.manifest_dir = os.path.join(self.path, "manifests")
+        self.state_path = os.path.join(self.path, "collection.json")
+        self._lock = threading.RLock()
+        # embed_and_store memegang shared, Shard.swap menunggu exclusive
+        self.swap_lock = SwapLock()
+        self._store = None
+        state = self._load_state()
+        self.collection_name = state.get("collection", self.base_collection)
+        self.generation = state.get("generation", 0)
+        self._model: Optional[str] = state.get("model")
+        self._lexical: Optional[LexicalIndex] = lexical_index if self.is_default else None
+        self._entities: Optional[EntityIndex] = entity_index if self.is_default else None
+        self.catalog = document_catalog if self.is_default else DocumentCatalog(
+            os.path.join(self.path, "catalog.json"), self.upload_dir
+        )
+
+    @property
+    def store(self):
+        """Vector store of the shard (``VECTOR_BACKEND``)."""
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    from app.services.vector_store import open_vectorstore
+
+                    self._store = open_vectorstore(collection_name=self.collection_name)
+        return self._store
+
+    @property
+    def model(self) -> str:
+        """Embedding model of the live collection.
+
+        A shard without ``collection.json`` records ``EMBED_MODEL`` when its
+        collection is still empty, else ``LEGACY_EMBED_MODEL``.
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    model = EMBED_MODEL if self.store.count() == 0 else LEGACY_EMBED_MODEL
+                    self._save_state(self.collection_name, model, self.generation)
+                    self._model = model
+        return self._model
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self, collection: str, model: str, generation: int):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection": collection, "model": model, "generation": generation}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def swap(self, collection: str, model: str, store, generation: int):
+        """Make ``store`` (collection ``collection``, vectors of ``model``) the live one.
+
+        Call with ``swap_lock.exclusive()`` held. Returns the previous store,
+        which the caller drops.
+        """
+        with self._lock:
+            previous = self.store
+            self._save_state(collection, model, generation)
+            self._store, self.collection_name, self._model, self.generation = store, collection, model, generation
+        logger.info(f"Shard {self.tenant} now serves collection {collection} ({model})")
+        return previous
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        if self._lexical is None:
+            with self._lock:
+                if self._lexical is None:
+                    self._lexical = LexicalIndex(self.lexical_path)
+        return self._lexical
+
+    @property
+    def entities(self) -> EntityIndex:
+        if self._entities is None:
+            with self._lock:
+                if self._entities is None:
+                    self._entities = EntityIndex(self.entity_path)
+        return self._entities
+
+    def search_vector(self, vector: list[float], k: int, chunk_ids: Optional[set[str]] = None) -> list:
+        with SHARD_SEARCH_SECONDS.time(tenant=self.tenant, index="vector"):
+            return self.store.search(vector, k=k, chunk_ids=chunk_ids)
+
+    def search_lexical(self, query: str, k: int, chunk_ids: Optional[set[str]] = None) -> list:
+        with SHARD_SEARCH_SECONDS.time(tenant=self.tenant, index="lexical"):
+            return self.lexical.search(query, k=k, chunk_ids=chunk_ids)
+
+    def stats(self) -> dict:
+        catalog = self.catalog.stats()
+        result = {
+            "tenant": self.tenant,
+            "collection": self.collection_name,
+            "embed_model": self.model,
+            "documents": catalog["total_files"],
+            "size_bytes": catalog["total_size"],
+            "chunks": self.lexical.count(),
+        }
+        for index in ("vector", "lexical"):
+            latency = SHARD_SEARCH_SECONDS.snapshot(tenant=self.tenant, index=index)
+            result[f"{index}_search"] = {
+                "count": latency["count"],
+                "mean_ms": round(latency["sum"] / latency["count"] * 1000, 3) if latency["count"] else None,
+            }
+        return result
+
+    def reset(self):
+        """Delete the vector collection, lexical/entity index and manifests.
+
+        The catalog and the uploaded files stay, so the shard can be
+        re-ingested from them (see ``routes.tenants``); the new collection
+        uses ``EMBED_MODEL``.
+        """
+        with self._lock:
+            self.store.drop()
+            self._store = None
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            self.collection_name, self.generation, self._model = self.base_collection, 0, None
+            for index, path in ((self._lexical, self.lexical_path), (self._entities, self.entity_path)):
+                if index is not None:
+                    index.close()
+                _remove_sqlite(path)
+            self._lexical = self._entities = None
+            shutil.rmtree(self.manifest_dir, ignore_errors=True)
+        logger.info(f"Shard {self.tenant} reset")
+
+    def close(self):
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+        self.catalog.flush()
+
+
+class ShardRegistry:
+    """Open shards by tenant; a shard exists once its directory does."""
+
+    def __init__(self):
+        self._shards: dict[str, Shard] = {}
+        self._lock = threading.Lock()
+
+    def exists(self, tenant: str) -> bool:
+        return tenant == DEFAULT_TENANT or os.path.isdir(shard_path(tenant))
+
+    def get(self, tenant: Optional[str] = None, create: bool = True) -> Optional[Shard]:
+        """Shard of ``tenant`` (default tenant when ``None``).
+
+        With ``create=False`` an unknown tenant gives ``None`` instead of a
+        new, empty shard.
+        """
+        tenant = normalize_tenant(tenant)
+        with self._lock:
+            shard = self._shards.get(tenant)
+            if shard is None:
+                if not create and not self.exists(tenant):
+                    return None
+                os.makedirs(shard_path(tenant), exist_ok=True)
+                shard = self._shards[tenant] = Shard(tenant)
+            return shard
+
+    def tenants(self) -> list[str]:
+        names = sorted(os.listdir(TENANTS_DIR)) if os.path.isdir(TENANTS_DIR) else []
+        return [DEFAULT_TENANT] + [n for n in names if n != DEFAULT_TENANT and _TENANT_RE.match(n)]
+
+    def drop(self, tenant: str):
+        """Delete a tenant with its index, catalog and uploads (not the default tenant)."""
+        tenant = normalize_tenant(tenant)
+        if tenant == DEFAULT_TENANT:
+            raise ValueError("The default tenant cannot be dropped")
+        shard = self.get(tenant, create=False)
+        if shard is None:
+            return False
+        shard.reset()
+        shard.catalog.discard()
+        with self._lock:
+            self._shards.pop(tenant, None)
+        shutil.rmtree(shard.path, ignore_errors=True)
+        shutil.rmtree(shard.upload_dir, ignore_errors=True)
+        logger.info(f"Shard {tenant} dropped")
+        return True
+
+    def loaded(self) -> list[Shard]:
+        with self._lock:
+            return list(self._shards.values())
+
+    def flush(self):
+        for shard in self.loaded():
+            shard.catalog.flush()
+
+    def close(self):
+        for shard in self.loaded():
+            shard.close()
+
+
+shards = ShardRegistry()
@@ -0,0 +1,143 @@
+"""Tracing span ringan dengan request id, aktif kalau DMS_TRACE=1.
+
+Setiap span yang selesai ditulis sebagai satu baris JSON ke logger
+``dms.trace``: nama, request id, span id/parent, durasi dan atribut. Request
+id diambil dari header ``X-Request-ID`` (atau dibuat baru) oleh
+``RequestIdMiddleware``; job ingestion memakai job id-nya. Saat tracing mati,
+``span`` tidak melakukan apa-apa selain ``yield``.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+TRACE_ENABLED = os.getenv("DMS_TRACE", "0").lower() in ("1", "true", "yes", "on")
+REQUEST_ID_HEADER = "x-request-id"
+
+trace_logger = logging.getLogger("dms.trace")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_current_span: ContextVar[Optional[dict]] = ContextVar("current_span", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None):
+    """Run the block under ``request_id`` (a new one when omitted)."""
+    token = _request_id.set(request_id or new_request_id())
+    try:
+        yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+
+def _emit(record: dict):
+    trace_logger.info(json.dumps(record, default=str))
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Trace the block as a span; yields a dict whose ``attrs`` may be extended."""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    parent = _current_span.get()
+    record = {
+        "span": name,
+        "request_id": _request_id.get(),
+        "span_id": uuid.uuid4().hex[:8],
+        "parent_id": parent["span_id"] if parent else None,
+        "attrs": attrs,
+    }
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async generator yang ditutup dari context lain
+            pass
+        _emit(record)
+
+
+def record_span(name: str, seconds: float, request_id: Optional[str] = None, **attrs):
+    """Emit a span measured elsewhere, e.g. a stage timed in a worker process."""
+    if not TRACE_ENABLED:
+        return
+    parent = _current_span.get()
+    _emit({
+        "span": name,
+        "request_id": request_id or _request_id.get(),
+        "span_id": uuid.uuid4().hex[:8],
+        "parent_id": parent["span_id"] if parent else None,
+        "attrs": attrs,
+        "duration_ms": round(seconds * 1000, 3),
+    })
+
+
+def _route_template(scope) -> str:
+    """``/upload/jobs/{job_id}`` for ``/upload/jobs/3f2a...``; keeps metric labels bounded."""
+    if "endpoint" not in scope:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: request id per HTTP request, echoed in ``X-Request-ID``.
+
+    Also records ``dms_http_request_duration_seconds`` per route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        from app.services.metrics import HTTP_REQUEST_SECONDS
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(REQUEST_ID_HEADER.encode("latin-1"), b"").decode("latin-1")[:64] or new_request_id()
+        status = {"code": 500}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        with request_context(request_id):
+            with span("http", method=scope["method"], path=scope["path"]) as record:
+                try:
+                    await self.app(scope, receive, send_with_request_id)
+                finally:
+                    if record is not None:
+                        record["attrs"]["status"] = status["code"]
+                    HTTP_REQUEST_SECONDS.observe(
+                        time.perf_counter() - start,
+                        method=scope["method"], route=_route_template(scope), status=str(status["code"]),
+                    )
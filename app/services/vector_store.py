@@ -0,0 +1,675 @@
+"""Vector store backends behind ``embedding.get_vectorstore()``.
+
+``VECTOR_BACKEND=chroma`` (default) keeps the Chroma collection.
+``VECTOR_BACKEND=quantized`` stores chunk vectors in memory-mapped NumPy
+files: a compact copy (int8 with one scale per vector, or float16) that is
+scanned or indexed for candidates, and the full float32 vectors that are
+only read for the top candidates to re-rank them exactly. Text and metadata
+live in SQLite next to the vectors.
+
+The ANN index (``VECTOR_ANN``) is pluggable: ``exact`` scans the compact
+vectors in blocks; ``hnsw`` uses hnswlib (optional dependency, not in
+requirements.txt) over a random projection of the vectors to
+``VECTOR_ANN_DIM`` dimensions, so the graph stays small next to 4096-dim
+Llama3 embeddings; ``auto`` picks ``hnsw`` when hnswlib is installed.
+"""
+import os
+import json
+import math
+import shutil
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CHROMA_DIR = os.getenv("CHROMA_DIR", "vectorstore")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_BACKENDS = ("chroma", "quantized")
+VECTOR_DIR = os.getenv("VECTOR_DIR", os.path.join(CHROMA_DIR, "quantized"))
+# int8 | float16
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+# auto | hnsw | exact
+VECTOR_ANN = os.getenv("VECTOR_ANN", "auto")
+VECTOR_ANN_DIM = int(os.getenv("VECTOR_ANN_DIM", "256"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "128"))
+# Kandidat yang di-rerank dengan vektor float32: max(k * factor, min)
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+VECTOR_RERANK_MIN = int(os.getenv("VECTOR_RERANK_MIN", "50"))
+# Index HNSW disimpan ke disk setiap sekian perubahan (dan saat close)
+VECTOR_ANN_SAVE_EVERY = int(os.getenv("VECTOR_ANN_SAVE_EVERY", "2000"))
+
+_SCAN_BLOCK = 1024
+_SQL_BATCH = 500
+_MIN_CAPACITY = 1024
+_PROJECTION_SEED = 20240601
+
+
+class VectorStore(ABC):
+    """Chunk vectors with their text and metadata.
+
+    Ids are chunk ids (``{doc_id}-{chunk_hash}``). ``search`` returns
+    ``(Document, score)`` pairs, best first; what the score means depends
+    on the backend.
+    """
+
+    @abstractmethod
+    def upsert(self, ids: list[str], embeddings: list[list[float]], documents: list[str],
+               metadatas: list[dict]):
+        ...
+
+    @abstractmethod
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: list[str]):
+        ...
+
+    @abstractmethod
+    def get(self, limit: int, offset: int = 0, include_embeddings: bool = False) -> dict:
+        """One page of ``{"ids", "documents", "metadatas"[, "embeddings"]}``."""
+
+    @abstractmethod
+    def get_by_ids(self, ids: list[str]) -> dict:
+        """``{"ids", "documents", "metadatas"}`` of the given chunks that exist."""
+
+    @abstractmethod
+    def ids(self) -> set[str]:
+        """Every chunk id in the store."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, vector: list[float], k: int = 5,
+               chunk_ids: Optional[set[str]] = None) -> list[tuple[Document, float]]:
+        ...
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def drop(self):
+        """Delete the whole collection; the store must not be used afterwards."""
+
+
+class ChromaVectorStore(VectorStore):
+    """The langchain Chroma collection; scores are Chroma distances (lower is closer)."""
+
+    def __init__(self, collection_name: str = "documents", embedding_function=None,
+                 persist_directory: str = CHROMA_DIR):
+        from langchain_chroma.vectorstores import Chroma
+
+        self._store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embedding_function,
+            persist_directory=persist_directory,
+        )
+        self._collection = self._store._collection
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        self._collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self._collection.delete(ids=ids)
+
+    def get(self, limit, offset=0, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        page = self._collection.get(include=include, limit=limit, offset=offset)
+        result = {"ids": page["ids"], "documents": page["documents"], "metadatas": page["metadatas"]}
+        if include_embeddings:
+            result["embeddings"] = page["embeddings"]
+        return result
+
+    def get_by_ids(self, ids):
+        page = self._collection.get(ids=ids, include=["documents", "metadatas"])
+        return {"ids": page["ids"], "documents": page["documents"], "metadatas": page["metadatas"]}
+
+    def ids(self):
+        return set(self._collection.get(include=[])["ids"])
+
+    def count(self):
+        return self._collection.count()
+
+    def search(self, vector, k=5, chunk_ids=None):
+        where = {"chunk_id": {"$in": sorted(chunk_ids)}} if chunk_ids is not None else None
+        return self._store.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=where)
+
+    def drop(self):
+        self._store.delete_collection()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _open_matrix(path: str, dtype, dim: int, rows: int) -> np.memmap:
+    """Memory-map ``path`` as ``(rows, dim)``, growing the file when needed."""
+    row_bytes = np.dtype(dtype).itemsize * dim
+    with open(path, "ab") as f:
+        if f.tell() < rows * row_bytes:
+            f.truncate(rows * row_bytes)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=(rows, dim) if dim > 1 else (rows,))
+
+
+class _RowFile:
+    """Float32 rows read and written with pread/pwrite instead of mmap.
+
+    Re-ranking reads a few random rows per query; through mmap the kernel
+    would also map neighbouring cached rows into the process (fault-around),
+    so the full-precision file would end up counted as resident memory.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.row_bytes = 4 * dim
+        self.dim = dim
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def rows(self) -> int:
+        return os.fstat(self._fd).st_size // self.row_bytes
+
+    def write(self, slots: np.ndarray, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        for slot, vector in zip(slots, vectors):
+            os.pwrite(self._fd, vector.tobytes(), int(slot) * self.row_bytes)
+
+    def read(self, slots: np.ndarray) -> np.ndarray:
+        out = np.zeros((len(slots), self.dim), dtype=np.float32)
+        for i, slot in enumerate(slots):
+            os.preadv(self._fd, [out[i]], int(slot) * self.row_bytes)
+        return out
+
+    def read_range(self, start: int, end: int) -> np.ndarray:
+        data = os.pread(self._fd, (end - start) * self.row_bytes, start * self.row_bytes)
+        out = np.zeros((end - start, self.dim), dtype=np.float32)
+        out.reshape(-1)[:len(data) // 4] = np.frombuffer(data, dtype=np.float32)
+        return out
+
+    def flush(self):
+        os.fsync(self._fd)
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _top(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the ``n`` highest scores, best first."""
+    if n < len(scores):
+        idx = np.argpartition(-scores, n - 1)[:n]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class ExactIndex:
+    """No index: candidates come from a scan over the compact vectors."""
+
+    def search(self, query: np.ndarray, n: int) -> Optional[np.ndarray]:
+        """Up to ``n`` candidate slots, or ``None`` to fall back to the scan."""
+        return None
+
+    def add(self, slots: np.ndarray, vectors: np.ndarray):
+        pass
+
+    def remove(self, slots: Iterable[int]):
+        pass
+
+    def save(self):
+        pass
+
+
+class HnswIndex:
+    """hnswlib graph over vectors projected to ``ann_dim`` dimensions.
+
+    Labels are store slots. Changes since the last ``save`` are replayed from
+    the store's ``ann_pending`` table when the index is loaded again.
+    """
+
+    def __init__(self, path: str, dim: int, capacity: int, ann_dim: int = VECTOR_ANN_DIM,
+                 m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_search: int = HNSW_EF_SEARCH):
+        import hnswlib
+
+        self.path = path
+        self.ef_search = ef_search
+        self.config = {"dim": dim, "ann_dim": min(ann_dim, dim) if ann_dim > 0 else dim,
+                       "m": m, "ef_construction": ef_construction, "seed": _PROJECTION_SEED}
+        self._lock = threading.Lock()
+        self._projection = None
+        if self.config["ann_dim"] < dim:
+            rng = np.random.default_rng(_PROJECTION_SEED)
+            self._projection = (rng.standard_normal((dim, self.config["ann_dim"]))
+                                / math.sqrt(self.config["ann_dim"])).astype(np.float32)
+        self._index = hnswlib.Index(space="cosine", dim=self.config["ann_dim"])
+        self.loaded = False
+        try:
+            with open(f"{path}.json", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved == self.config and os.path.exists(path):
+                self._index.load_index(path, max_elements=capacity)
+                self.loaded = True
+        except (FileNotFoundError, ValueError, RuntimeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"HNSW index {path} unusable, rebuilding: {e}")
+        if not self.loaded:
+            self._index.init_index(max_elements=capacity, M=m, ef_construction=ef_construction)
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors @ self._projection if self._projection is not None else vectors
+
+    def resize(self, capacity: int):
+        with self._lock:
+            if capacity > self._index.get_max_elements():
+                self._index.resize_index(capacity)
+
+    def add(self, slots: np.ndarray, vectors: np.ndarray):
+        if len(slots):
+            with self._lock:
+                self._index.add_items(self._project(vectors), slots)
+
+    def remove(self, slots: Iterable[int]):
+        with self._lock:
+            for slot in slots:
+                try:
+                    self._index.mark_deleted(int(slot))
+                except RuntimeError:
+                    # Belum pernah masuk index
+                    pass
+
+    def search(self, query: np.ndarray, n: int) -> Optional[np.ndarray]:
+        with self._lock:
+            self._index.set_ef(max(self.ef_search, n))
+            try:
+                labels, _ = self._index.knn_query(self._project(query[None, :]), k=n)
+            except RuntimeError:
+                # Graph tidak bisa memberi n hasil (banyak elemen terhapus); pakai scan
+                return None
+        return labels[0].astype(np.int64)
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            self._index.save_index(tmp_path)
+            os.replace(tmp_path, self.path)
+        with open(f"{self.path}.json", "w", encoding="utf-8") as f:
+            json.dump(self.config, f)
+
+
+def _hnsw_available() -> bool:
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class QuantizedVectorStore(VectorStore):
+    """Memory-mapped vector store with scalar quantization and exact re-ranking.
+
+    Layout of ``{directory}/{collection_name}``: ``vectors.f32`` (normalized
+    float32, read only for re-ranking), ``vectors.int8`` + ``scales.f32`` or
+    ``vectors.f16`` (scanned or indexed), ``rows.sqlite`` (slot -> id, text,
+    metadata) and the ANN index files. Scores are cosine similarities.
+    Slots of deleted chunks are reused by later inserts.
+    """
+
+    def __init__(self, collection_name: str = "documents", directory: str = VECTOR_DIR,
+                 quantization: str = VECTOR_QUANTIZATION, ann: str = VECTOR_ANN,
+                 ann_dim: int = VECTOR_ANN_DIM):
+        if quantization not in ("int8", "float16"):
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        if ann == "auto":
+            ann = "hnsw" if _hnsw_available() else "exact"
+        elif ann == "hnsw" and not _hnsw_available():
+            logger.warning("VECTOR_ANN=hnsw but hnswlib is not installed; using exact scan")
+            ann = "exact"
+        if ann not in ("hnsw", "exact"):
+            raise ValueError(f"Unknown ANN index: {ann}")
+        self.path = os.path.join(directory, collection_name)
+        os.makedirs(self.path, exist_ok=True)
+        self.quantization = quantization
+        self.ann_kind = ann
+        self.ann_dim = ann_dim
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "rows.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                slot INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ann_pending (slot INTEGER PRIMARY KEY);
+            """
+        )
+        self._conn.commit()
+        self.dim = 0
+        self.capacity = 0
+        self._index = ExactIndex()
+        self._pending = 0
+        try:
+            with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        except FileNotFoundError:
+            pass
+        if self.dim:
+            self._open_files()
+
+    # -- storage ---------------------------------------------------------
+
+    def _open_files(self):
+        full_path = os.path.join(self.path, "vectors.f32")
+        used = [row[0] for row in self._conn.execute("SELECT slot FROM rows ORDER BY slot")]
+        high = used[-1] + 1 if used else 0
+        self._full = _RowFile(full_path, self.dim)
+        # File kosong tidak bisa di-mmap; kapasitas awal sparse di disk
+        self.capacity = max(high, self._full.rows(), _MIN_CAPACITY)
+        quant_path = os.path.join(self.path, "vectors.int8" if self.quantization == "int8" else "vectors.f16")
+        rebuild_quant = not os.path.exists(quant_path) and high > 0
+        self._quant = _open_matrix(quant_path, np.int8 if self.quantization == "int8" else np.float16,
+                                   self.dim, self.capacity)
+        self._scales = _open_matrix(os.path.join(self.path, "scales.f32"), np.float32, 1, self.capacity) \
+            if self.quantization == "int8" else None
+        self._valid = np.zeros(self.capacity, dtype=bool)
+        self._valid[used] = True
+        self._high = high
+        used_set = set(used)
+        self._free = [slot for slot in range(high - 1, -1, -1) if slot not in used_set]
+        if rebuild_quant:
+            logger.info(f"Quantizing {len(used)} stored vectors to {self.quantization}")
+            for start in range(0, high, _SCAN_BLOCK):
+                end = min(high, start + _SCAN_BLOCK)
+                self._write_quantized(np.arange(start, end), self._full.read_range(start, end))
+            self._quant.flush()
+        self._open_index(used)
+
+    def _open_index(self, used: list[int]):
+        if self.ann_kind != "hnsw":
+            return
+        index = HnswIndex(os.path.join(self.path, "hnsw.bin"), self.dim, self.capacity, self.ann_dim)
+        if index.loaded:
+            replay = [row[0] for row in self._conn.execute("SELECT slot FROM ann_pending")]
+        else:
+            replay = used
+            self._conn.execute("DELETE FROM ann_pending")
+            self._conn.commit()
+        replay = np.asarray(replay, dtype=np.int64)
+        live = replay[self._valid[replay]] if len(replay) else replay
+        index.remove(replay[~self._valid[replay]] if len(replay) else [])
+        for start in range(0, len(live), _SCAN_BLOCK):
+            block = live[start:start + _SCAN_BLOCK]
+            index.add(block, self._full.read(block))
+        self._index = index
+        if len(replay) and not index.loaded:
+            logger.info(f"HNSW index built for {len(live)} vectors")
+        self._pending = len(replay)
+        if self._pending:
+            self._save_index()
+
+    def _init_dim(self, dim: int):
+        self.dim = dim
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim}, f)
+        self._open_files()
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        self.capacity = max(needed, self.capacity * 2)
+        # Array lama tetap valid untuk search yang sedang jalan
+        self._quant = _open_matrix(self._quant.filename, self._quant.dtype, self.dim, self.capacity)
+        if self._scales is not None:
+            self._scales = _open_matrix(self._scales.filename, np.float32, 1, self.capacity)
+        valid = np.zeros(self.capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid
+        self._valid = valid
+        if isinstance(self._index, HnswIndex):
+            self._index.resize(self.capacity)
+
+    def _write_quantized(self, slots: np.ndarray, vectors: np.ndarray):
+        if self._scales is None:
+            self._quant[slots] = vectors.astype(np.float16)
+            return
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        self._quant[slots] = np.round(vectors / scales[:, None]).astype(np.int8)
+        self._scales[slots] = scales
+
+    def _slots_for(self, ids: Iterable[str]) -> dict[str, int]:
+        ids = list(ids)
+        found = {}
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start:start + _SQL_BATCH]
+            found.update(self._conn.execute(
+                f"SELECT id, slot FROM rows WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return found
+
+    def _mark_pending(self, slots: Iterable[int]):
+        if self.ann_kind == "hnsw":
+            slots = [(int(s),) for s in slots]
+            self._conn.executemany("INSERT OR IGNORE INTO ann_pending (slot) VALUES (?)", slots)
+            self._pending += len(slots)
+
+    def _save_index(self):
+        self._index.save()
+        with self._conn:
+            self._conn.execute("DELETE FROM ann_pending")
+        self._pending = 0
+
+    # -- VectorStore -----------------------------------------------------
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if not self.dim:
+                self._init_dim(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({self.dim})")
+            assigned = self._slots_for(ids)
+            slots = []
+            for chunk_id in ids:
+                if chunk_id not in assigned:
+                    if self._free:
+                        assigned[chunk_id] = self._free.pop()
+                    else:
+                        assigned[chunk_id] = self._high
+                        self._high += 1
+                slots.append(assigned[chunk_id])
+            slots = np.asarray(slots, dtype=np.int64)
+            self._ensure_capacity(self._high)
+            self._full.write(slots, vectors)
+            self._write_quantized(slots, vectors)
+            with self._conn:
+                self._conn.executemany(
+                    """INSERT INTO rows (slot, id, document, metadata) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (id) DO UPDATE SET document = excluded.document, metadata = excluded.metadata""",
+                    [(int(slot), chunk_id, text, json.dumps(meta or {}))
+                     for slot, chunk_id, text, meta in zip(slots, ids, documents, metadatas)],
+                )
+                self._mark_pending(slots)
+            self._valid[slots] = True
+            self._index.add(slots, vectors)
+            if self._pending >= VECTOR_ANN_SAVE_EVERY:
+                self._save_index()
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE rows SET metadata = ? WHERE id = ?",
+                [(json.dumps(meta or {}), chunk_id) for chunk_id, meta in zip(ids, metadatas)],
+            )
+
+    def delete(self, ids):
+        with self._lock:
+            slots = list(self._slots_for(ids).values())
+            if not slots:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM rows WHERE slot = ?", [(s,) for s in slots])
+                self._mark_pending(slots)
+            self._valid[slots] = False
+            self._free.extend(slots)
+            self._index.remove(slots)
+
+    def get(self, limit, offset=0, include_embeddings=False):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT slot, id, document, metadata FROM rows ORDER BY slot LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        page = {
+            "ids": [row[1] for row in rows],
+            "documents": [row[2] for row in rows],
+            "metadatas": [json.loads(row[3]) for row in rows],
+        }
+        if include_embeddings:
+            page["embeddings"] = self._full.read([row[0] for row in rows]).tolist() if rows else []
+        return page
+
+    def get_by_ids(self, ids):
+        page = {"ids": [], "documents": [], "metadatas": []}
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT id, document, metadata FROM rows WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for chunk_id, text, meta in rows:
+                    page["ids"].append(chunk_id)
+                    page["documents"].append(text)
+                    page["metadatas"].append(json.loads(meta))
+        return page
+
+    def ids(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM rows")}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _scan(self, query: np.ndarray, n: int, slots: Optional[np.ndarray] = None) -> np.ndarray:
+        """Top ``n`` slots by compact-vector score, in blocks of ``_SCAN_BLOCK``."""
+        with self._lock:
+            quant, scales, valid, high = self._quant, self._scales, self._valid, self._high
+        best_slots, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, high if slots is None else len(slots), _SCAN_BLOCK):
+            if slots is None:
+                # Slice berurutan: dibaca langsung dari memmap tanpa fancy-index copy
+                end = min(high, start + _SCAN_BLOCK)
+                block = np.arange(start, end)[valid[start:end]]
+                scores = (quant[start:end].astype(np.float32) @ query)[valid[start:end]]
+            else:
+                block = slots[start:start + _SCAN_BLOCK]
+                scores = quant[block].astype(np.float32) @ query
+            if scales is not None:
+                scores *= scales[block]
+            best_slots = np.concatenate([best_slots, block])
+            best_scores = np.concatenate([best_scores, scores])
+            keep = _top(best_scores, n)
+            best_slots, best_scores = best_slots[keep], best_scores[keep]
+        return best_slots
+
+    def search(self, vector, k=5, chunk_ids=None):
+        if not self.dim or k <= 0:
+            return []
+        query = _normalize(np.asarray([vector], dtype=np.float32))[0]
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Query dimension {query.shape[0]} does not match the store ({self.dim})")
+        n = max(k * VECTOR_RERANK_FACTOR, VECTOR_RERANK_MIN)
+        if chunk_ids is not None:
+            with self._lock:
+                slots = np.asarray(sorted(self._slots_for(chunk_ids).values()), dtype=np.int64)
+            candidates = slots if len(slots) <= n else self._scan(query, n, slots)
+        else:
+            with self._lock:
+                n = min(n, int(np.count_nonzero(self._valid)))
+            if not n:
+                return []
+            candidates = self._index.search(query, n)
+            if candidates is None:
+                candidates = self._scan(query, n)
+        with self._lock:
+            valid = self._valid
+        candidates = candidates[(candidates >= 0) & (candidates < len(valid))]
+        candidates = np.unique(candidates[valid[candidates]])
+        if not len(candidates):
+            return []
+        # Rerank dengan vektor float32 penuh; hanya baris kandidat yang dibaca dari disk
+        scores = self._full.read(candidates) @ query
+        order = _top(scores, k)
+        ranked = [(int(candidates[i]), float(scores[i])) for i in order]
+        with self._lock:
+            rows = {
+                slot: (chunk_id, text, meta)
+                for slot, chunk_id, text, meta in self._conn.execute(
+                    f"SELECT slot, id, document, metadata FROM rows WHERE slot IN ({','.join('?' * len(ranked))})",
+                    [slot for slot, _ in ranked],
+                )
+            }
+        return [
+            (Document(page_content=rows[slot][1], metadata=json.loads(rows[slot][2]), id=rows[slot][0]), score)
+            for slot, score in ranked if slot in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._save_index()
+            if self.dim:
+                self._full.flush()
+                self._full.close()
+                self._quant.flush()
+                if self._scales is not None:
+                    self._scales.flush()
+            self._conn.close()
+
+    def drop(self):
+        with self._lock:
+            self._pending = 0
+            self.close()
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def open_vectorstore(backend: str = VECTOR_BACKEND, collection_name: str = "documents",
+                     embedding_function=None, **options) -> VectorStore:
+    """Open the ``backend`` store of a collection (see ``VECTOR_BACKENDS``)."""
+    if backend == "chroma":
+        return ChromaVectorStore(collection_name, embedding_function, **options)
+    if backend == "quantized":
+        return QuantizedVectorStore(collection_name, **options)
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+def copy_vectors(source: VectorStore, target: VectorStore, batch_size: int = 500) -> int:
+    """Copy every chunk (vector, text, metadata) from ``source`` into ``target``."""
+    total = 0
+    offset = 0
+    while True:
+        page = source.get(limit=batch_size, offset=offset, include_embeddings=True)
+        if not page["ids"]:
+            break
+        target.upsert(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        total += len(page["ids"])
+        offset += batch_size
+    return total
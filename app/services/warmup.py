@@ -0,0 +1,120 @@
+"""Startup warm-up dan status readiness.
+
+Import ``app.main`` sengaja ringan (spaCy, Chroma dan library ekstraksi
+dimuat saat pertama dipakai). Saat startup, lifespan langsung siap menerima
+request lalu menjalankan ``warm_up`` di background: membuka vector store dan
+embedding cache sekali, mengisi lexical index tiap shard dengan chunk vector
+store yang belum masuk (store lama), menunggu worker ingestion selesai memuat model NER,
+dan meminta Ollama memuat model. ``/health/live`` berarti proses hidup;
+``/health/ready`` baru 200 setelah semua check wajib selesai.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+from app.services.embedding import embeddings, get_vectorstore, sync_lexical_index
+from app.services.embedding_cache import get_embedding_cache
+from app.services.llm_client import preload_models
+from app.services.shards import shards
+
+logger = logging.getLogger(__name__)
+
+# Muat model Ollama saat startup (tidak menentukan readiness)
+WARMUP_LLM = os.getenv("WARMUP_LLM", "1") != "0"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))
+
+
+class Readiness:
+    """Status of the startup checks; ready once every required check is ok."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks: dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def begin(self, checks: dict[str, bool]):
+        """Start a warm-up with ``{check name: required}``."""
+        with self._lock:
+            self.started_at = time.time()
+            self.finished_at = None
+            self.checks = {name: {"status": "pending", "required": required} for name, required in checks.items()}
+
+    def record(self, name: str, status: str, seconds: float, error: Optional[str] = None):
+        with self._lock:
+            self.checks[name].update(status=status, seconds=round(seconds, 3))
+            if error:
+                self.checks[name]["error"] = error
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+
+    def ready(self) -> bool:
+        with self._lock:
+            return self.started_at is not None and all(
+                check["status"] == "ok" for check in self.checks.values() if check["required"]
+            )
+
+    def snapshot(self) -> dict:
+        ready = self.ready()
+        with self._lock:
+            warmup = None
+            if self.started_at is not None:
+                warmup = round((self.finished_at or time.time()) - self.started_at, 3)
+            return {
+                "status": "ready" if ready else ("starting" if self.finished_at is None else "failed"),
+                "warmup_seconds": warmup,
+                "checks": {name: dict(check) for name, check in self.checks.items()},
+            }
+
+
+readiness = Readiness()
+
+
+async def _check(name: str, awaitable):
+    start = time.perf_counter()
+    try:
+        result = await awaitable
+    except Exception as e:
+        logger.error(f"Warm-up check {name} failed: {e}")
+        readiness.record(name, "error", time.perf_counter() - start, error=str(e))
+        return None
+    readiness.record(name, "ok", time.perf_counter() - start)
+    return result
+
+
+def _sync_lexical_indexes() -> dict[str, int]:
+    """Backfill the lexical index of every shard, one shard at a time."""
+    return {tenant: sync_lexical_index(shards.get(tenant)) for tenant in shards.tenants()}
+
+
+def _wait_for_workers(ingestion_queue):
+    workers = ingestion_queue.wait_until_warm(timeout=WARMUP_TIMEOUT)
+    cold = [w["pid"] for w in workers if not w["nlp_loaded"]]
+    if cold:
+        raise RuntimeError(f"NER model not loaded in workers {cold}")
+    return workers
+
+
+async def warm_up(ingestion_queue, model: str = "llama3"):
+    """Run the startup checks concurrently; see ``readiness``."""
+    checks = {"vectorstore": True, "lexical_index": True, "embedding_cache": True, "ingest_workers": True}
+    if WARMUP_LLM:
+        checks["llm"] = False
+    readiness.begin(checks)
+    tasks = [
+        _check("vectorstore", asyncio.to_thread(get_vectorstore)),
+        _check("lexical_index", asyncio.to_thread(_sync_lexical_indexes)),
+        _check("embedding_cache", asyncio.to_thread(get_embedding_cache)),
+        _check("ingest_workers", asyncio.to_thread(_wait_for_workers, ingestion_queue)),
+    ]
+    if WARMUP_LLM:
+        tasks.append(_check("llm", asyncio.wait_for(preload_models(model, embeddings.model), timeout=WARMUP_TIMEOUT)))
+    await asyncio.gather(*tasks)
+    readiness.finish()
+    snapshot = readiness.snapshot()
+    logger.info(f"Warm-up finished in {snapshot['warmup_seconds']}s: {snapshot['status']}")
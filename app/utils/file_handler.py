@@ -1,14 +1,135 @@
 import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import TYPE_CHECKING, BinaryIO
 
-from fastapi import UploadFile
+if TYPE_CHECKING:
+    # FastAPI tidak perlu diimpor di worker process ingestion
+    from fastapi import UploadFile
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "upload")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Blob disimpan content-addressed di sini; file di UPLOAD_DIR hanya hardlink
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, ".objects")
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))
+MAX_FILENAME_LENGTH = 200
 
+_UNSAFE_CHARS = re.compile(r"[^\w.\- ()]+")
 
-def save_upload_file(file: UploadFile) -> str:
-    """Simpan file UploadFile ke disk, kembalikan path."""
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
-    return file_path
+
+def sanitize_filename(filename: str) -> str:
+    """Safe file name for UPLOAD_DIR: no directories, no hidden or odd characters."""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    name = _UNSAFE_CHARS.sub("_", name).strip(" .")
+    root, ext = os.path.splitext(name)
+    name = root[:MAX_FILENAME_LENGTH - len(ext)] + ext.lower()
+    return name if root else f"file{ext.lower()}"
+
+
+def object_path(content_hash: str, ext: str) -> str:
+    return os.path.join(OBJECTS_DIR, content_hash[:2], f"{content_hash}{ext}")
+
+
+def _link_or_copy(src: str, dst: str):
+    """Point ``dst`` at ``src`` (hardlink when possible), replacing ``dst`` atomically."""
+    # rename() antar hardlink ke inode yang sama tidak melakukan apa-apa
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _store_object(tmp_path: str, content_hash: str, ext: str) -> tuple[str, bool]:
+    """Move a finished temp file into the object store; returns ``(path, existed)``."""
+    path = object_path(content_hash, ext)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return path, True
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return path, False
+
+
+def store_stream(stream: BinaryIO, filename: str, block_size: int = UPLOAD_BLOCK_SIZE,
+                 upload_dir: str = UPLOAD_DIR) -> dict:
+    """Write a binary stream to the content-addressed store.
+
+    The data is copied in ``block_size`` blocks and hashed (SHA-256) on the
+    fly, so the file is never held in memory. The blob goes to
+    ``OBJECTS_DIR``; ``path`` is ``<upload_dir>/<sanitized name>``
+    (``upload_dir`` is a tenant's upload directory), which ``link_upload``
+    creates once the upload is accepted, not a duplicate. Returns
+    ``{"path", "blob", "filename", "content_hash", "size", "existed"}``;
+    ``existed`` is True when identical content was stored before.
+    """
+    name = sanitize_filename(filename)
+    ext = os.path.splitext(name)[1]
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=OBJECTS_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: stream.read(block_size), b""):
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    content_hash = digest.hexdigest()
+    blob, existed = _store_object(tmp_path, content_hash, ext)
+    return {
+        "path": os.path.join(upload_dir, name), "blob": blob, "filename": name,
+        "content_hash": content_hash, "size": size, "existed": existed,
+    }
+
+
+def store_file(src_path: str, filename: str, upload_dir: str = UPLOAD_DIR) -> dict:
+    """Add an existing file to the content-addressed store (see ``store_stream``).
+
+    The file is hashed in blocks and then hardlinked into the store when it
+    is on the same filesystem, so bulk imports do not copy the data.
+    """
+    content_hash = file_sha256(src_path)
+    name = sanitize_filename(filename)
+    ext = os.path.splitext(name)[1]
+    blob = object_path(content_hash, ext)
+    existed = os.path.exists(blob)
+    if not existed:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        _link_or_copy(src_path, blob)
+    return {
+        "path": os.path.join(upload_dir, name), "blob": blob, "filename": name,
+        "content_hash": content_hash, "size": os.path.getsize(blob), "existed": existed,
+    }
+
+
+def link_upload(stored: dict):
+    """Make ``stored["path"]`` (the name in the upload directory) a hardlink to the blob."""
+    os.makedirs(os.path.dirname(stored["path"]) or ".", exist_ok=True)
+    _link_or_copy(stored["blob"], stored["path"])
+
+
+def save_upload_file(file: "UploadFile", upload_dir: str = UPLOAD_DIR) -> dict:
+    """Simpan UploadFile ke store content-addressed secara streaming (lihat ``store_stream``).
+
+    Blocking; panggil lewat ``run_in_threadpool`` dari endpoint async.
+    """
+    return store_stream(file.file, file.filename, upload_dir=upload_dir)
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash SHA-256 isi file, dibaca per blok."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
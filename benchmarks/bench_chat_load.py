@@ -0,0 +1,123 @@
+"""Load benchmark /chat/stream: p50/p99 time-to-first-token.
+
+Menjalankan app (uvicorn, in-process) dengan vector store sementara dan
+stub Ollama, lalu membuka N streaming chat sekaligus.
+
+    python -m benchmarks.bench_chat_load --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def one_chat(session, url: str, query: str) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    async with session.post(url, json={"query": query, "context_window": 5}) as resp:
+        async for line in resp.content:
+            if ttft is None and line.startswith(b"data: ") and b'"text"' in line:
+                ttft = time.perf_counter() - start
+    return {"ttft": ttft, "total": time.perf_counter() - start}
+
+
+async def run_load(base_url: str, concurrency: int, rounds: int) -> list[dict]:
+    import aiohttp
+
+    url = f"{base_url}/chat/stream"
+    results = []
+    async with aiohttp.ClientSession() as session:
+        for r in range(rounds):
+            batch = await asyncio.gather(*(
+                one_chat(session, url, f"pertanyaan {r}-{i} tentang kebijakan cuti")
+                for i in range(concurrency)
+            ))
+            results.extend(batch)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--ttft-ms", type=float, default=100.0)
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    from benchmarks.stub_ollama import start_stub_server
+
+    stub, stub_url = start_stub_server(
+        latency_ms=args.embed_latency_ms, per_item_latency_ms=0,
+        ttft_ms=args.ttft_ms, token_latency_ms=args.token_latency_ms, tokens=args.tokens,
+    )
+    # App memakai path relatif (upload/, vectorstore/), jadi jalankan di
+    # direktori kerja sementara seperti layout deployment.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    workdir = tempfile.mkdtemp(prefix="dms-bench-")
+    os.chdir(workdir)
+    os.environ["OLLAMA_URL"] = stub_url
+    os.environ["CHROMA_DIR"] = "vectorstore"
+    os.environ["UPLOAD_DIR"] = "upload"
+    os.environ.setdefault("INGEST_WORKERS", "1")
+    os.environ["EMBED_CACHE_ENABLED"] = "0"
+
+    import uvicorn
+    from app.main import app
+    from app.services.embedding import embed_and_store
+
+    embed_and_store(
+        [f"Dokumen {i}: kebijakan cuti karyawan nomor {i} berlaku sejak 2020." for i in range(args.chunks)],
+        {"filename": "bench.pdf", "file_type": "pdf", "entities": []},
+    )
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        results = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.concurrency, args.rounds))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        stub.shutdown()
+
+    ttfts = [r["ttft"] for r in results if r["ttft"] is not None]
+    totals = [r["total"] for r in results]
+    report = {
+        "concurrency": args.concurrency,
+        "requests": len(results),
+        "failed": len(results) - len(ttfts),
+        "ttft_p50_ms": round(statistics.median(ttfts) * 1000, 1) if ttfts else None,
+        "ttft_p99_ms": round(percentile(ttfts, 99) * 1000, 1) if ttfts else None,
+        "total_p50_ms": round(statistics.median(totals) * 1000, 1),
+        "total_p99_ms": round(percentile(totals, 99) * 1000, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
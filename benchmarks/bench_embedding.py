@@ -0,0 +1,70 @@
+"""Throughput benchmark untuk EmbeddingClient terhadap stub Ollama.
+
+    python -m benchmarks.bench_embedding --chunks 300
+"""
+import argparse
+import json
+import time
+
+from benchmarks.stub_ollama import start_stub_server
+from app.services.llm_client import EmbeddingClient
+
+
+def run(chunks: int, batch_sizes: list[int], concurrencies: list[int], endpoint: str,
+        latency_ms: float, per_item_latency_ms: float) -> list[dict]:
+    server, url = start_stub_server(latency_ms=latency_ms, per_item_latency_ms=per_item_latency_ms)
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 40 for i in range(chunks)]
+    results = []
+    try:
+        for batch_size in batch_sizes:
+            for concurrency in concurrencies:
+                client = EmbeddingClient(
+                    base_url=url, endpoint=endpoint,
+                    batch_size=batch_size, concurrency=concurrency,
+                )
+                start = time.perf_counter()
+                embeddings = client.embed(texts)
+                elapsed = time.perf_counter() - start
+                client.close()
+                assert len(embeddings) == len(texts)
+                results.append({
+                    "endpoint": endpoint,
+                    "batch_size": batch_size,
+                    "concurrency": concurrency,
+                    "seconds": round(elapsed, 3),
+                    "chunks_per_sec": round(len(texts) / elapsed, 1),
+                })
+    finally:
+        server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--endpoint", default="/api/embeddings", choices=["/api/embeddings", "/api/embed"])
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--per-item-latency-ms", type=float, default=2.0)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    results = run(
+        args.chunks,
+        [int(v) for v in args.batch_sizes.split(",")],
+        [int(v) for v in args.concurrency.split(",")],
+        args.endpoint,
+        args.latency_ms,
+        args.per_item_latency_ms,
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'batch':>6} {'conc':>5} {'seconds':>8} {'chunks/s':>9}")
+    for r in results:
+        print(f"{r['batch_size']:>6} {r['concurrency']:>5} {r['seconds']:>8} {r['chunks_per_sec']:>9}")
+
+
+if __name__ == "__main__":
+    main()
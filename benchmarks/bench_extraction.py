@@ -0,0 +1,199 @@
+"""Throughput ekstraksi TIFF multi-halaman dan DOCX dengan tabel.
+
+Membuat fixture sintetis lalu membandingkan cara lama dengan
+``extractor.iter_segments``:
+
+- ``tiff``: fax multi-halaman (204x98 dpi, 1-bit) dan scan 600 dpi. Cara
+  lama hanya meng-OCR frame pertama pada resolusi asli; yang baru meng-OCR
+  semua frame, dinormalisasi ke ``OCR_DPI``, paralel di ``OCR_WORKERS``
+  thread. Tanpa tesseract hanya decode + normalisasi yang diukur.
+- ``docx``: paragraf diselingi tabel. Cara lama hanya ``doc.paragraphs``;
+  yang baru menelusuri body berurutan termasuk baris tabel.
+
+    python -m benchmarks.bench_extraction --pages 20 --paragraphs 2000 --tables 50
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+_WORDS = ["invoice", "payment", "vendor", "contract", "delivery", "amount", "tax", "period", "account", "approval"]
+
+
+def _font(size: int):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1: font bitmap kecil tanpa ukuran
+        return ImageFont.load_default()
+
+
+def make_tiff(path: str, pages: int, dpi: tuple, size: tuple, mode: str = "1"):
+    from PIL import Image, ImageDraw
+
+    # Ukuran huruf ~10pt pada resolusi vertikal file
+    font = _font(max(10, round(dpi[1] * 10 / 72)))
+    frames = []
+    for n in range(pages):
+        image = Image.new(mode, size, 255 if mode == "L" else 1)
+        draw = ImageDraw.Draw(image)
+        line_height = round(dpi[1] * 14 / 72)
+        for i, y in enumerate(range(line_height * 2, size[1] - line_height * 2, line_height)):
+            words = " ".join(_WORDS[(n + i + j) % len(_WORDS)] for j in range(8))
+            draw.text((round(dpi[0] * 0.75), y), f"Page {n + 1} line {i + 1}: {words}", fill=0, font=font)
+        frames.append(image)
+    compression = "group4" if mode == "1" else "tiff_lzw"
+    frames[0].save(path, save_all=True, append_images=frames[1:], dpi=dpi, compression=compression)
+
+
+def make_docx(path: str, paragraphs: int, tables: int, rows: int = 20, cols: int = 5):
+    from docx import Document
+
+    doc = Document()
+    every = max(1, paragraphs // max(1, tables))
+    table_count = 0
+    for n in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {n}: " + " ".join(_WORDS[(n + j) % len(_WORDS)] for j in range(20)))
+        if (n + 1) % every == 0 and table_count < tables:
+            table = doc.add_table(rows=rows, cols=cols)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"INV-{table_count:03d}-{r:03d}" if c == 0 else f"{_WORDS[(r + c) % len(_WORDS)]} {r * c}"
+            table_count += 1
+    doc.save(path)
+
+
+def tesseract_available() -> bool:
+    return shutil.which("tesseract") is not None
+
+
+def run_tiff_legacy(path: str, ocr: bool) -> dict:
+    from PIL import Image
+
+    from app.services.extractor import extract_text_from_image
+
+    start = time.perf_counter()
+    image = Image.open(path)
+    if ocr:
+        text = extract_text_from_image(image) or ""
+    else:
+        image.convert("L").load()
+        text = ""
+    return {"pages": 1, "chars": len(text), "seconds": time.perf_counter() - start}
+
+
+def run_tiff_frames(path: str, ocr: bool) -> dict:
+    from app.services import extractor
+
+    start = time.perf_counter()
+    if ocr:
+        segments = list(extractor.iter_segments(path))
+        return {"pages": len(segments), "chars": sum(len(s["text"]) for s in segments),
+                "seconds": time.perf_counter() - start}
+    from PIL import Image
+
+    pages = 0
+    with Image.open(path) as image:
+        for n in range(getattr(image, "n_frames", 1)):
+            image.seek(n)
+            normalized, _ = extractor.normalize_image(image.copy())
+            normalized.close()
+            pages += 1
+    return {"pages": pages, "chars": 0, "seconds": time.perf_counter() - start}
+
+
+def run_docx_legacy(path: str) -> dict:
+    from docx import Document
+
+    start = time.perf_counter()
+    texts = [p.text for p in Document(path).paragraphs]
+    return {"segments": len(texts), "table_rows": 0, "chars": sum(map(len, texts)),
+            "seconds": time.perf_counter() - start}
+
+
+def run_docx_blocks(path: str) -> dict:
+    from app.services.extractor import iter_segments
+
+    start = time.perf_counter()
+    segments = list(iter_segments(path))
+    return {"segments": len(segments), "table_rows": sum(1 for s in segments if "row" in s),
+            "chars": sum(len(s["text"]) for s in segments), "seconds": time.perf_counter() - start}
+
+
+def bench_tiff(workdir: str, pages: int, ocr: bool) -> list[dict]:
+    fixtures = {
+        "fax 204x98": (pages, (204, 98), (1728, 1100), "1"),
+        "scan 600dpi": (max(1, pages // 4), (600, 600), (5100, 6600), "L"),
+    }
+    results = []
+    for name, (count, dpi, size, mode) in fixtures.items():
+        path = os.path.join(workdir, name.replace(" ", "_") + ".tiff")
+        make_tiff(path, count, dpi, size, mode)
+        for label, run in (("legacy", run_tiff_legacy), ("frames", run_tiff_frames)):
+            result = run(path, ocr)
+            result.update(case="tiff", fixture=name, mode=label, seconds=round(result["seconds"], 3),
+                          pages_per_second=round(result["pages"] / result["seconds"], 2) if result["seconds"] else None)
+            results.append(result)
+        os.remove(path)
+    return results
+
+
+def bench_docx(workdir: str, paragraphs: int, tables: int) -> list[dict]:
+    path = os.path.join(workdir, "report.docx")
+    make_docx(path, paragraphs, tables)
+    results = []
+    for label, run in (("legacy", run_docx_legacy), ("blocks", run_docx_blocks)):
+        result = run(path)
+        result.update(case="docx", mode=label, seconds=round(result["seconds"], 3),
+                      segments_per_second=round(result["segments"] / result["seconds"]) if result["seconds"] else None)
+        results.append(result)
+    os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--case", choices=["tiff", "docx", "all"], default="all")
+    parser.add_argument("--pages", type=int, default=20, help="frames in the fax TIFF (scan: a quarter)")
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--no-ocr", action="store_true", help="decode and normalize frames only")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    ocr = not args.no_ocr and tesseract_available()
+    workdir = tempfile.mkdtemp(prefix="dms-extract-")
+    results = []
+    try:
+        if args.case in ("tiff", "all"):
+            results += bench_tiff(workdir, args.pages, ocr)
+        if args.case in ("docx", "all"):
+            results += bench_docx(workdir, args.paragraphs, args.tables)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"ocr": ocr, "results": results}, indent=2))
+        return
+    tiff = [r for r in results if r["case"] == "tiff"]
+    if tiff:
+        print(f"tiff ({'OCR' if ocr else 'decode + normalize only, tesseract not used'})")
+        print(f"{'fixture':<12} {'mode':<7} {'pages':>6} {'chars':>8} {'seconds':>8} {'pages/s':>8}")
+        for r in tiff:
+            print(f"{r['fixture']:<12} {r['mode']:<7} {r['pages']:>6} {r['chars']:>8} {r['seconds']:>8} "
+                  f"{r['pages_per_second']:>8}")
+    docx = [r for r in results if r["case"] == "docx"]
+    if docx:
+        print(f"docx: {args.paragraphs} paragraphs, {args.tables} tables")
+        print(f"{'mode':<7} {'segments':>9} {'table rows':>11} {'chars':>9} {'seconds':>8} {'segments/s':>11}")
+        for r in docx:
+            print(f"{r['mode']:<7} {r['segments']:>9} {r['table_rows']:>11} {r['chars']:>9} {r['seconds']:>8} "
+                  f"{r['segments_per_second']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Entities/sec benchmark untuk tahap NER pada korpus sintetis.
+
+Membandingkan cara lama (``nlp(text)`` satu dokumen utuh dengan pipeline
+lengkap) dengan ``ner.annotate_segments`` (nlp.pipe, hanya NER, n_process).
+
+    python -m benchmarks.bench_ner --pages 1000 --processes 1,2,4
+"""
+import argparse
+import json
+import random
+import time
+
+import spacy
+
+from app.services import ner
+
+_NAMES = ["Budi Santoso", "Siti Rahma", "Andi Wijaya", "John Smith", "Maria Garcia"]
+_ORGS = ["PT EDM", "Bank Mandiri", "Google", "Pertamina", "Microsoft"]
+_PLACES = ["Jakarta", "Surabaya", "Bandung", "London", "Singapore"]
+_FILLER = "The agreement covers maintenance, reporting and document handling for all units."
+
+
+def make_pages(pages: int, sentences_per_page: int = 30, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(sentences_per_page):
+            if rng.random() < 0.5:
+                lines.append(
+                    f"{rng.choice(_NAMES)} from {rng.choice(_ORGS)} visited "
+                    f"{rng.choice(_PLACES)} in {rng.randint(1990, 2025)}."
+                )
+            else:
+                lines.append(_FILLER)
+        result.append(" ".join(lines))
+    return result
+
+
+def bench_full_pipeline(pages: list[str]) -> dict:
+    """Baseline: satu ``nlp(text)`` untuk seluruh dokumen, semua pipe aktif."""
+    nlp = spacy.load(ner.SPACY_MODEL)
+    text = "\n".join(pages)
+    nlp.max_length = max(nlp.max_length, len(text) + 1)
+    start = time.perf_counter()
+    count = len(nlp(text).ents)
+    elapsed = time.perf_counter() - start
+    return {"mode": "nlp(text) full pipeline", "processes": 1, "entities": count,
+            "seconds": round(elapsed, 3), "entities_per_sec": round(count / elapsed, 1)}
+
+
+def bench_pipe(pages: list[str], n_process: int, batch_size: int) -> dict:
+    ner.get_nlp()  # load model di luar pengukuran
+    start = time.perf_counter()
+    count = 0
+    for _, found in ner.annotate_segments(
+        ({"text": p} for p in pages), batch_size=batch_size, n_process=n_process
+    ):
+        count += len(found)
+    elapsed = time.perf_counter() - start
+    return {"mode": "nlp.pipe ner only", "processes": n_process, "entities": count,
+            "seconds": round(elapsed, 3), "entities_per_sec": round(count / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--batch-size", type=int, default=ner.NER_BATCH_SIZE)
+    parser.add_argument("--skip-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages)
+    results = [] if args.skip_baseline else [bench_full_pipeline(pages)]
+    for n_process in [int(v) for v in args.processes.split(",")]:
+        results.append(bench_pipe(pages, n_process, args.batch_size))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<26} {'proc':>4} {'entities':>9} {'seconds':>8} {'ents/s':>10}")
+    for r in results:
+        print(f"{r['mode']:<26} {r['processes']:>4} {r['entities']:>9} {r['seconds']:>8} {r['entities_per_sec']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Waktu dan peak memory ekstraksi spreadsheet besar.
+
+Membuat workbook sintetis (beberapa sheet, baris transaksi dengan sel
+kosong), lalu membandingkan cara lama (``pd.read_excel`` sheet pertama +
+``astype(str)`` per baris, kalau pandas terpasang) dengan
+``extractor.iter_segments`` + ``iter_chunks`` yang streaming. Setiap mode
+jalan di process baru supaya peak RSS-nya terpisah.
+
+    python -m benchmarks.bench_spreadsheet --rows 200000 --sheets 3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+_ACCOUNTS = ["Kas", "Bank Mandiri", "Piutang Usaha", "Persediaan", "Beban Gaji", "Pendapatan Jasa"]
+
+
+def make_workbook(path: str, rows: int, sheets: int, seed: int = 0):
+    import openpyxl
+
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    per_sheet = rows // sheets
+    for s in range(sheets):
+        sheet = workbook.create_sheet(f"Jurnal {s + 1}")
+        sheet.append(["Tanggal", "No. Bukti", "Akun", "Keterangan", "Debit", "Kredit"])
+        for n in range(per_sheet):
+            amount = round(rng.uniform(10_000, 50_000_000), 2)
+            debit = rng.random() < 0.5
+            sheet.append([
+                f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                f"JV/{s + 1}/{n:06d}",
+                rng.choice(_ACCOUNTS),
+                "Pembayaran vendor" if rng.random() < 0.3 else None,
+                amount if debit else None,
+                None if debit else amount,
+            ])
+    workbook.save(path)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss dalam KiB di Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_pandas(path: str) -> dict:
+    import pandas as pd
+
+    start = time.perf_counter()
+    df = pd.read_excel(path, header=None)
+    # map(str): sel kosong jadi "nan" seperti astype(str) di pandas < 3
+    rows = df.map(str).agg(" ".join, axis=1).tolist()
+    return {"rows": len(rows), "chunks": None, "seconds": time.perf_counter() - start}
+
+
+def run_streaming(path: str) -> dict:
+    from app.services.extractor import SegmentStats, iter_segments
+    from app.services.preprocessing import iter_chunks
+
+    def tracked():
+        for segment in iter_segments(path):
+            stats.add(segment)
+            yield segment
+
+    start = time.perf_counter()
+    stats = SegmentStats()
+    chunks = sum(1 for _ in iter_chunks(tracked()))
+    return {"rows": stats.rows, "chunks": chunks, "seconds": time.perf_counter() - start}
+
+
+def _child(mode: str, path: str) -> dict:
+    # Import dulu supaya growth hanya mengukur ekstraksinya
+    if mode == "pandas":
+        import pandas  # noqa: F401
+    else:
+        import app.services.extractor  # noqa: F401
+    baseline = _peak_rss_mb()
+    result = (run_pandas if mode == "pandas" else run_streaming)(path)
+    result.update(mode=mode, peak_rss_mb=round(_peak_rss_mb(), 1),
+                  rss_growth_mb=round(_peak_rss_mb() - baseline, 1), seconds=round(result["seconds"], 2))
+    return result
+
+
+def measure(mode: str, path: str) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_child, mode, path).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sheets", type=int, default=3)
+    parser.add_argument("--skip-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dms-xlsx-")
+    path = os.path.join(workdir, "journal.xlsx")
+    make_workbook(path, args.rows, args.sheets)
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    modes = ["streaming"]
+    if not args.skip_baseline:
+        try:
+            import pandas  # noqa: F401
+            modes.insert(0, "pandas")
+        except ImportError:
+            pass
+    results = [measure(mode, path) for mode in modes]
+    os.remove(path)
+
+    if args.json:
+        print(json.dumps({"file_mb": round(size_mb, 1), "results": results}, indent=2))
+        return
+    print(f"workbook: {args.rows} rows, {args.sheets} sheets, {size_mb:.1f} MB")
+    print(f"{'mode':<10} {'rows':>8} {'chunks':>7} {'seconds':>8} {'peak MB':>8} {'growth MB':>10}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['rows']:>8} {str(r['chunks'] or '-'):>7} {r['seconds']:>8} "
+              f"{r['peak_rss_mb']:>8} {r['rss_growth_mb']:>10}")
+
+
+if __name__ == "__main__":
+    main()
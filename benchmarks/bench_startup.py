@@ -0,0 +1,151 @@
+"""Startup time: import, liveness, readiness dan latency request pertama.
+
+Mengukur di process baru (seperti cold start container):
+
+- waktu ``import app.main`` dan ``import app.services.pipeline`` (yang
+  dibayar setiap worker ingestion), serta ``pipeline.warm_up()``;
+- server uvicorn sungguhan dengan stub Ollama: waktu sampai
+  ``/health/live`` dan ``/health/ready`` 200, lalu latency ``POST /chat/``
+  pertama dan kedua.
+
+    python -m benchmarks.bench_startup --runs 3 --workers 2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import {module}
+imported = time.perf_counter() - t
+warm = None
+if {warm_up}:
+    t = time.perf_counter()
+    {module}.warm_up()
+    warm = time.perf_counter() - t
+print(imported, warm)
+"""
+
+
+def _env(workdir: str, **extra) -> dict:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, CHROMA_DIR=os.path.join(workdir, "vectorstore"),
+               UPLOAD_DIR=os.path.join(workdir, "upload"))
+    env.update(extra)
+    return env
+
+
+def measure_import(module: str, workdir: str, warm_up: bool = False) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SNIPPET.format(module=module, warm_up=warm_up)],
+        env=_env(workdir), cwd=workdir, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    result = {"import_s": float(out[-2])}
+    if warm_up:
+        result["warm_up_s"] = float(out[-1])
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, started: float, timeout: float) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def measure_server(workdir: str, ollama_url: str, workers: int, timeout: float) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = _env(workdir, OLLAMA_URL=ollama_url, INGEST_WORKERS=str(workers))
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        result = {
+            "live_s": _wait_for(f"{base}/health/live", started, timeout),
+            "ready_s": _wait_for(f"{base}/health/ready", started, timeout),
+        }
+        for name in ("first_chat_ms", "second_chat_ms"):
+            t = time.perf_counter()
+            requests.post(f"{base}/chat/", json={"query": "status invoice INV-2024-0001"}, timeout=60).raise_for_status()
+            result[name] = (time.perf_counter() - t) * 1000
+        result["checks"] = requests.get(f"{base}/health/ready", timeout=5).json()["checks"]
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _summary(values: list[float]) -> dict:
+    return {"median": round(statistics.median(values), 3), "min": round(min(values), 3), "max": round(max(values), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    from benchmarks.stub_ollama import start_stub_server
+
+    stub, ollama_url = start_stub_server(latency_ms=5)
+    runs = []
+    try:
+        for _ in range(args.runs):
+            workdir = tempfile.mkdtemp(prefix="dms-startup-")
+            runs.append({
+                "app_main": measure_import("app.main", workdir),
+                "worker": measure_import("app.services.pipeline", workdir, warm_up=True),
+                "server": measure_server(workdir, ollama_url, args.workers, args.timeout),
+            })
+    finally:
+        stub.shutdown()
+
+    report = {
+        "import_app_main_s": _summary([r["app_main"]["import_s"] for r in runs]),
+        "import_worker_s": _summary([r["worker"]["import_s"] for r in runs]),
+        "worker_warm_up_s": _summary([r["worker"]["warm_up_s"] for r in runs]),
+        "live_s": _summary([r["server"]["live_s"] for r in runs]),
+        "ready_s": _summary([r["server"]["ready_s"] for r in runs]),
+        "first_chat_ms": _summary([r["server"]["first_chat_ms"] for r in runs]),
+        "second_chat_ms": _summary([r["server"]["second_chat_ms"] for r in runs]),
+        "warm_up_checks": runs[-1]["server"]["checks"],
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'metric':<20} {'median':>9} {'min':>9} {'max':>9}")
+    for name, values in report.items():
+        if name != "warm_up_checks":
+            print(f"{name:<20} {values['median']:>9} {values['min']:>9} {values['max']:>9}")
+    print("warm-up checks: " + ", ".join(
+        f"{name}={check['status']} ({check.get('seconds')}s)" for name, check in report["warm_up_checks"].items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Benchmark end-to-end: upload dan chat lewat app FastAPI, dengan stub Ollama.
+
+Membuat korpus sintetis (``benchmarks.corpus``), menjalankan app in-process
+(uvicorn di thread, seperti ``bench_chat_load``) dengan vector store
+sementara dan ``benchmarks.stub_ollama``, lalu menjalankan skenario lewat
+HTTP:
+
+- ``upload``: file satu per satu lewat ``/upload/``, tunggu job selesai;
+- ``upload_batch``: semua file sekaligus lewat ``/upload/batch`` (tenant lain);
+- ``chat``: query berurutan lewat ``/chat/``;
+- ``chat_stream``: query paralel lewat ``/chat/stream`` (TTFT dan total).
+
+Laporan JSON berisi throughput, p50/p99 latency, durasi per tahap (selisih
+histogram ``dms_stage_duration_seconds`` di ``/metrics``) dan peak RSS
+proses API serta worker ingestion. Dengan ``--baseline`` laporan dibandingkan
+dengan laporan tersimpan; exit code 1 kalau ada yang lebih lambat dari
+``--tolerance``. PDF scan dan TIFF hanya ikut kalau tesseract terpasang.
+Answer cache, embedding cache dan artifact ekstraksi dimatikan supaya
+setiap request diukur penuh.
+
+    python -m benchmarks.bench_suite --per-kind 3 --save-baseline baseline.json
+    python -m benchmarks.bench_suite --per-kind 3 --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_STAGE_LINE = re.compile(r'^dms_stage_duration_seconds_(sum|count)\{pipeline="([^"]*)",stage="([^"]*)"\} (\S+)$')
+# Selisih di bawah ini dianggap noise saat dibandingkan dengan baseline
+_NOISE_FLOOR = {"_ms": 2.0, "_seconds": 0.005, "_mb": 10.0}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    if not seconds:
+        return {"p50_ms": None, "p99_ms": None, "mean_ms": None}
+    return {
+        "p50_ms": round(statistics.median(seconds) * 1000, 1),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 1),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss dalam KiB di Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def workers_peak_rss_mb() -> float:
+    """Largest VmHWM of the live child processes (ingestion workers).
+
+    RUSAGE_CHILDREN is no use here: it carries the parent's RSS from
+    before the spawned worker exec'd.
+    """
+    peak = 0
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii", errors="replace") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        if int(status.get("PPid", "0").strip()) == os.getpid() and "VmHWM" in status:
+            peak = max(peak, int(status["VmHWM"].split()[0]))
+    return round(peak / 1024, 1)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def stage_totals(client) -> dict:
+    """``{"pipeline.stage": [count, seconds]}`` read from ``/metrics``."""
+    totals = {}
+    for line in client.get("/metrics").text.splitlines():
+        match = _STAGE_LINE.match(line)
+        if match:
+            kind, pipeline, stage, value = match.groups()
+            entry = totals.setdefault(f"{pipeline}.{stage}", [0, 0.0])
+            entry[0 if kind == "count" else 1] = float(value)
+    return totals
+
+
+def stage_delta(before: dict, after: dict) -> dict:
+    stages = {}
+    for name, (count, seconds) in sorted(after.items()):
+        count_before, seconds_before = before.get(name, (0, 0.0))
+        count, seconds = count - count_before, seconds - seconds_before
+        if count > 0:
+            stages[name] = {
+                "count": int(count),
+                "total_seconds": round(seconds, 3),
+                "mean_ms": round(seconds / count * 1000, 2),
+            }
+    return stages
+
+
+def wait_job(client, job_id: str, timeout: float = 600) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] in ("done", "error"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(f"Ingestion job {job_id} did not finish in {timeout}s")
+
+
+def scenario_upload(client, files: list[dict]) -> dict:
+    latencies, by_kind, errors = [], {}, []
+    chunks = pages = 0
+    start = time.perf_counter()
+    for f in files:
+        sent = time.perf_counter()
+        with open(f["path"], "rb") as fh:
+            response = client.post("/upload/", files={"file": (os.path.basename(f["path"]), fh)})
+        job = wait_job(client, response.json()["job_id"])
+        elapsed = time.perf_counter() - sent
+        if job["status"] != "done":
+            errors.append({"file": os.path.basename(f["path"]), "errors": job["errors"]})
+            continue
+        latencies.append(elapsed)
+        by_kind.setdefault(f["kind"], []).append(elapsed)
+        chunks += job["chunks_count"] or 0
+        pages += f["pages"]
+    seconds = time.perf_counter() - start
+    return {
+        "documents": len(latencies),
+        "failed": len(errors),
+        "errors": errors,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "documents_per_second": round(len(latencies) / seconds, 3),
+        "pages_per_second": round(pages / seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 2),
+        "latency": latency_summary(latencies),
+        "latency_by_kind": {kind: latency_summary(values) for kind, values in sorted(by_kind.items())},
+    }
+
+
+def scenario_upload_batch(client, files: list[dict], tenant: str = "bench-batch") -> dict:
+    handles = [open(f["path"], "rb") for f in files]
+    start = time.perf_counter()
+    try:
+        response = client.post(
+            "/upload/batch",
+            files=[("files", (os.path.basename(f["path"]), fh)) for f, fh in zip(files, handles)],
+            data={"tenant": tenant},
+        )
+    finally:
+        for fh in handles:
+            fh.close()
+    accepted = time.perf_counter() - start
+    jobs = [wait_job(client, r["job_id"]) for r in response.json()["results"] if r.get("job_id")]
+    seconds = time.perf_counter() - start
+    done = [job for job in jobs if job["status"] == "done"]
+    chunks = sum(job["chunks_count"] or 0 for job in done)
+    return {
+        "documents": len(done),
+        "failed": len(files) - len(done),
+        "chunks": chunks,
+        "accept_seconds": round(accepted, 3),
+        "seconds": round(seconds, 3),
+        "documents_per_second": round(len(done) / seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 2),
+    }
+
+
+def scenario_chat(client, queries: list[str]) -> dict:
+    latencies, failed = [], 0
+    start = time.perf_counter()
+    for query in queries:
+        sent = time.perf_counter()
+        response = client.post("/chat/", json={"query": query})
+        if response.status_code != 200:
+            failed += 1
+            continue
+        latencies.append(time.perf_counter() - sent)
+    seconds = time.perf_counter() - start
+    return {
+        "requests": len(queries),
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 3),
+        "latency": latency_summary(latencies),
+    }
+
+
+def scenario_chat_stream(client, queries: list[str], concurrency: int) -> dict:
+    results, lock = [], threading.Lock()
+
+    def worker(n: int, batch: list[str]):
+        # Satu client per thread, supaya antrian generasi membaginya dengan adil
+        headers = {"X-Client-ID": f"bench-{n}"}
+        for query in batch:
+            sent = time.perf_counter()
+            ttft, ok = None, False
+            with client.stream("POST", "/chat/stream", json={"query": query}, headers=headers) as response:
+                for line in response.iter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if "text" in event and ttft is None:
+                        ttft = time.perf_counter() - sent
+                    ok = ok or "sources" in event
+            with lock:
+                results.append({"ok": response.status_code == 200 and ok, "ttft": ttft,
+                                "total": time.perf_counter() - sent})
+
+    threads = [threading.Thread(target=worker, args=(i, queries[i::concurrency])) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    ok = [r for r in results if r["ok"]]
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "failed": len(results) - len(ok),
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(ok) / seconds, 3),
+        "ttft": latency_summary([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "latency": latency_summary([r["total"] for r in ok]),
+    }
+
+
+def _direction(key: str):
+    """``lower``/``higher`` is better for a flattened report key, ``None`` to skip it."""
+    if key.endswith("_per_second"):
+        return "higher"
+    if key.endswith(("_ms", "_seconds", "_mb")) or key.endswith(".seconds"):
+        return "lower"
+    return None
+
+
+def _flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Metrics of ``report`` that got worse than ``baseline`` by more than ``tolerance``."""
+    current, previous = _flatten(report["results"]), _flatten(baseline["results"])
+    regressions = []
+    for key, value in sorted(current.items()):
+        direction, base = _direction(key), previous.get(key)
+        if direction is None or not base:
+            continue
+        change = (value - base) / base
+        worse = change > tolerance if direction == "lower" else change < -tolerance
+        floor = next((v for suffix, v in _NOISE_FLOOR.items() if key.endswith(suffix)), 0.0)
+        if worse and abs(value - base) > floor:
+            regressions.append({"metric": key, "baseline": base, "current": value,
+                                "change_pct": round(change * 100, 1)})
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-kind", type=int, default=3, help="corpus files per document kind")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--kinds", default=None, help="comma-separated corpus kinds (default: all usable)")
+    parser.add_argument("--chat-requests", type=int, default=40)
+    parser.add_argument("--stream-requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--ttft-ms", type=float, default=100.0)
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--save-baseline", help="also store the report as a baseline at this path")
+    parser.add_argument("--baseline", help="compare against this stored report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs. baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from benchmarks.corpus import KINDS, OCR_KINDS, make_corpus, make_queries, tesseract_available
+    from benchmarks.stub_ollama import start_stub_server
+
+    ocr = tesseract_available()
+    if args.kinds:
+        kinds = args.kinds.split(",")
+    else:
+        kinds = [kind for kind in KINDS if ocr or kind not in OCR_KINDS]
+
+    stub, stub_url = start_stub_server(
+        latency_ms=args.embed_latency_ms, per_item_latency_ms=0,
+        ttft_ms=args.ttft_ms, token_latency_ms=args.token_latency_ms, tokens=args.tokens,
+    )
+    # App memakai path relatif (upload/, vectorstore/), jadi jalankan di
+    # direktori kerja sementara seperti layout deployment.
+    workdir = tempfile.mkdtemp(prefix="dms-suite-")
+    files = make_corpus(os.path.join(workdir, "corpus"), args.per_kind, args.pages, kinds)
+    os.chdir(workdir)
+    os.environ["OLLAMA_URL"] = stub_url
+    os.environ["CHROMA_DIR"] = "vectorstore"
+    os.environ["UPLOAD_DIR"] = "upload"
+    os.environ.setdefault("INGEST_WORKERS", "2")
+    os.environ["EMBED_CACHE_ENABLED"] = "0"
+    os.environ["ANSWER_CACHE_ENABLED"] = "0"
+    os.environ["ARTIFACTS_ENABLED"] = "0"
+
+    import httpx
+    import uvicorn
+
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    results = {}
+    try:
+        client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=600)
+        deadline = time.monotonic() + 300
+        while client.get("/health/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        scenarios = [
+            ("upload", lambda: scenario_upload(client, files)),
+            ("upload_batch", lambda: scenario_upload_batch(client, files)),
+            ("chat", lambda: scenario_chat(client, make_queries(files, args.chat_requests, seed=1))),
+            ("chat_stream", lambda: scenario_chat_stream(
+                client, make_queries(files, args.stream_requests, seed=2), args.concurrency)),
+        ]
+        for name, run in scenarios:
+            before = stage_totals(client)
+            result = run()
+            result["stages"] = stage_delta(before, stage_totals(client))
+            result["peak_rss_mb"] = peak_rss_mb()
+            result["workers_peak_rss_mb"] = workers_peak_rss_mb()
+            results[name] = result
+            print(f"{name}: {result['seconds']}s", file=sys.stderr)
+        client.close()
+    finally:
+        # Lifespan shutdown menghentikan worker ingestion
+        server.should_exit = True
+        thread.join(timeout=60)
+        stub.shutdown()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "ocr": ocr,
+            "kinds": kinds,
+            "files": len(files),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "save_baseline", "baseline")},
+        },
+        "results": results,
+        "memory": {
+            "api_peak_rss_mb": peak_rss_mb(),
+            "workers_peak_rss_mb": max((r["workers_peak_rss_mb"] for r in results.values()), default=0.0),
+        },
+    }
+    regressions = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        report["comparison"] = {
+            "baseline_commit": baseline.get("meta", {}).get("commit"),
+            "tolerance": args.tolerance,
+            "regressions": regressions,
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if regressions:
+        for r in regressions:
+            print(f"REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} ({r['change_pct']:+}%)",
+                  file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Recall@k, latency query dan memory: Chroma vs vector store quantized.
+
+Membuat vektor sintetis bertingkat (topik -> dokumen -> chunk, seperti
+embedding chunk dari dokumen yang mirip), menghitung ground truth top-k dengan cosine float32 penuh, lalu
+untuk setiap konfigurasi: build store di directory baru, kemudian di process
+baru membuka store dan menjalankan semua query. RSS diukur di process query
+itu (setelah import, sebelum store dibuka) supaya hanya memory store yang
+terhitung, dipisah antara anonymous memory (heap, index HNSW) dan halaman
+file mmap yang bisa di-evict kernel.
+
+    python -m benchmarks.bench_vector_store --n 20000 --dim 4096 --queries 200 \\
+        --configs chroma int8/exact int8/hnsw float16/hnsw
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_CONFIGS = ["chroma", "int8/exact", "int8/hnsw", "float16/hnsw"]
+
+
+def make_dataset(path: str, n: int, dim: int, queries: int, topics: int, chunks_per_doc: int, seed: int = 0):
+    """Topik -> dokumen -> chunk: chunk satu dokumen saling dekat, dokumen satu topik agak dekat."""
+    rng = np.random.default_rng(seed)
+    topic_centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    docs = max(1, n // chunks_per_doc)
+    doc_topics = rng.integers(0, topics, docs)
+    doc_centers = np.lib.format.open_memmap(os.path.join(path, "docs.npy"), mode="w+", dtype=np.float32,
+                                            shape=(docs, dim))
+    for start in range(0, docs, 5000):
+        end = min(docs, start + 5000)
+        doc_centers[start:end] = topic_centers[doc_topics[start:end]] \
+            + 0.7 * rng.standard_normal((end - start, dim)).astype(np.float32)
+    data = np.lib.format.open_memmap(os.path.join(path, "data.npy"), mode="w+", dtype=np.float32, shape=(n, dim))
+    for start in range(0, n, 5000):
+        end = min(n, start + 5000)
+        owners = np.arange(start, end) % docs
+        data[start:end] = doc_centers[owners] + 0.5 * rng.standard_normal((end - start, dim)).astype(np.float32)
+    data.flush()
+    owners = rng.integers(0, docs, queries)
+    query = doc_centers[owners] + 0.5 * rng.standard_normal((queries, dim)).astype(np.float32)
+    np.save(os.path.join(path, "queries.npy"), query)
+    return data, query
+
+
+def ground_truth(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = np.empty((len(q), len(data)), dtype=np.float32)
+    for start in range(0, len(data), 5000):
+        block = np.asarray(data[start:start + 5000])
+        scores[:, start:start + 5000] = q @ (block / np.linalg.norm(block, axis=1, keepdims=True)).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _rss_mb() -> dict:
+    """Resident memory: anonymous (heap, index) and file-backed (mmap pages, evictable)."""
+    rss = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                rss[line.split(":")[0]] = int(line.split()[1]) / 1024
+    return rss
+
+
+def _open(config: str, directory: str, ann_dim: int):
+    from app.services.vector_store import open_vectorstore
+
+    if config == "chroma":
+        return open_vectorstore("chroma", "bench", persist_directory=directory)
+    quantization, ann = config.split("/")
+    return open_vectorstore("quantized", "bench", directory=directory, quantization=quantization, ann=ann,
+                            ann_dim=ann_dim)
+
+
+def _build(config: str, workdir: str, directory: str, batch: int, ann_dim: int) -> dict:
+    data = np.load(os.path.join(workdir, "data.npy"), mmap_mode="r")
+    store = _open(config, directory, ann_dim)
+    start = time.perf_counter()
+    for i in range(0, len(data), batch):
+        block = np.asarray(data[i:i + batch])
+        # Chroma memakai jarak L2; vektor dinormalisasi supaya urutannya sama dengan cosine
+        block = block / np.linalg.norm(block, axis=1, keepdims=True)
+        ids = [str(j) for j in range(i, i + len(block))]
+        store.upsert(ids, block.tolist() if config == "chroma" else block, ["-"] * len(block),
+                     [{"chunk_id": chunk_id} for chunk_id in ids])
+    store.close()
+    return {"build_s": round(time.perf_counter() - start, 2)}
+
+
+def _query(config: str, workdir: str, directory: str, k: int, ann_dim: int) -> dict:
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    import app.services.vector_store  # noqa: F401
+    if config == "chroma":
+        import langchain_chroma  # noqa: F401
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    store = _open(config, directory, ann_dim)
+    store.search(queries[0].tolist(), k=k)
+    open_s = time.perf_counter() - start
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = store.search(q.tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([int(doc.id if doc.id is not None else doc.metadata["chunk_id"]) for doc, _ in hits])
+    latencies.sort()
+    rss = _rss_mb()
+    return {
+        "open_s": round(open_s, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "rss_anon_mb": round(rss["RssAnon"] - baseline["RssAnon"], 1),
+        "rss_file_mb": round(rss["RssFile"] - baseline["RssFile"], 1),
+        "results": results,
+    }
+
+
+def _in_child(func, *args) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(func, *args).result()
+
+
+def _disk_mb(path: str) -> float:
+    # Ukuran yang benar-benar terpakai (file memmap dialokasikan sparse)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.stat(os.path.join(dirpath, name)).st_blocks * 512
+    return round(total / 1024 / 1024, 1)
+
+
+def measure(config: str, workdir: str, truth: np.ndarray, k: int, batch: int, ann_dim: int) -> dict:
+    directory = os.path.join(workdir, config.replace("/", "-"))
+    result = {"config": config}
+    result.update(_in_child(_build, config, workdir, directory, batch, ann_dim))
+    result["disk_mb"] = _disk_mb(directory)
+    query = _in_child(_query, config, workdir, directory, k, ann_dim)
+    hits = query.pop("results")
+    result[f"recall@{k}"] = round(float(np.mean([
+        len(set(found) & set(expected.tolist())) / k for found, expected in zip(hits, truth)
+    ])), 4)
+    result.update(query)
+    shutil.rmtree(directory, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--chunks-per-doc", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--ann-dim", type=int, default=256, help="projected dimensions of the HNSW index")
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                        help="chroma and/or {int8,float16}/{exact,hnsw}")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dms-vectors-")
+    try:
+        data, queries = make_dataset(workdir, args.n, args.dim, args.queries, args.topics,
+                                     args.chunks_per_doc)
+        truth = ground_truth(data, queries, args.k)
+        del data
+        results = [measure(config, workdir, truth, args.k, args.batch, args.ann_dim) for config in args.configs]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"n": args.n, "dim": args.dim, "k": args.k, "ann_dim": args.ann_dim, "results": results},
+                         indent=2))
+        return
+    recall = f"recall@{args.k}"
+    print(f"{args.n} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'config':<14} {recall:>10} {'p50 ms':>8} {'p95 ms':>8} {'anon MB':>8} {'file MB':>8} "
+          f"{'disk MB':>8} {'build s':>8} {'open s':>7}")
+    for r in results:
+        print(f"{r['config']:<14} {r[recall]:>10} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['rss_anon_mb']:>8} "
+              f"{r['rss_file_mb']:>8} {r['disk_mb']:>8} {r['build_s']:>8} {r['open_s']:>7}")
+
+
+if __name__ == "__main__":
+    main()
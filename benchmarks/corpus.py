@@ -0,0 +1,211 @@
+"""Korpus sintetis untuk benchmark: PDF teks, PDF hasil scan, DOCX, XLSX dan TIFF.
+
+Setiap dokumen berisi fakta unik (nomor invoice, vendor, kota) sehingga
+tidak dianggap duplikat oleh ingestion dan bisa ditanyakan lewat chat.
+PDF teks ditulis langsung (tanpa library PDF); PDF scan dan TIFF adalah
+gambar teks yang hanya terbaca lewat OCR (perlu tesseract).
+
+    python -m benchmarks.corpus --out /tmp/corpus --per-kind 5 --pages 3
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+
+KINDS = ("text_pdf", "scanned_pdf", "docx", "xlsx", "tiff")
+# Jenis yang hanya bisa diekstrak dengan OCR
+OCR_KINDS = {"scanned_pdf", "tiff"}
+
+_VENDORS = ["Sinar Jaya", "Maju Bersama", "Cahaya Abadi", "Mitra Sejahtera", "Karya Utama", "Bumi Persada"]
+_SERVICES = ["cleaning", "catering", "security", "printer", "software", "vehicle", "consulting", "network",
+             "insurance", "logistics"]
+_CITIES = ["Jakarta", "Surabaya", "Bandung", "Medan", "Makassar", "Semarang", "Denpasar", "Batam"]
+
+
+def tesseract_available() -> bool:
+    return shutil.which("tesseract") is not None
+
+
+def make_facts(rng: random.Random, doc: int, count: int) -> list[dict]:
+    return [{
+        "invoice": f"INV-{rng.randint(2019, 2025)}-{doc:03d}{n:03d}",
+        "vendor": f"PT {rng.choice(_VENDORS)}",
+        "service": rng.choice(_SERVICES),
+        "city": rng.choice(_CITIES),
+        "amount": rng.randint(1, 900) * 100_000,
+    } for n in range(count)]
+
+
+def fact_line(fact: dict) -> str:
+    return (f"Invoice {fact['invoice']} from {fact['vendor']} covers {fact['service']} services "
+            f"for the {fact['city']} office, amount Rp {fact['amount']:,}.")
+
+
+def page_lines(facts: list[dict], page: int, per_page: int) -> list[str]:
+    lines = [f"Page {page + 1}"]
+    for fact in facts[page * per_page:(page + 1) * per_page]:
+        lines += [fact_line(fact), "Payment follows the standard terms after acceptance by the branch."]
+    return lines
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, pages: list[list[str]]):
+    """Minimal PDF with a Helvetica text layer, one content stream per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # pages, diisi setelah jumlah halaman diketahui
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 800 Td"] + [f"({_pdf_escape(line)}) Tj T*" for line in lines] + ["ET"]
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{n} 0 R" for n in page_ids).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for n, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % n + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def render_pages(pages: list[list[str]], dpi: int = 150, mode: str = "L") -> list:
+    """A4 page images of the lines, for scanned PDFs and TIFFs."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=round(dpi * 11 / 72))
+    except TypeError:
+        font = ImageFont.load_default()
+    size = (round(8.27 * dpi), round(11.69 * dpi))
+    line_height = round(dpi * 16 / 72)
+    images = []
+    for lines in pages:
+        image = Image.new(mode, size, 255 if mode == "L" else 1)
+        draw = ImageDraw.Draw(image)
+        for i, line in enumerate(lines):
+            draw.text((round(dpi * 0.7), round(dpi * 0.8) + i * line_height), line, fill=0, font=font)
+        images.append(image)
+    return images
+
+
+def write_scanned_pdf(path: str, pages: list[list[str]], dpi: int = 150):
+    images = render_pages(pages, dpi)
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=dpi)
+
+
+def write_tiff(path: str, pages: list[list[str]], dpi: int = 200):
+    images = render_pages(pages, dpi, mode="1")
+    images[0].save(path, save_all=True, append_images=images[1:], dpi=(dpi, dpi), compression="group4")
+
+
+def write_docx(path: str, facts: list[dict], pages: int, per_page: int):
+    from docx import Document
+
+    doc = Document()
+    for page in range(pages):
+        doc.add_heading(f"Section {page + 1}", level=2)
+        for line in page_lines(facts, page, per_page)[1:]:
+            doc.add_paragraph(line)
+    # Rekap invoice sebagai tabel
+    table = doc.add_table(rows=1, cols=4)
+    for cell, title in zip(table.rows[0].cells, ("Invoice", "Vendor", "City", "Amount")):
+        cell.text = title
+    for fact in facts:
+        cells = table.add_row().cells
+        for cell, value in zip(cells, (fact["invoice"], fact["vendor"], fact["city"], f"{fact['amount']:,}")):
+            cell.text = value
+    doc.save(path)
+
+
+def write_xlsx(path: str, facts: list[dict], rows_per_fact: int = 20):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Invoices")
+    sheet.append(["Invoice", "Vendor", "Service", "City", "Line", "Amount"])
+    for fact in facts:
+        for line in range(rows_per_fact):
+            sheet.append([fact["invoice"], fact["vendor"], fact["service"], fact["city"], line + 1,
+                          fact["amount"] // rows_per_fact])
+    workbook.save(path)
+
+
+_EXTENSIONS = {"text_pdf": ".pdf", "scanned_pdf": ".pdf", "docx": ".docx", "xlsx": ".xlsx", "tiff": ".tiff"}
+
+
+def make_corpus(directory: str, per_kind: int = 3, pages: int = 3, kinds=KINDS, seed: int = 0) -> list[dict]:
+    """Write ``per_kind`` files of each kind; returns ``[{"path", "kind", "pages", "facts"}]``."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    per_page = 4
+    files = []
+    doc = 0
+    for kind in kinds:
+        for i in range(per_kind):
+            facts = make_facts(rng, doc, pages * per_page)
+            path = os.path.join(directory, f"{kind}_{i:03d}{_EXTENSIONS[kind]}")
+            lines = [page_lines(facts, page, per_page) for page in range(pages)]
+            if kind == "text_pdf":
+                write_text_pdf(path, lines)
+            elif kind == "scanned_pdf":
+                write_scanned_pdf(path, lines)
+            elif kind == "tiff":
+                write_tiff(path, lines)
+            elif kind == "docx":
+                write_docx(path, facts, pages, per_page)
+            else:
+                write_xlsx(path, facts)
+            files.append({"path": path, "kind": kind, "pages": pages, "facts": facts})
+            doc += 1
+    return files
+
+
+def make_queries(files: list[dict], count: int, seed: int = 1) -> list[str]:
+    """Chat questions about facts in the corpus, alternating identifier and topic questions."""
+    rng = random.Random(seed)
+    facts = [fact for f in files for fact in f["facts"]]
+    queries = []
+    for i in range(count):
+        fact = rng.choice(facts)
+        if i % 2 == 0:
+            queries.append(f"What is the amount of invoice {fact['invoice']}?")
+        else:
+            queries.append(f"Which vendor provides {fact['service']} services for the {fact['city']} office?")
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--per-kind", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files = make_corpus(args.out, args.per_kind, args.pages, args.kinds.split(","), args.seed)
+    print(json.dumps([
+        {"path": f["path"], "kind": f["kind"], "bytes": os.path.getsize(f["path"])} for f in files
+    ], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Recall/latency evaluation untuk mode retrieval (vector, lexical, hybrid, auto).
+
+Membangun korpus sintetis berlabel (chunk dengan nomor invoice/kontrak dan
+topik acak) di vector store sementara, lalu menjalankan query identifier
+("status invoice INV-2023-0042") dan query topik terhadap setiap mode.
+Embedding berasal dari stub Ollama mode ``bow``: mirip model semantik yang
+lemah pada angka dan identifier.
+
+    python -m benchmarks.eval_retrieval --docs 200 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+_SUBJECTS = ["cleaning", "catering", "security", "laptop", "printer", "furniture", "software",
+             "vehicle", "consulting", "training", "network", "insurance", "audit", "logistics"]
+_OBJECTS = ["maintenance", "procurement", "rental", "renewal", "installation", "inspection",
+            "delivery", "upgrade", "support", "licensing"]
+_PLACES = ["jakarta", "surabaya", "bandung", "medan", "makassar", "semarang", "denpasar", "batam"]
+_KINDS = [("Invoice", "INV-{year}-{n:04d}"), ("Contract", "KTR/{year}/{n:03d}"), ("Purchase order", "PO{year}{n:05d}")]
+
+
+def make_corpus(docs: int, chunks_per_doc: int, seed: int = 0):
+    """Returns ``{filename: [chunk texts]}`` and labelled facts per chunk."""
+    rng = random.Random(seed)
+    corpus, facts = {}, []
+    used = set()
+    for d in range(docs):
+        name = f"doc_{d:04d}.txt"
+        corpus[name] = []
+        for c in range(chunks_per_doc):
+            while True:
+                kind, pattern = rng.choice(_KINDS)
+                ident = pattern.format(year=rng.randint(2018, 2025), n=rng.randint(1, 9999))
+                topic = (rng.choice(_SUBJECTS), rng.choice(_OBJECTS), rng.choice(_PLACES))
+                if ident not in used and topic not in used:
+                    used.update([ident, topic])
+                    break
+            text = (
+                f"{kind} {ident} covers {topic[0]} {topic[1]} services for the {topic[2]} office. "
+                f"The vendor agreed to the schedule and reporting terms described in the annex. "
+                f"Payment follows the standard terms after acceptance by the {topic[2]} branch."
+            )
+            corpus[name].append(text)
+            facts.append({"source": name, "text": text, "kind": kind, "identifier": ident, "topic": topic})
+    return corpus, facts
+
+
+def make_queries(facts: list[dict], count: int, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        fact = rng.choice(facts)
+        if i % 2 == 0:
+            query = f"what is the status of {fact['kind'].lower()} {fact['identifier']}?"
+            kind = "identifier"
+        else:
+            s, o, p = fact["topic"]
+            query = f"which document is about {o} of {s} in {p}"
+            kind = "topic"
+        queries.append({"query": query, "kind": kind, "relevant": fact["chunk_id"]})
+    return queries
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def evaluate(queries: list[dict], modes: list[str], k: int) -> list[dict]:
+    from app.services.retrieval import retrieve
+
+    report = []
+    for mode in modes:
+        for kind in ("identifier", "topic", "all"):
+            subset = [q for q in queries if kind == "all" or q["kind"] == kind]
+            if not subset:
+                continue
+            hits, rr, latencies, embedded = 0, 0.0, [], 0
+            for q in subset:
+                start = time.perf_counter()
+                vector, results = await retrieve(q["query"], k=k, mode=mode)
+                latencies.append((time.perf_counter() - start) * 1000)
+                embedded += vector is not None
+                ids = [doc.metadata.get("chunk_id") for doc, _ in results]
+                if q["relevant"] in ids:
+                    hits += 1
+                    rr += 1 / (ids.index(q["relevant"]) + 1)
+            report.append({
+                "mode": mode,
+                "queries": kind,
+                "n": len(subset),
+                f"recall@{k}": round(hits / len(subset), 3),
+                "mrr": round(rr / len(subset), 3),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "embed_calls": embedded,
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--chunks-per-doc", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--modes", default="vector,lexical,hybrid,auto")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0,
+                        help="simulated latency of one query embedding")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    from benchmarks.stub_ollama import start_stub_server
+
+    workdir = tempfile.mkdtemp(prefix="dms-eval-")
+    server, url = start_stub_server(latency_ms=args.embed_latency_ms, per_item_latency_ms=0,
+                                    dim=256, embedding="bow")
+    # Env harus di-set sebelum modul app diimpor
+    os.environ.update(
+        OLLAMA_URL=url,
+        CHROMA_DIR=os.path.join(workdir, "vectorstore"),
+        EMBED_CACHE_ENABLED="0",
+        ANSWER_CACHE_ENABLED="0",
+    )
+    from app.services.embedding import chunk_hash, document_id, embed_and_store
+    from app.services.llm_client import close_http_session
+
+    corpus, facts = make_corpus(args.docs, args.chunks_per_doc)
+    start = time.perf_counter()
+    for name, chunks in corpus.items():
+        embed_and_store(chunks, {"filename": name, "file_type": "txt"})
+    print(f"Indexed {len(facts)} chunks in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    for fact in facts:
+        fact["chunk_id"] = f"{document_id(fact['source'])}-{chunk_hash(fact['text'])}"
+
+    queries = make_queries(facts, args.queries)
+
+    async def run():
+        try:
+            return await evaluate(queries, args.modes.split(","), args.k)
+        finally:
+            await close_http_session()
+
+    report = asyncio.run(run())
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    recall = f"recall@{args.k}"
+    print(f"{'mode':<8} {'queries':<11} {'n':>4} {recall:>9} {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8} {'embeds':>7}")
+    for r in report:
+        print(f"{r['mode']:<8} {r['queries']:<11} {r['n']:>4} {r[recall]:>9} {r['mrr']:>6} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['embed_calls']:>7}")
+
+
+if __name__ == "__main__":
+    main()
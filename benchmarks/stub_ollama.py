@@ -0,0 +1,167 @@
+"""Stub Ollama server untuk benchmark lokal.
+
+Mengimplementasikan ``/api/embeddings``, ``/api/embed`` dan streaming
+``/api/generate`` dengan latency yang bisa diatur, tanpa model sungguhan.
+
+    python -m benchmarks.stub_ollama --port 11434 --latency-ms 20
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """Deterministic pseudo-embedding derived from the text hash."""
+    out = []
+    counter = 0
+    while len(out) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        out.extend(v / 2**31 for v in struct.unpack("<8i", digest))
+        counter += 1
+    return out[:dim]
+
+
+def bow_embedding(text: str, dim: int) -> list[float]:
+    """Hashed bag-of-words over alphabetic words, L2-normalized.
+
+    Behaves like a weak semantic model for benchmarks: texts sharing words
+    are close, while numbers and identifiers are ignored entirely.
+    """
+    out = [0.0] * dim
+    for word in re.findall(r"[^\W\d_]{3,}", text.lower()):
+        h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+        out[h % dim] += 1.0 if h & 1 << 31 else -1.0
+    norm = math.sqrt(sum(v * v for v in out)) or 1.0
+    return [v / norm for v in out]
+
+
+EMBEDDINGS = {"hash": fake_embedding, "bow": bow_embedding}
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Hindari delay Nagle/delayed-ACK pada koneksi keep-alive
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_generate(self, payload: dict):
+        cfg = self.server.config
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(cfg["ttft"])
+        try:
+            for i in range(cfg["tokens"]):
+                line = json.dumps({"model": payload.get("model"), "response": f"tok{i} ", "done": False})
+                self._write_chunk(line.encode("utf-8") + b"\n")
+                time.sleep(cfg["token_latency"])
+            self._write_chunk(json.dumps({"response": "", "done": True}).encode("utf-8") + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client memutus stream: berhenti "generate" seperti Ollama
+            self.server.stats["aborted_generations"] += 1
+            self.close_connection = True
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        cfg = self.server.config
+        payload = self._read_json()
+        if self.path == "/api/embeddings":
+            time.sleep(cfg["latency"] + cfg["per_item_latency"])
+            self._send_json({"embedding": cfg["embed"](payload.get("prompt", ""), cfg["dim"])})
+        elif self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            time.sleep(cfg["latency"] + cfg["per_item_latency"] * len(inputs))
+            self._send_json({"embeddings": [cfg["embed"](t, cfg["dim"]) for t in inputs]})
+        elif self.path == "/api/generate":
+            self.server.stats["generations"] += 1
+            self._stream_generate(payload)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = 10.0,
+    per_item_latency_ms: float = 2.0,
+    dim: int = 64,
+    ttft_ms: float = 50.0,
+    token_latency_ms: float = 5.0,
+    tokens: int = 50,
+    embedding: str = "hash",
+):
+    """Start the stub in a daemon thread; returns ``(server, base_url)``."""
+    server = ThreadingHTTPServer((host, port), StubOllamaHandler)
+    server.daemon_threads = True
+    server.config = {
+        "latency": latency_ms / 1000,
+        "per_item_latency": per_item_latency_ms / 1000,
+        "dim": dim,
+        "ttft": ttft_ms / 1000,
+        "token_latency": token_latency_ms / 1000,
+        "tokens": tokens,
+        "embed": EMBEDDINGS[embedding],
+    }
+    server.stats = {"generations": 0, "aborted_generations": 0}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--per-item-latency-ms", type=float, default=2.0)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--embedding", default="hash", choices=sorted(EMBEDDINGS))
+    args = parser.parse_args()
+
+    server, url = start_stub_server(
+        args.host, args.port, args.latency_ms, args.per_item_latency_ms, args.dim,
+        args.ttft_ms, args.token_latency_ms, args.tokens, args.embedding,
+    )
+    print(f"Stub Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()